@@ -0,0 +1,51 @@
+"""
+Standalone performance scripts, run from the project root:
+
+    python -m benchmarks.<name> --help
+
+They work on a scratch SQLite database and never touch db.sqlite3.
+"""
+import os
+import sys
+import tempfile
+from io import BytesIO
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def setup_django(database_name=None, settings_module='test_task.settings'):
+    """Configure Django against a scratch database and return its path."""
+    if str(BASE_DIR) not in sys.path:
+        sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+
+    if database_name is None:
+        database_name = os.path.join(tempfile.mkdtemp(prefix='fleet-bench-'), 'bench.sqlite3')
+
+    from django.conf import settings
+    settings.DATABASES['default']['NAME'] = database_name
+    settings.DEBUG = False
+    settings.ALLOWED_HOSTS = ['*']
+
+    import django
+    django.setup()
+    return database_name
+
+
+def wsgi_request(application, method, path, query='', body=b'', content_type='application/json'):
+    """Call a WSGI application in-process and return the response status code."""
+    environ = {
+        'REQUEST_METHOD': method, 'PATH_INFO': path, 'QUERY_STRING': query, 'SCRIPT_NAME': '',
+        'SERVER_NAME': 'testserver', 'SERVER_PORT': '80', 'HTTP_HOST': 'testserver',
+        'CONTENT_TYPE': content_type, 'CONTENT_LENGTH': str(len(body)),
+        'wsgi.url_scheme': 'http', 'wsgi.input': BytesIO(body), 'wsgi.errors': sys.stderr,
+        'wsgi.version': (1, 0), 'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+    }
+    statuses = []
+    response = application(environ, lambda status, headers, exc_info=None: statuses.append(status))
+    try:
+        b''.join(response)
+    finally:
+        response.close()
+    return int(statuses[0].split()[0])
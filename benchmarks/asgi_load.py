@@ -0,0 +1,141 @@
+"""
+Latency and throughput of the read endpoints at high concurrency:
+
++ wsgi: the DRF viewsets through test_task.wsgi, one thread per client
++ asgi-sync: the same viewsets through test_task.asgi
++ asgi-async: rest.async_views through test_task.asgi, on one event loop
+
+    python -m benchmarks.asgi_load --concurrency 64 --requests 2000 --db-latency 2
+
+The applications are called in-process, without a server or sockets in
+between, so the numbers compare the request paths rather than HTTP stacks.
+--db-latency adds a sleep to every query to stand in for the network round
+trip of a database server; with SQLite on local disk the queries are too
+fast for the threading model to matter. The response cache is disabled so
+every request reaches the database.
+"""
+import argparse
+import asyncio
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks import setup_django, wsgi_request
+
+ENDPOINTS = {
+    'driver-list': ('/drivers/driver/', 'page_size=50'),
+    'vehicle-list expand': ('/vehicles/vehicle/', 'page_size=50&expand=driver'),
+    'vehicle-detail': ('/vehicles/vehicle/%(id)s/', ''),
+}
+
+
+async def asgi_get(application, path, query):
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+        'path': path, 'raw_path': path.encode(), 'query_string': query.encode(), 'root_path': '',
+        'headers': [(b'host', b'testserver')], 'server': ('testserver', 80), 'client': ('127.0.0.1', 0),
+    }
+    statuses = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            statuses.append(message['status'])
+
+    await application(scope, receive, send)
+    return statuses[0]
+
+
+def summary(name, latencies, elapsed):
+    latencies = sorted(latencies)
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    return '%-26s %8.0f req/s   p50 %7.1f ms   p99 %7.1f ms' % (
+        name, len(latencies) / elapsed, statistics.median(latencies) * 1000, p99 * 1000,
+    )
+
+
+def run_wsgi(application, targets, concurrency):
+    latencies = []
+    lock = threading.Lock()
+
+    def request(target):
+        started = time.perf_counter()
+        status = wsgi_request(application, 'GET', *target)
+        assert status == 200, status
+        with lock:
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        list(executor.map(request, targets))
+    return latencies, time.perf_counter() - started
+
+
+def run_asgi(application, targets, concurrency):
+    latencies = []
+
+    async def client(queue):
+        while queue:
+            target = queue.pop()
+            started = time.perf_counter()
+            status = await asgi_get(application, *target)
+            assert status == 200, status
+            latencies.append(time.perf_counter() - started)
+
+    async def main():
+        queue = list(reversed(targets))
+        await asyncio.gather(*(client(queue) for _ in range(concurrency)))
+
+    started = time.perf_counter()
+    asyncio.run(main())
+    return latencies, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--drivers', type=int, default=1000)
+    parser.add_argument('--vehicles', type=int, default=10000)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--requests', type=int, default=2000, help='per endpoint and path')
+    parser.add_argument('--db-latency', type=float, default=0.0, help='milliseconds added to every query')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.db.backends.signals import connection_created
+
+    from benchmarks.generator import generate
+    from rest.models import Vehicle
+    from test_task.asgi import application as asgi_application
+    from test_task.wsgi import application as wsgi_application
+
+    settings.REST_RESPONSE_CACHE = None
+    call_command('migrate', verbosity=0)
+    generate(args.drivers, args.vehicles)
+    vehicle_ids = list(Vehicle.objects.values_list('id', flat=True)[:1000])
+
+    if args.db_latency:
+        def delay(execute, sql, params, many, context):
+            time.sleep(args.db_latency / 1000)
+            return execute(sql, params, many, context)
+
+        def add_delay(connection, **kwargs):
+            connection.execute_wrappers.append(delay)
+        connection_created.connect(add_delay, weak=False)
+
+    print('%d clients, %d requests per run, %.1f ms per query' % (args.concurrency, args.requests, args.db_latency))
+    for endpoint, (path, query) in ENDPOINTS.items():
+        targets = [(path % {'id': vehicle_ids[i % len(vehicle_ids)]}, query) for i in range(args.requests)]
+        async_targets = [('/async' + target_path, target_query) for target_path, target_query in targets]
+        print(endpoint)
+        print('  ' + summary('wsgi', *run_wsgi(wsgi_application, targets, args.concurrency)))
+        print('  ' + summary('asgi-sync', *run_asgi(asgi_application, targets, args.concurrency)))
+        print('  ' + summary('asgi-async', *run_asgi(asgi_application, async_targets, args.concurrency)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""
+Vehicle ingest throughput: one POST per vehicle against one POST to /bulk/.
+
+    python -m benchmarks.bulk --rows 5000
+"""
+import argparse
+import json
+import time
+
+from benchmarks import setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=5000)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.core.management import call_command
+    from django.test import Client
+    from django.urls import reverse
+
+    from benchmarks.generator import plate_number
+    from rest.models import Driver
+
+    call_command('migrate', verbosity=0)
+    driver = Driver.objects.create(first_name='Bench', last_name='Driver')
+    client = Client()
+
+    def payload(offset):
+        return [
+            {'driver': driver.pk, 'make': 'Skoda', 'model': 'Octavia', 'plate_number': plate_number(offset + index)}
+            for index in range(args.rows)
+        ]
+
+    started = time.perf_counter()
+    for item in payload(0):
+        response = client.post(reverse('vehicle-list'), data=json.dumps(item), content_type='application/json')
+        assert response.status_code == 201, response.content
+    single = args.rows / (time.perf_counter() - started)
+
+    started = time.perf_counter()
+    response = client.post(reverse('vehicle-bulk'), data=json.dumps(payload(args.rows)), content_type='application/json')
+    assert response.status_code == 201, response.content
+    bulk = args.rows / (time.perf_counter() - started)
+
+    print('one request per vehicle: %10.0f rows/s' % single)
+    print('bulk endpoint:           %10.0f rows/s (%.1fx)' % (bulk, bulk / single))
+
+
+if __name__ == '__main__':
+    main()
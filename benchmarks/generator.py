@@ -0,0 +1,90 @@
+"""
+Synthetic fleet data.
+
+Rows are written with executemany() straight into the tables, bypassing
+model save() and auto_now_add, so that created_at can be spread over time
+and a million rows load in seconds rather than minutes.
+"""
+import random
+import string
+from datetime import datetime, timedelta, timezone
+
+from django.db import connection, transaction
+
+from rest import search, stats
+from rest.models import normalize_plate_number
+
+FIRST_NAMES = ('Olena', 'Taras', 'Iryna', 'Andrii', 'Oksana', 'Dmytro', 'Maria', 'Serhii', 'Nadia', 'Petro')
+LAST_NAMES = ('Shevchenko', 'Kovalenko', 'Bondarenko', 'Tkachenko', 'Kravchenko', 'Melnyk', 'Boyko', 'Lysenko')
+MAKES = {
+    'Toyota': ('Corolla', 'Camry', 'RAV4'),
+    'Skoda': ('Octavia', 'Fabia', 'Superb'),
+    'Renault': ('Logan', 'Duster', 'Megane'),
+    'Volkswagen': ('Passat', 'Golf', 'Transporter'),
+    'Mercedes': ('Sprinter', 'Vito'),
+}
+PLATE_SPACE = 26 ** 4 * 10 ** 4
+PLATE_STEP = 1_000_003  # prime, so index -> plate is a bijection over PLATE_SPACE
+
+
+def plate_number(index):
+    """Return a unique "AA 1234 OO" plate for every index below PLATE_SPACE."""
+    value = (index * PLATE_STEP) % PLATE_SPACE
+    value, digits = divmod(value, 10 ** 4)
+    letters = []
+    for _ in range(4):
+        value, letter = divmod(value, 26)
+        letters.append(string.ascii_uppercase[letter])
+    return '%s%s %04d %s%s' % (letters[0], letters[1], digits, letters[2], letters[3])
+
+
+def _timestamps(rng, start, days):
+    created_at = start + timedelta(seconds=rng.randrange(days * 86400))
+    updated_at = created_at + timedelta(seconds=rng.randrange(30 * 86400))
+    adapt = connection.ops.adapt_datetimefield_value
+    return adapt(created_at), adapt(updated_at)
+
+
+def generate(drivers, vehicles, assigned_ratio=0.7, days=365, seed=0, batch_size=10000,
+             start=datetime(2021, 1, 1, tzinfo=timezone.utc)):
+    """Insert `drivers` drivers and `vehicles` vehicles into the current database."""
+    rng = random.Random(seed)
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT COALESCE(MAX(id), 0) FROM rest_driver')
+        first_driver = cursor.fetchone()[0] + 1
+        cursor.execute('SELECT COUNT(*) FROM rest_vehicle')
+        first_plate = cursor.fetchone()[0]
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        for offset in range(0, drivers, batch_size):
+            cursor.executemany(
+                'INSERT INTO rest_driver (first_name, last_name, created_at, updated_at) VALUES (%s, %s, %s, %s)',
+                [
+                    (rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)) + _timestamps(rng, start, days)
+                    for _ in range(min(batch_size, drivers - offset))
+                ],
+            )
+
+        makes = list(MAKES)
+        for offset in range(0, vehicles, batch_size):
+            rows = []
+            for index in range(offset, min(offset + batch_size, vehicles)):
+                make = rng.choice(makes)
+                driver_id = None
+                if drivers and rng.random() < assigned_ratio:
+                    driver_id = first_driver + rng.randrange(drivers)
+                plate = plate_number(first_plate + index)
+                rows.append(
+                    (driver_id, make, rng.choice(MAKES[make]), plate, normalize_plate_number(plate))
+                    + _timestamps(rng, start, days)
+                )
+            cursor.executemany(
+                'INSERT INTO rest_vehicle '
+                '(driver_id, make, model, plate_number, plate_number_normalized, created_at, updated_at) '
+                'VALUES (%s, %s, %s, %s, %s, %s, %s)',
+                rows,
+            )
+
+    # the raw INSERTs bypass the signals keeping the /vehicles/stats/ counters and the search index
+    stats.rebuild()
+    search.rebuild()
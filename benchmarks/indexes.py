@@ -0,0 +1,102 @@
+"""
+Query plans and latencies of the list filters with and without the indexes
+added in rest/migrations/0003_vehicle_driver_indexes.py.
+
+    python -m benchmarks.indexes --drivers 100000 --vehicles 1000000
+"""
+import argparse
+import statistics
+import time
+from datetime import datetime, timezone
+
+from benchmarks import setup_django
+
+
+def timed(queryset, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        list(queryset.all())
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def scenarios(page_size):
+    from rest.models import Driver, Vehicle
+
+    since = datetime(2021, 11, 10, tzinfo=timezone.utc)
+    until = datetime(2021, 11, 16, tzinfo=timezone.utc)
+    ordering = ('created_at', 'id')
+    return {
+        'drivers created_at__gte': Driver.objects.filter(created_at__gte=since).order_by(*ordering)[:page_size],
+        'drivers created_at range': (
+            Driver.objects.filter(created_at__gte=since, created_at__lte=until).order_by(*ordering)[:page_size]
+        ),
+        'vehicles with_drivers=no': Vehicle.objects.filter(driver__isnull=True).order_by(*ordering)[:page_size],
+        'vehicles with_drivers=yes': Vehicle.objects.filter(driver__isnull=False).order_by(*ordering)[:page_size],
+    }
+
+
+def run(label, repeat, page_size):
+    print('\n== %s ==' % label)
+    results = {}
+    for name, queryset in scenarios(page_size).items():
+        results[name] = timed(queryset, repeat)
+        print('%-32s %9.2f ms' % (name, results[name]))
+        for line in queryset.explain().splitlines():
+            print('    ' + line)
+    return results
+
+
+def analyze(connection):
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--drivers', type=int, default=100000)
+    parser.add_argument('--vehicles', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--database', help='SQLite file to use, a scratch file by default')
+    args = parser.parse_args()
+
+    setup_django(args.database)
+    from django.core.management import call_command
+    from django.db import connection
+    from django.db.models import Index
+
+    from benchmarks.generator import generate
+    from rest.models import Driver, Vehicle
+
+    call_command('migrate', verbosity=0)
+    if not Vehicle.objects.exists():
+        print('seeding %d drivers and %d vehicles...' % (args.drivers, args.vehicles))
+        generate(args.drivers, args.vehicles)
+    analyze(connection)
+
+    # 0002 schema: no composite indexes, only the implicit index on the driver FK
+    indexes = [(model, index) for model in (Driver, Vehicle) for index in model._meta.indexes]
+    driver_fk_index = Index(fields=['driver'], name='bench_vehicle_driver_idx')
+    with connection.schema_editor() as editor:
+        for model, index in indexes:
+            editor.remove_index(model, index)
+        editor.add_index(Vehicle, driver_fk_index)
+    before = run('without indexes', args.repeat, args.page_size)
+
+    with connection.schema_editor() as editor:
+        editor.remove_index(Vehicle, driver_fk_index)
+        for model, index in indexes:
+            editor.add_index(model, index)
+    analyze(connection)
+    after = run('with indexes', args.repeat, args.page_size)
+
+    print('\n%-32s %12s %12s %9s' % ('query', 'before, ms', 'after, ms', 'speedup'))
+    for name in before:
+        print('%-32s %12.2f %12.2f %8.1fx' % (name, before[name], after[name], before[name] / max(after[name], 1e-6)))
+
+
+if __name__ == '__main__':
+    main()
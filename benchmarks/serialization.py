@@ -0,0 +1,80 @@
+"""
+CPU time per row of a list response, ModelSerializer path against the
+rest.fast path, for drivers and vehicles:
+
++ load: QuerySet -> model instances, or values_list() rows
++ serialize: serializer(many=True).data, or RowSerializer.to_representation
++ render: JSONRenderer, or FastJSONRenderer (orjson)
+
+    python -m benchmarks.serialization --rows 1000 --repeat 20
+
+Times are process CPU time, the best of --repeat runs. Each run checks that
+both paths render the same bytes.
+"""
+import argparse
+import time
+
+from benchmarks import setup_django
+
+
+def best_cpu_time(function, repeat):
+    best, result = None, None
+    for _ in range(repeat):
+        started = time.process_time()
+        result = function()
+        elapsed = time.process_time() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--drivers', type=int, default=2000)
+    parser.add_argument('--vehicles', type=int, default=5000)
+    parser.add_argument('--rows', type=int, default=1000, help='rows per list response')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.core.management import call_command
+    from rest_framework.renderers import JSONRenderer
+
+    from benchmarks.generator import generate
+    from rest.fast import FastJSONRenderer, get_row_serializer
+    from rest.models import Driver, Vehicle
+    from rest.serializers import DriverSerializer, VehicleSerializer
+
+    call_command('migrate', verbosity=0)
+    generate(args.drivers, args.vehicles)
+
+    print('%d rows per response' % args.rows)
+    print('%-9s %-11s %10s %12s %10s %10s' % ('', 'path', 'load', 'serialize', 'render', 'total'))
+    for model, serializer_class in ((Driver, DriverSerializer), (Vehicle, VehicleSerializer)):
+        queryset = model.objects.order_by('created_at', 'id')
+        row_serializer = get_row_serializer(serializer_class)
+        paths = {
+            'serializer': (
+                lambda: list(queryset[:args.rows]),
+                lambda objs: serializer_class(objs, many=True).data,
+                JSONRenderer().render,
+            ),
+            'fast': (
+                lambda: list(queryset.values_list(*row_serializer.lookups, named=True)[:args.rows]),
+                row_serializer.to_representation,
+                FastJSONRenderer().render,
+            ),
+        }
+        rendered = {}
+        for path, (load, serialize, render) in paths.items():
+            load_time, rows = best_cpu_time(load, args.repeat)
+            serialize_time, data = best_cpu_time(lambda: serialize(rows), args.repeat)
+            render_time, rendered[path] = best_cpu_time(lambda: render(data), args.repeat)
+            times = [load_time, serialize_time, render_time, load_time + serialize_time + render_time]
+            print('%-9s %-11s %s' % (
+                model._meta.model_name, path, ' '.join('%8.2f us' % (value / len(rows) * 1e6) for value in times),
+            ))
+        assert rendered['serializer'] == rendered['fast'], 'the paths rendered different bytes'
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+Concurrent reads and writes on one SQLite file, with the default rollback
+journal and with REST_SQLITE_PRAGMAS = True (WAL and friends):
+
++ readers: GET /vehicles/vehicle/?page_size=50, half of them ?with_drivers=yes
++ writers: PATCH /vehicles/set_driver/<vehicle_id>/
+
+    python -m benchmarks.sqlite_tuning --readers 8 --writers 2 --seconds 10
+
+Requests go through test_task.wsgi in-process, one thread per client and a
+new connection per request as under a threaded WSGI server. Requests that
+fail with "database is locked" are counted as lock errors. The response
+cache is disabled so every read reaches the database.
+"""
+import argparse
+import json
+import logging
+import random
+import statistics
+import threading
+import time
+
+from benchmarks import setup_django, wsgi_request
+
+
+def client(application, deadline, request, results):
+    latencies, errors = [], 0
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        status = wsgi_request(application, *request())
+        if status == 500:
+            errors += 1
+        else:
+            assert status == 200, status
+            latencies.append(time.perf_counter() - started)
+    results.append((latencies, errors))
+
+
+def run(application, args, vehicle_ids, driver_ids):
+    deadline = time.perf_counter() + args.seconds
+    rng = random.Random(0)
+
+    def read():
+        return 'GET', '/vehicles/vehicle/', rng.choice(('page_size=50', 'page_size=50&with_drivers=yes'))
+
+    def write():
+        body = {'driver': rng.choice(driver_ids + [None])}
+        return 'PATCH', '/vehicles/set_driver/%d/' % rng.choice(vehicle_ids), '', json.dumps(body).encode()
+
+    reads, writes = [], []
+    threads = [threading.Thread(target=client, args=(application, deadline, read, reads)) for _ in range(args.readers)]
+    threads += [threading.Thread(target=client, args=(application, deadline, write, writes))
+                for _ in range(args.writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {'reads': reads, 'writes': writes}
+
+
+def summary(results, seconds):
+    latencies = sorted(latency for client_latencies, _ in results for latency in client_latencies)
+    errors = sum(client_errors for _, client_errors in results)
+    if not latencies:
+        return '%8.0f req/s   %42s   lock errors %5d' % (0, '', errors)
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    return '%8.0f req/s   p50 %7.1f ms   p99 %8.1f ms   lock errors %5d' % (
+        len(latencies) / seconds, statistics.median(latencies) * 1000, p99 * 1000, errors,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--drivers', type=int, default=1000)
+    parser.add_argument('--vehicles', type=int, default=100000)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.db import connection, connections
+
+    from benchmarks.generator import generate
+    from rest.models import Driver, Vehicle
+    from test_task.wsgi import application
+
+    # the lock errors are counted, not logged
+    logging.getLogger('django.request').setLevel(logging.CRITICAL)
+    settings.REST_RESPONSE_CACHE = None
+    call_command('migrate', verbosity=0)
+    generate(args.drivers, args.vehicles)
+    vehicle_ids = list(Vehicle.objects.values_list('id', flat=True)[:10000])
+    driver_ids = list(Driver.objects.values_list('id', flat=True)[:1000])
+
+    # rollback journal first: WAL mode is stored in the file and would stick
+    for label, pragmas in (('default', False), ('tuned', True)):
+        settings.REST_SQLITE_PRAGMAS = pragmas
+        connections.close_all()
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            journal_mode = cursor.fetchone()[0]
+        results = run(application, args, vehicle_ids, driver_ids)
+        print('%s (journal_mode=%s, %d readers, %d writers)' % (label, journal_mode, args.readers, args.writers))
+        for kind in ('reads', 'writes'):
+            print('  %-7s %s' % (kind, summary(results[kind], args.seconds)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+"""
+Startup time and memory of a worker, with the default settings and with the
+API-only profile (test_task.settings_api):
+
+    python -m benchmarks.startup --repeat 5 --workers 4
+
+Every run is a fresh interpreter that imports test_task.wsgi, then serves
+its first requests in-process. Reported are the medians of:
+
++ setup: importing test_task.wsgi, i.e. django.setup() and the middleware
++ first request: the first GET of each endpoint, which imports the URLconf,
+  the views and the serializers
++ process: the whole interpreter, from its start to its exit
++ modules and RSS after setup and after the first requests
+
+With --workers, a master loads the application and forks that many workers
+that each serve --requests requests, once as is and once after
+test_task.wsgi.preload() (DJANGO_PRELOAD=1). For each worker, private is
+the memory it doesn't share with the master or the other workers, PSS its
+share of all its pages (Linux only, from /proc/self/smaps_rollup).
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks import BASE_DIR, setup_django, wsgi_request
+
+PROFILES = ('test_task.settings', 'test_task.settings_api')
+REQUESTS = (
+    ('/drivers/driver/', 'page_size=50'),
+    ('/vehicles/vehicle/', 'page_size=50&expand=driver'),
+    ('/vehicles/stats/', ''),
+)
+
+
+def memory():
+    """{field: MiB} of this process' VmRSS, and Pss and Private when the kernel reports them."""
+    values = {}
+    for path in ('/proc/self/status', '/proc/self/smaps_rollup'):
+        try:
+            with open(path) as status:
+                for line in status:
+                    name, _, value = line.partition(':')
+                    if name in ('VmRSS', 'Pss', 'Private_Clean', 'Private_Dirty'):
+                        values[name] = int(value.split()[0]) / 1024
+        except OSError:
+            pass
+    if 'VmRSS' not in values:
+        import resource
+        # the peak rather than the current RSS, in KiB on Linux, bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        values['VmRSS'] = peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+    if 'Private_Clean' in values:
+        values['Private'] = values.pop('Private_Clean') + values.pop('Private_Dirty')
+    return values
+
+
+def serve(application, requests):
+    for index in range(requests):
+        path, query = REQUESTS[index % len(REQUESTS)]
+        status = wsgi_request(application, 'GET', path, query)
+        assert status == 200, (path, status)
+
+
+def child(settings_module, database, workers, requests, preload):
+    """Run in a fresh interpreter by run(): print its measures as JSON."""
+    started = time.perf_counter()
+    os.environ.setdefault('DJANGO_SECRET_KEY', 'benchmark')
+    setup_django(database, settings_module)
+    from test_task import wsgi
+    result = {'setup': time.perf_counter() - started, 'setup_modules': len(sys.modules), 'setup_rss': memory()['VmRSS']}
+
+    if workers:
+        if preload:
+            wsgi.preload()
+        result['workers'] = fork_workers(wsgi.application, workers, requests)
+    else:
+        started = time.perf_counter()
+        serve(wsgi.application, len(REQUESTS))
+        result.update(first_request=time.perf_counter() - started, modules=len(sys.modules), rss=memory()['VmRSS'])
+    print(json.dumps(result))
+
+
+def fork_workers(application, workers, requests):
+    """[memory()] of `workers` forks of this process, measured once they all served `requests` requests."""
+    pipes = []
+    for _ in range(workers):
+        read, write = os.pipe()
+        done_read, done_write = os.pipe()
+        if os.fork() == 0:
+            os.close(read)
+            os.close(done_write)
+            serve(application, requests)
+            os.write(write, json.dumps(memory()).encode())
+            os.close(write)
+            # kept alive until every worker is measured, so they share what they share
+            os.read(done_read, 1)
+            os._exit(0)
+        os.close(write)
+        os.close(done_read)
+        pipes.append((read, done_write))
+
+    results = []
+    for read, done_write in pipes:
+        with os.fdopen(read) as output:
+            results.append(json.loads(output.read()))
+    for read, done_write in pipes:
+        os.close(done_write)
+    for _ in pipes:
+        os.wait()
+    return results
+
+
+def run(settings_module, database, workers=0, requests=0, preload=False):
+    """The measures of child() in a fresh interpreter, plus its total time as `process`."""
+    command = [
+        sys.executable, '-m', 'benchmarks.startup', '--child', settings_module, '--database', database,
+        '--workers', str(workers), '--requests', str(requests),
+    ] + ['--preload'] * preload
+    started = time.perf_counter()
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings_module)
+    output = subprocess.run(command, cwd=BASE_DIR, env=env, check=True, stdout=subprocess.PIPE, text=True).stdout
+    result = json.loads(output.splitlines()[-1])
+    result['process'] = time.perf_counter() - started
+    return result
+
+
+def median(results, name):
+    return statistics.median(result[name] for result in results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=0, help='forked workers per master, 0 to skip')
+    parser.add_argument('--requests', type=int, default=300, help='per forked worker')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--database', help=argparse.SUPPRESS)
+    parser.add_argument('--preload', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child(args.child, args.database, args.workers, args.requests, args.preload)
+
+    database = setup_django()
+    from django.core.management import call_command
+
+    from benchmarks.generator import generate
+    call_command('migrate', verbosity=0)
+    generate(1000, 10000)
+
+    print('%-24s %10s %14s %11s %16s %17s' % ('', 'setup', 'first request', 'process', 'modules', 'RSS MiB'))
+    for settings_module in PROFILES:
+        results = [run(settings_module, database) for _ in range(args.repeat)]
+        print('%-24s %7.0f ms %11.0f ms %8.0f ms %7d -> %5d %8.1f -> %6.1f' % (
+            settings_module, median(results, 'setup') * 1000, median(results, 'first_request') * 1000,
+            median(results, 'process') * 1000, median(results, 'setup_modules'), median(results, 'modules'),
+            median(results, 'setup_rss'), median(results, 'rss'),
+        ))
+
+    if not args.workers:
+        return
+    if not hasattr(os, 'fork'):
+        print('--workers needs os.fork()')
+        return
+    print()
+    print('%d workers, %d requests each, MiB per worker' % (args.workers, args.requests))
+    print('%-24s %-8s %10s %10s %10s' % ('', '', 'RSS', 'PSS', 'private'))
+    for settings_module in PROFILES:
+        for preload in (False, True):
+            workers = run(settings_module, database, args.workers, args.requests, preload)['workers']
+            print('%-24s %-8s %10.1f %10s %10s' % (
+                settings_module, 'preload' if preload else '', median(workers, 'VmRSS'),
+                *('%.1f' % median(workers, name) if name in workers[0] else '-' for name in ('Pss', 'Private')),
+            ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+"""
+Latency and query count of every endpoint and filter at a given fleet size.
+
+    python -m benchmarks.suite run --size 100k -o baseline.json
+    python -m benchmarks.suite run --size 100k -o current.json
+    python -m benchmarks.suite compare baseline.json current.json
+
+`run` seeds a scratch database (or reuses --database once seeded), then
+calls each scenario through the Django test client, so the timings include
+middleware, get_queryset, the serializers and rendering. The response cache
+is disabled. `compare` exits with status 1 when a scenario got slower than
+--latency-tolerance (relative, ignoring differences below --noise-ms), runs
+more queries than in the baseline or is missing.
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+
+from benchmarks import setup_django
+
+SIZES = {
+    # name: (drivers, vehicles)
+    '1k': (100, 1000),
+    '100k': (10000, 100000),
+    '1m': (100000, 1000000),
+}
+
+
+def scenarios(driver_ids, vehicle_ids):
+    """{name: (method, url, data)}, the same for every run of a given database."""
+    driver, vehicle = driver_ids[len(driver_ids) // 2], vehicle_ids[len(vehicle_ids) // 2]
+    return {
+        'driver-list': ('get', '/drivers/driver/', {}),
+        'driver-list created_at__gte': ('get', '/drivers/driver/', {'created_at__gte': '01-07-2021'}),
+        'driver-list created_at__lte': ('get', '/drivers/driver/', {'created_at__lte': '01-07-2021'}),
+        'driver-list created_at range': (
+            'get', '/drivers/driver/', {'created_at__gte': '10-11-2021', 'created_at__lte': '16-11-2021'},
+        ),
+        'driver-list updated_since': (
+            'get', '/drivers/driver/', {'updated_since': '2021-07-01T00:00:00Z', 'ordering': 'updated_at'},
+        ),
+        'driver-list q': ('get', '/drivers/driver/', {'q': 'olena shevcenko'}),
+        'driver-list expand=vehicles': ('get', '/drivers/driver/', {'expand': 'vehicles'}),
+        'driver-detail': ('get', '/drivers/driver/%d/' % driver, {}),
+        'vehicle-list': ('get', '/vehicles/vehicle/', {}),
+        'vehicle-list with_drivers=yes': ('get', '/vehicles/vehicle/', {'with_drivers': 'yes'}),
+        'vehicle-list with_drivers=no': ('get', '/vehicles/vehicle/', {'with_drivers': 'no'}),
+        'vehicle-list expand=driver': ('get', '/vehicles/vehicle/', {'expand': 'driver'}),
+        'vehicle-list driver ids': ('get', '/vehicles/vehicle/', {'driver': ','.join(map(str, driver_ids[:20]))}),
+        'vehicle-list make': ('get', '/vehicles/vehicle/', {'make': 'Toyota'}),
+        'vehicle-list q': ('get', '/vehicles/vehicle/', {'q': 'toyta', 'with_drivers': 'yes'}),
+        'vehicle-list fields': ('get', '/vehicles/vehicle/', {'fields': 'id,plate_number'}),
+        'vehicle-detail': ('get', '/vehicles/vehicle/%d/' % vehicle, {}),
+        'vehicle-stats': ('get', '/vehicles/stats/', {}),
+        'set_driver': ('patch', '/vehicles/set_driver/%d/' % vehicle, {'driver': driver}),
+    }
+
+
+def measure(client, method, url, data, repeat):
+    from django.db import connection
+
+    def call():
+        if method == 'get':
+            response = client.get(url, data)
+        else:
+            response = getattr(client, method)(url, json.dumps(data), content_type='application/json')
+        assert response.status_code == 200, (url, response.status_code, response.content[:200])
+
+    # one untimed call to count the queries and warm up; not with connection.queries,
+    # which the test client resets on request_started
+    queries = []
+
+    def count(execute, sql, params, many, context):
+        queries.append(sql)
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(count):
+        call()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        call()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        'queries': len(queries),
+        'median_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+        'min_ms': round(timings[0], 3),
+    }
+
+
+def run(args):
+    drivers, vehicles = SIZES[args.size]
+    setup_django(args.database)
+    import django
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.test import Client
+
+    from benchmarks.generator import generate
+    from rest.models import Driver, Vehicle
+
+    settings.REST_RESPONSE_CACHE = None
+    call_command('migrate', verbosity=0)
+    if not Vehicle.objects.exists():
+        print('seeding %d drivers and %d vehicles...' % (drivers, vehicles), file=sys.stderr)
+        generate(drivers, vehicles)
+
+    driver_ids = list(Driver.objects.order_by('id').values_list('id', flat=True))
+    vehicle_ids = list(Vehicle.objects.order_by('id').values_list('id', flat=True))
+    client = Client()
+    results = {}
+    for name, (method, url, data) in scenarios(driver_ids, vehicle_ids).items():
+        results[name] = measure(client, method, url, data, args.repeat)
+        print('%-32s %9.2f ms  p95 %9.2f ms  %3d queries' % (
+            name, results[name]['median_ms'], results[name]['p95_ms'], results[name]['queries'],
+        ), file=sys.stderr)
+
+    report = {
+        'size': args.size,
+        'drivers': len(driver_ids),
+        'vehicles': len(vehicle_ids),
+        'repeat': args.repeat,
+        'created': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as target:
+            json.dump(report, target, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+
+def compare(args):
+    with open(args.baseline) as source:
+        baseline = json.load(source)
+    with open(args.current) as source:
+        current = json.load(source)
+    if baseline['size'] != current['size']:
+        print('warning: comparing size %s against %s' % (baseline['size'], current['size']))
+
+    regressions = []
+    print('%-32s %12s %12s %8s %9s' % ('scenario', 'baseline ms', 'current ms', 'change', 'queries'))
+    for name, before in baseline['results'].items():
+        after = current['results'].get(name)
+        if after is None:
+            print('%-32s missing from %s' % (name, args.current))
+            regressions.append(name)
+            continue
+        change = after['median_ms'] / before['median_ms'] - 1 if before['median_ms'] else 0.0
+        problems = []
+        if change > args.latency_tolerance and after['median_ms'] - before['median_ms'] > args.noise_ms:
+            problems.append('slower')
+        if after['queries'] > before['queries'] + args.query_tolerance:
+            problems.append('more queries')
+        print('%-32s %12.2f %12.2f %+7.0f%% %4d->%-4d %s' % (
+            name, before['median_ms'], after['median_ms'], change * 100, before['queries'], after['queries'],
+            ', '.join(problems),
+        ))
+        if problems:
+            regressions.append(name)
+
+    if regressions:
+        print('\n%d regression(s): %s' % (len(regressions), ', '.join(regressions)))
+        return 1
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='measure every scenario and write the results as JSON')
+    run_parser.add_argument('--size', choices=SIZES, default='1k')
+    run_parser.add_argument('--repeat', type=int, default=20)
+    run_parser.add_argument('--database', help='SQLite file to use, seeded on first use, a scratch file by default')
+    run_parser.add_argument('--output', '-o', help='JSON file to write, stdout by default')
+
+    compare_parser = commands.add_parser('compare', help='fail when current regressed against baseline')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--latency-tolerance', type=float, default=0.25,
+                                help='allowed relative increase of the median, 0.25 by default')
+    compare_parser.add_argument('--noise-ms', type=float, default=1.0,
+                                help='median increases below this many ms never count')
+    compare_parser.add_argument('--query-tolerance', type=int, default=0, help='allowed additional queries')
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        run(args)
+    else:
+        sys.exit(compare(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class RestConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'rest'
+
+    def ready(self):
+        from . import cache, changes, history, metrics, search, signals, sqlite, stats  # noqa: F401 connect the receivers
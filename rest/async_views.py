@@ -0,0 +1,138 @@
+"""
+Coroutine versions of the list and retrieve endpoints of DriverView and
+VehicleView, for deployments behind an ASGI server.
+
+Django 3.2 has no async ORM, so the queries still run in a thread. What
+changes is which thread: a sync view under ASGI runs entirely on the one
+thread Django keeps for thread-sensitive code, so requests wait for each
+other's database round trips. Here the queries of a request run in a single
+call on a pool of REST_ASYNC_DATABASE_THREADS threads, and serialization and
+JSON rendering happen back on the event loop, from objects already loaded.
+
+The queryset, filters, ?q= search, ?expand=, pagination and ETag/Last-Modified
+handling are those of the viewset. The response cache is left to the sync views.
+"""
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.http.response import HttpResponseBase
+from rest_framework.exceptions import MethodNotAllowed
+from rest_framework.response import Response
+
+from .conditional import set_validators
+from .views import DriverView, VehicleView
+
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            getattr(settings, 'REST_ASYNC_DATABASE_THREADS', 32), thread_name_prefix='rest-db'
+        )
+    return _executor
+
+
+def database_sync_to_async(func):
+    """
+    Run `func` on the database thread pool, with the connection cleanup
+    Django does around a request. Each thread keeps its own connection, so
+    the pool size caps the number of connections the async views open.
+    """
+    def wrapper(*args, **kwargs):
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    async def inner(*args, **kwargs):
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(
+            get_executor(), partial(context.run, wrapper, *args, **kwargs)
+        )
+    return inner
+
+
+# load_* run in the thread pool and return either the objects to serialize
+# or a finished response (304), respond_* build the response from them
+
+def load_list(view):
+    view.initial(view.request)
+    query = view.search_query()
+    if query is not None:
+        return view.search_page(query)
+    not_modified = view.list_not_modified()
+    if not_modified is not None:
+        return not_modified
+    return view.paginate_queryset(view.filter_queryset(view.get_queryset()))
+
+
+def load_retrieve(view):
+    view.initial(view.request)
+    not_modified = view.detail_not_modified()
+    if not_modified is not None:
+        return not_modified
+    return view.get_object()
+
+
+def respond_list(view, page):
+    if view.search_query() is not None:
+        return view.search_response(page)
+    response = view.get_paginated_response(view.get_serializer(page, many=True).data)
+    return set_validators(response, view.page_validators())
+
+
+def respond_retrieve(view, instance):
+    return set_validators(Response(view.get_serializer(instance).data), view.object_validators(instance))
+
+
+ACTIONS = {
+    'list': (load_list, respond_list),
+    'retrieve': (load_retrieve, respond_retrieve),
+}
+
+
+def as_async_view(viewset_class, action):
+    """The `action` ('list' or 'retrieve') of `viewset_class` as a coroutine view."""
+    load, respond = ACTIONS[action]
+
+    async def view_func(request, *args, **kwargs):
+        view = viewset_class(action_map={'get': action, 'head': action})
+        view.args = args
+        view.kwargs = kwargs
+        request = view.initialize_request(request, *args, **kwargs)
+        view.request = request
+        view.headers = dict(view.default_response_headers, Allow='GET, HEAD')
+
+        try:
+            if view.action is None:
+                raise MethodNotAllowed(request.method)
+            loaded = await database_sync_to_async(load)(view)
+            response = loaded if isinstance(loaded, HttpResponseBase) else respond(view, loaded)
+        except Exception as exc:
+            response = view.handle_exception(exc)
+
+        response = view.finalize_response(request, response, *args, **kwargs)
+        if not isinstance(response, Response):
+            return response
+        if response.accepted_renderer.format == 'json':
+            response.render()
+        else:
+            # the browsable API renders forms, which query the database
+            await database_sync_to_async(response.render)()
+        return response
+
+    return view_func
+
+
+driver_list = as_async_view(DriverView, 'list')
+driver_detail = as_async_view(DriverView, 'retrieve')
+vehicle_list = as_async_view(VehicleView, 'list')
+vehicle_detail = as_async_view(VehicleView, 'retrieve')
@@ -0,0 +1,282 @@
+"""
+Response cache for the read endpoints of DriverView and VehicleView.
+
+Every cached response depends on a set of generation tokens: one per table
+it reads (lists, expanded responses) or one per object (plain detail
+responses). Writes replace the tokens they affect, which makes every entry
+built on the old tokens unreachable, and the LRU backend evicts them later.
+Tokens are random rather than counters, so an evicted token can only cause
+a miss, never serve a stale entry. The tokens live in the backend with the
+entries, so invalidation reaches exactly the processes sharing it.
+"""
+import threading
+import time
+from collections import OrderedDict
+from hashlib import sha1
+from urllib.parse import urlencode
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.http import Http404
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date
+from django.utils.module_loading import import_string
+
+from .conditional import set_validators
+from .models import Driver, Vehicle
+from .signals import bulk_changed
+
+
+class BaseCache:
+    """Interface of a response cache backend."""
+
+    def get(self, key):
+        """Return the value stored under `key`, or None."""
+        raise NotImplementedError
+
+    def set(self, key, value, timeout=None):
+        """Store `value` under `key`, for `timeout` seconds or until evicted when None."""
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class LocMemLRUCache(BaseCache):
+    """Per-process cache keeping the `max_entries` most recently used values."""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires is not None and expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=None):
+        expires = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class DjangoCache(BaseCache):
+    """Adapter to one of settings.CACHES, to share entries between processes."""
+
+    def __init__(self, alias='default'):
+        self.cache = caches[alias]
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, value, timeout=None):
+        self.cache.set(key, value, timeout)
+
+    def delete(self, key):
+        self.cache.delete(key)
+
+    def clear(self):
+        self.cache.clear()
+
+
+class ResponseCache:
+
+    def __init__(self, backend, timeout=None):
+        self.backend = backend
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        # += isn't atomic, and the views serve from several threads
+        self._lock = threading.Lock()
+
+    def token(self, *scope):
+        key = 'rest:token:%s' % ':'.join(map(str, scope))
+        token = self.backend.get(key)
+        if token is None:
+            token = uuid4().hex
+            self.backend.set(key, token)
+        return token
+
+    def invalidate(self, *scope):
+        self.backend.set('rest:token:%s' % ':'.join(map(str, scope)), uuid4().hex)
+
+    def make_key(self, request, scopes):
+        query = urlencode(sorted(
+            (name, value) for name, values in request.query_params.lists() for value in values
+        ))
+        parts = [request.get_host(), request.path, query] + [self.token(*scope) for scope in scopes]
+        return 'rest:response:%s' % sha1('\n'.join(parts).encode()).hexdigest()
+
+    def get(self, key):
+        value = self.backend.get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self.backend.set(key, value, self.timeout)
+
+    def clear(self):
+        self.backend.clear()
+        with self._lock:
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
+
+
+_response_cache = None
+
+
+def get_response_cache():
+    """The ResponseCache configured by settings.REST_RESPONSE_CACHE, or None when disabled."""
+    global _response_cache
+    config = getattr(settings, 'REST_RESPONSE_CACHE', None)
+    if not config:
+        return None
+    if _response_cache is None:
+        backend = import_string(config.get('BACKEND', 'rest.cache.LocMemLRUCache'))
+        _response_cache = ResponseCache(backend(**config.get('OPTIONS', {})), config.get('TIMEOUT'))
+    return _response_cache
+
+
+@receiver(setting_changed)
+def reset_response_cache(setting, **kwargs):
+    global _response_cache
+    if setting == 'REST_RESPONSE_CACHE':
+        _response_cache = None
+
+
+class CachedResponseMixin:
+    """
+    Serves list and retrieve from the response cache. Lists and expanded
+    responses depend on whole tables, plain detail responses only on their
+    own object. The ETag and Last-Modified of a response are cached with
+    it, so a revalidation hitting the cache needs no query at all.
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def get_cache_scopes(self):
+        model = self.queryset.model
+        if self.is_expanded():
+            related = model._meta.get_field(self.expand_field).related_model
+            return [(model._meta.model_name,), (related._meta.model_name,)]
+        if self.action == 'retrieve':
+            # the pk as invalidate() gets it, /01/ and /1/ share their token
+            try:
+                pk = model._meta.pk.to_python(self.kwargs[self.lookup_url_kwarg or self.lookup_field])
+            except ValidationError:
+                raise Http404
+            return [(model._meta.model_name, pk)]
+        return [(model._meta.model_name,)]
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        # imported here: this module loads with the receivers at startup, DRF's serializers with the views
+        from rest_framework.response import Response
+
+        cache = get_response_cache()
+        if cache is None:
+            return handler(request, *args, **kwargs)
+
+        # The key is taken before the response is built, so a write racing
+        # with this request leaves the entry under tokens it already replaced.
+        key = cache.make_key(request, self.get_cache_scopes())
+        entry = cache.get(key)
+        if entry is not None:
+            data, validators = entry
+            if validators is not None:
+                etag, last_modified = validators
+                not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+                if not_modified is not None:
+                    return set_validators(not_modified, validators)
+            response = Response(data)
+            if validators is not None:
+                set_validators(response, validators)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            validators = None
+            if response.has_header('ETag'):
+                last_modified = response.get('Last-Modified')
+                validators = (response['ETag'], last_modified and parse_http_date(last_modified))
+            cache.set(key, (response.data, validators))
+            response['X-Cache'] = 'MISS'
+        return response
+
+
+def invalidate(model, pks):
+    """
+    Replace the tokens of `model` and of its objects `pks` once the current
+    transaction commits: replaced earlier, a request reading the old rows
+    in between would cache them under the new tokens.
+    """
+    cache = get_response_cache()
+    if cache is None:
+        return
+    name = model._meta.model_name
+    pks = list(pks)
+
+    def replace_tokens():
+        cache.invalidate(name)
+        for pk in pks:
+            cache.invalidate(name, pk)
+    transaction.on_commit(replace_tokens)
+
+
+@receiver(post_save, sender=Driver)
+@receiver(post_save, sender=Vehicle)
+@receiver(post_delete, sender=Driver)
+@receiver(post_delete, sender=Vehicle)
+def invalidate_instance(sender, instance, **kwargs):
+    invalidate(sender, [instance.pk])
+
+
+@receiver(pre_delete, sender=Driver)
+def invalidate_unassigned_vehicles(sender, instance, **kwargs):
+    # on_delete=SET_NULL updates the driver's vehicles without post_save
+    invalidate(Vehicle, instance.vehicles.values_list('pk', flat=True))
+
+
+@receiver(bulk_changed)
+def invalidate_bulk(sender, pks, previous, **kwargs):
+    # new rows have no detail responses cached yet, only the lists are stale
+    invalidate(sender, pks if previous else [])
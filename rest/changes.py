@@ -0,0 +1,159 @@
+"""
+Change feed of drivers and vehicles for clients syncing the fleet.
+
+Every write appends a row to Change, whose id is the cursor:
+
+    GET /changes/               {"cursor": 812, "has_more": false, "results": []}
+    GET /changes/?cursor=812    the changes after 812, oldest first
+
+A client takes the current cursor, downloads the lists once, then polls with
+the cursor of the last response. In a page every object appears once, with
+its latest action and current data, deleted objects as tombstones with
+"data": null. Changes are kept REST_CHANGE_RETENTION_DAYS by `manage.py
+prune_changes`; a cursor older than that gets a 410 and the client downloads
+the lists again.
+
+Rows come from post_save/post_delete, bulk_changed (bulk endpoints,
+SetDriverView batches, imports) and pre_delete of a driver, whose vehicles
+SET_NULL unassigns. Ids follow the order rows are inserted in; SQLite
+serializes write transactions, so that is also the order they commit in.
+Other backends commit concurrent transactions in any order: a row could
+commit after a client read past its id and be skipped. There the feed stops
+before the changes of the last REST_CHANGE_COMMIT_WINDOW seconds, which
+must be longer than any write transaction.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Max, Min
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .models import Change, Driver, Vehicle
+from .signals import bulk_changed
+
+CREATED, UPDATED, DELETED = 'created', 'updated', 'deleted'
+# model name: (model, name of the serializer of the data in rest.serializers)
+SOURCES = {
+    'driver': (Driver, 'DriverSerializer'),
+    'vehicle': (Vehicle, 'VehicleSerializer'),
+}
+# changes deleted per statement by prune(), to keep the write lock short
+PRUNE_BATCH_SIZE = 10000
+
+
+class CursorExpired(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = 'Changes after this cursor were pruned, download the lists again.'
+    default_code = 'cursor_expired'
+
+
+def log(model, pks, action):
+    Change.objects.bulk_create(
+        [Change(model=model._meta.model_name, object_id=pk, action=action) for pk in pks]
+    )
+
+
+def commit_horizon():
+    """Changes created from this time on may still commit before older ids, None when ids commit in order."""
+    if connections[Change.objects.db].vendor == 'sqlite':
+        return None
+    return timezone.now() - timedelta(seconds=settings.REST_CHANGE_COMMIT_WINDOW)
+
+
+def committed_changes():
+    """The changes no uncommitted change can precede, see commit_horizon()."""
+    horizon = commit_horizon()
+    return Change.objects.all() if horizon is None else Change.objects.filter(created_at__lt=horizon)
+
+
+def latest_cursor():
+    return committed_changes().aggregate(cursor=Max('id'))['cursor'] or 0
+
+
+def expired(cursor, rows):
+    """Whether prune() deleted changes after `cursor`, `rows` being the first ones after it."""
+    if rows and rows[0][0] == cursor + 1:
+        return False
+    # prune() deletes from the oldest, so the cursor's row is gone only if changes after it may be too
+    if cursor:
+        return not Change.objects.filter(id=cursor).exists()
+    # 0 is before the first change, id 1
+    return Change.objects.exists() and not Change.objects.filter(id=1).exists()
+
+
+def get_changes(cursor, limit):
+    """{cursor, has_more, results} of the changes after `cursor`, raises CursorExpired."""
+    # imported here: the receivers below load at startup, the serializers with the views
+    from . import serializers
+    from .fast import get_row_serializer
+
+    rows = list(
+        committed_changes().filter(id__gt=cursor).order_by('id').values_list('id', 'model', 'object_id', 'action')[:limit + 1]
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if expired(cursor, rows):
+        raise CursorExpired()
+
+    # {(model, id): action}, in the order of each object's latest change
+    latest = {}
+    for _, model, object_id, action in rows:
+        previous = latest.pop((model, object_id), None)
+        latest[model, object_id] = CREATED if previous == CREATED and action == UPDATED else action
+
+    data = {}
+    for name, (model, serializer_name) in SOURCES.items():
+        pks = [object_id for (model_name, object_id), action in latest.items() if model_name == name and action != DELETED]
+        if pks:
+            row_serializer = get_row_serializer(getattr(serializers, serializer_name))
+            values = model.objects.filter(pk__in=pks).values_list(*row_serializer.lookups)
+            data.update(((name, item['id']), item) for item in row_serializer.to_representation(values))
+
+    results = []
+    for (name, object_id), action in latest.items():
+        item = data.get((name, object_id))
+        # an object missing here was deleted by a later change, tombstone it now
+        results.append({'model': name, 'id': object_id, 'action': DELETED if item is None else action, 'data': item})
+    return {'cursor': rows[-1][0] if rows else cursor, 'has_more': has_more, 'results': results}
+
+
+def prune(before):
+    """Delete the changes older than `before`, always keeping the latest one, and return how many."""
+    upper = Change.objects.filter(created_at__lt=before, id__lt=latest_cursor()).aggregate(id=Max('id'))['id']
+    if upper is None:
+        return 0
+    deleted = 0
+    oldest = Change.objects.aggregate(id=Min('id'))['id']
+    for start in range(oldest, upper + 1, PRUNE_BATCH_SIZE):
+        deleted += Change.objects.filter(id__lte=min(start + PRUNE_BATCH_SIZE - 1, upper)).delete()[0]
+    return deleted
+
+
+@receiver(post_save, sender=Driver)
+@receiver(post_save, sender=Vehicle)
+def log_saved(sender, instance, created, **kwargs):
+    log(sender, [instance.pk], CREATED if created else UPDATED)
+
+
+@receiver(post_delete, sender=Driver)
+@receiver(post_delete, sender=Vehicle)
+def log_deleted(sender, instance, **kwargs):
+    log(sender, [instance.pk], DELETED)
+
+
+@receiver(pre_delete, sender=Driver)
+def log_unassigned_vehicles(sender, instance, **kwargs):
+    # on_delete=SET_NULL updates the driver's vehicles without post_save
+    log(Vehicle, list(instance.vehicles.values_list('pk', flat=True)), UPDATED)
+
+
+@receiver(bulk_changed, sender=Driver)
+@receiver(bulk_changed, sender=Vehicle)
+def log_bulk_changes(sender, pks, previous, **kwargs):
+    log(sender, [pk for pk in pks if pk not in previous], CREATED)
+    log(sender, [pk for pk in pks if pk in previous], UPDATED)
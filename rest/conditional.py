@@ -0,0 +1,213 @@
+"""
+Strong ETag and Last-Modified validators built from updated_at.
+
+A response is identified by the (id, updated_at) of the rows it shows, the
+number and latest updated_at of the related rows nested by ?expand=, and
+for lists the cursor links. The same validators come either from the loaded
+objects once a response is built, or from a lightweight values() query that
+runs before serialization when the client sends a conditional header.
+"""
+from hashlib import sha1
+from urllib.parse import urlencode
+
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+CONDITIONAL_GET_HEADERS = ('HTTP_IF_NONE_MATCH', 'HTTP_IF_MODIFIED_SINCE')
+CONDITIONAL_UPDATE_HEADERS = ('HTTP_IF_MATCH', 'HTTP_IF_UNMODIFIED_SINCE')
+
+
+def _value(row, name):
+    return row[name] if isinstance(row, dict) else getattr(row, name)
+
+
+def make_validators(model, kind, variant, rows, related=None, links=()):
+    """
+    Return (etag, last_modified timestamp) for `rows` of `model`.
+
+    `related` is a (count, latest updated_at) pair of the nested rows,
+    `variant` the normalized query string of the representation.
+    """
+    stamps = [_value(row, 'updated_at') for row in rows]
+    parts = [model._meta.label, kind, variant] + list(map(str, links))
+    parts += ['%s@%s' % (_value(row, 'id'), stamp.isoformat()) for row, stamp in zip(rows, stamps)]
+    if related is not None:
+        count, latest = related
+        parts.append('%s:%s' % (count, latest.isoformat() if latest else ''))
+        if latest:
+            stamps.append(latest)
+    etag = quote_etag(sha1('|'.join(parts).encode()).hexdigest())
+    return etag, int(max(stamps).timestamp()) if stamps else None
+
+
+def set_validators(response, validators):
+    etag, last_modified = validators
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def has_conditional_headers(request, headers):
+    return any(header in request.META for header in headers)
+
+
+class ConditionalGetMixin:
+    """
+    ETag and Last-Modified on list and retrieve, answering If-None-Match and
+    If-Modified-Since with a 304 before anything is serialized.
+    """
+
+    def get_variant(self):
+        return urlencode(sorted(
+            (name, value) for name, values in self.request.query_params.lists() for value in values
+        ))
+
+    def get_expand_relation(self):
+        if not self.is_expanded():
+            return None
+        return self.queryset.model._meta.get_field(self.expand_field)
+
+    def related_from_objects(self, objs):
+        relation = self.get_expand_relation()
+        if relation is None:
+            return None
+        if relation.one_to_many:
+            nested = [item for obj in objs for item in getattr(obj, relation.name).all()]
+        else:
+            nested = list({item.pk: item for item in (getattr(obj, relation.name) for obj in objs) if item}.values())
+        return len(nested), max((item.updated_at for item in nested), default=None)
+
+    def related_from_rows(self, rows):
+        relation = self.get_expand_relation()
+        if relation is None:
+            return None
+        if relation.one_to_many:
+            nested = relation.related_model.objects.filter(
+                **{'%s__in' % relation.field.name: [row['id'] for row in rows]}
+            )
+        else:
+            nested = relation.related_model.objects.filter(pk__in={row[relation.attname] for row in rows})
+        aggregate = nested.aggregate(count=Count('pk'), latest=Max('updated_at'))
+        return aggregate['count'], aggregate['latest']
+
+    def row_fields(self):
+        fields = {'id', 'updated_at'}
+        relation = self.get_expand_relation()
+        if relation is not None and relation.many_to_one:
+            fields.add(relation.attname)
+        return fields
+
+    def list_validators_from_db(self):
+        paginator = self.pagination_class()
+        queryset = self.filter_queryset(self.get_queryset())
+        ordering = [order.lstrip('-') for order in paginator.get_ordering(self.request, queryset, self)]
+        rows = paginator.paginate_queryset(
+            queryset.values(*self.row_fields().union(ordering)), self.request, view=self
+        )
+        return make_validators(
+            queryset.model, 'list', self.get_variant(), rows, self.related_from_rows(rows),
+            (paginator.has_next, paginator.has_previous),
+        )
+
+    def detail_validators_from_db(self):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        row = self.filter_queryset(self.get_queryset()).filter(
+            **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        ).values(*self.row_fields()).first()
+        if row is None:
+            return None
+        return make_validators(self.queryset.model, 'detail', self.get_variant(), [row], self.related_from_rows([row]))
+
+    def not_modified(self, validators):
+        """The 304 response if `validators` satisfy the request's conditional headers, otherwise None."""
+        if validators is None:
+            return None
+        etag, last_modified = validators
+        response = get_conditional_response(self.request, etag=etag, last_modified=last_modified)
+        return None if response is None else set_validators(response, validators)
+
+    def list_not_modified(self):
+        if not has_conditional_headers(self.request, CONDITIONAL_GET_HEADERS):
+            return None
+        return self.not_modified(self.list_validators_from_db())
+
+    def detail_not_modified(self):
+        if not has_conditional_headers(self.request, CONDITIONAL_GET_HEADERS):
+            return None
+        return self.not_modified(self.detail_validators_from_db())
+
+    def page_validators(self):
+        page = self.paginator.page
+        return make_validators(
+            self.queryset.model, 'list', self.get_variant(), page, self.related_from_objects(page),
+            (self.paginator.has_next, self.paginator.has_previous),
+        )
+
+    def object_validators(self, instance):
+        return make_validators(
+            self.queryset.model, 'detail', self.get_variant(), [instance], self.related_from_objects([instance]),
+        )
+
+    def list(self, request, *args, **kwargs):
+        not_modified = self.list_not_modified()
+        if not_modified is not None:
+            return not_modified
+
+        response = super().list(request, *args, **kwargs)
+        if self.paginator is not None and response.status_code == 200:
+            set_validators(response, self.page_validators())
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        # imported here, see CachedResponseMixin.cached_response()
+        from rest_framework.response import Response
+
+        not_modified = self.detail_not_modified()
+        if not_modified is not None:
+            return not_modified
+
+        instance = self.get_object()
+        return set_validators(Response(self.get_serializer(instance).data), self.object_validators(instance))
+
+
+class ConditionalUpdateMixin:
+    """
+    If-Match and If-Unmodified-Since on PUT and PATCH. If-Match takes the ETag
+    of a GET of the object's URL without a query string; the ETags of other
+    representations (?format=, ?fields=, ?expand=) never match and get a 412.
+
+    Where the backend has row locks, the row is locked while the precondition
+    is checked, so two clients updating from the same ETag can't both
+    succeed; the loser gets a 412. SQLite ignores select_for_update(): there
+    the check isn't atomic with the update.
+    """
+
+    def update(self, request, *args, **kwargs):
+        if not has_conditional_headers(request, CONDITIONAL_UPDATE_HEADERS):
+            return self.with_validators(super().update(request, *args, **kwargs))
+
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        with transaction.atomic():
+            row = self.get_queryset().select_for_update().filter(
+                **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+            ).values('id', 'updated_at').first()
+            if row is not None:
+                # the variant of the plain URL, see the docstring
+                etag, last_modified = make_validators(self.queryset.model, 'detail', '', [row])
+                failed = get_conditional_response(request, etag=etag, last_modified=last_modified)
+                if failed is not None:
+                    return failed
+            return self.with_validators(super().update(request, *args, **kwargs))
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        self.updated_instance = serializer.instance
+
+    def with_validators(self, response):
+        instance = getattr(self, 'updated_instance', None)
+        if instance is None or response.status_code != 200:
+            return response
+        return set_validators(response, make_validators(self.queryset.model, 'detail', '', [instance]))
@@ -0,0 +1,111 @@
+"""
+Primary/replica routing, enabled by test_task/settings_production.py.
+
+Writes always go to the primary ('default'). Reads go to one of the
+REST_DB_REPLICAS only while ReplicaRoutingMiddleware serves a GET or HEAD
+request that hasn't written anything yet, so the read endpoints of
+DriverView and VehicleView use the replicas, while SetDriverView and every
+other write request, and any code outside a request, stay on the primary.
+
+A request that writes gets a cookie that keeps the client's reads on the
+primary for REST_DB_PIN_SECONDS, so it reads its own writes in the requests
+that follow too, even if the replicas lag behind.
+"""
+import asyncio
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+PIN_COOKIE = 'rest_db_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class RoutingState:
+    """Routing of the request being served. Mutable, so a write seen in a copied context still pins the request."""
+
+    def __init__(self, use_replicas):
+        self.use_replicas = use_replicas
+        self.replica = None
+        self.wrote = False
+
+
+_state = ContextVar('rest_db_routing', default=None)
+
+
+class PrimaryReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        replicas = getattr(settings, 'REST_DB_REPLICAS', ())
+        if state is None or not state.use_replicas or state.wrote or not replicas:
+            return DEFAULT_DB_ALIAS
+        # one replica for the whole request, so its queries see one snapshot
+        if state.replica is None:
+            state.replica = random.choice(replicas)
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *getattr(settings, 'REST_DB_REPLICAS', ())}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+def _stream_with_state(state, content):
+    previous = _state.get()
+    _state.set(state)
+    try:
+        yield from content
+    finally:
+        _state.set(previous)
+
+
+class ReplicaRoutingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # async mode, as in django.utils.deprecation.MiddlewareMixin
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        safe = request.method in SAFE_METHODS
+        state = RoutingState(use_replicas=safe and PIN_COOKIE not in request.COOKIES)
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.finish(response, state, safe)
+
+    async def __acall__(self, request):
+        safe = request.method in SAFE_METHODS
+        state = RoutingState(use_replicas=safe and PIN_COOKIE not in request.COOKIES)
+        token = _state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.finish(response, state, safe)
+
+    def finish(self, response, state, safe):
+        if response.streaming:
+            # the export queries run while the response is iterated
+            response.streaming_content = _stream_with_state(state, response.streaming_content)
+        if state.wrote or not safe:
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=getattr(settings, 'REST_DB_PIN_SECONDS', 5), httponly=True, samesite='Lax',
+            )
+        return response
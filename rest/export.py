@@ -0,0 +1,77 @@
+"""
+Streaming export of every vehicle joined with its driver, as NDJSON or CSV.
+
+Rows are read with QuerySet.iterator() and written as they come, so memory
+stays flat however large the fleet is.
+"""
+import csv
+import json
+
+from django.conf import settings
+from django.utils import timezone
+
+from .fast import compile_datetime_format
+from .filters import VehicleFilter, get_query_filter
+from .models import Vehicle
+
+# (column, QuerySet.values() lookup)
+COLUMNS = (
+    ('id', 'id'),
+    ('driver', 'driver_id'),
+    ('make', 'make'),
+    ('model', 'model'),
+    ('plate_number', 'plate_number'),
+    ('created_at', 'created_at'),
+    ('updated_at', 'updated_at'),
+    ('driver_first_name', 'driver__first_name'),
+    ('driver_last_name', 'driver__last_name'),
+)
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+CHUNK_SIZE = 2000
+
+
+def fleet_queryset(params):
+    """Vehicles with their drivers, filtered like the vehicle list, raises ValidationError for invalid `params`."""
+    query_set = get_query_filter(VehicleFilter, params).filter_queryset(Vehicle.objects.all())
+    return query_set.order_by('id').values_list(*(lookup for _, lookup in COLUMNS))
+
+
+_format_datetime = compile_datetime_format(settings.DATETIME_INPUT_FORMATS)
+
+
+def format_datetime(value):
+    return _format_datetime(value, timezone.get_current_timezone())
+
+
+def iter_rows(query_set, chunk_size=CHUNK_SIZE):
+    datetime_columns = [index for index, (name, _) in enumerate(COLUMNS) if name in ('created_at', 'updated_at')]
+    for row in query_set.iterator(chunk_size=chunk_size):
+        row = list(row)
+        for index in datetime_columns:
+            row[index] = format_datetime(row[index])
+        yield row
+
+
+def iter_ndjson(query_set, chunk_size=CHUNK_SIZE):
+    names = [name for name, _ in COLUMNS]
+    for row in iter_rows(query_set, chunk_size):
+        yield json.dumps(dict(zip(names, row)), ensure_ascii=False) + '\n'
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def iter_csv(query_set, chunk_size=CHUNK_SIZE):
+    writer = csv.writer(_Echo())
+    yield writer.writerow([name for name, _ in COLUMNS])
+    for row in iter_rows(query_set, chunk_size):
+        yield writer.writerow(row)
+
+
+def iter_export(export_format, query_set, chunk_size=CHUNK_SIZE):
+    return {'ndjson': iter_ndjson, 'csv': iter_csv}[export_format](query_set, chunk_size)
@@ -0,0 +1,134 @@
+"""
+Query parameter filters of the list endpoints, declared as serializers.
+
+Every field of a QueryFilter is a query parameter, validated like a request
+body (an invalid value is a 400 naming the parameter) and applied as
+queryset.filter(<field source>=value), or by its filter_<name>() method
+when it needs more than a lookup. All the parameters of a request add up to
+one WHERE clause of a single query.
+
+    ?created_at__gte=10-11-2021&updated_at__lte=2021-11-20T10:00:00Z
+    ?updated_since=2021-11-20T10:00:00Z&ordering=updated_at    incremental sync
+    ?driver=1,2,3&make=Toyota,BMW&ordering=-created_at
+
+`ordering` picks one of the filter's orderings; each ends with id, so the
+keyset pagination gets a unique key, and each is served by an index.
+"""
+from rest_framework import ISO_8601, serializers
+from rest_framework.filters import BaseFilterBackend
+
+from rest.models import normalize_plate_number
+
+DATE_FORMATS = ('%d-%m-%Y', ISO_8601)
+
+
+class CommaSeparatedListField(serializers.ListField):
+    """?name=1,2&name=3 -> [1, 2, 3]"""
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('allow_empty', False)
+        super().__init__(**kwargs)
+
+    def get_value(self, dictionary):
+        if self.field_name not in dictionary:
+            return serializers.empty
+        values = dictionary.getlist(self.field_name) if hasattr(dictionary, 'getlist') else [dictionary[self.field_name]]
+        return [item for value in values for item in value.split(',') if item]
+
+
+def date_param():
+    return serializers.DateTimeField(input_formats=DATE_FORMATS, required=False)
+
+
+class QueryFilter(serializers.Serializer):
+    # ?ordering= value: the ordering of the query
+    orderings = {
+        'created_at': ('created_at', 'id'),
+        '-created_at': ('-created_at', '-id'),
+        'updated_at': ('updated_at', 'id'),
+        '-updated_at': ('-updated_at', '-id'),
+        'id': ('id',),
+        '-id': ('-id',),
+    }
+    default_ordering = 'created_at'
+
+    created_at__gte = date_param()
+    created_at__lte = date_param()
+    updated_at__gte = date_param()
+    updated_at__lte = date_param()
+    updated_since = date_param()
+
+    def get_fields(self):
+        fields = super().get_fields()
+        fields['ordering'] = serializers.ChoiceField(list(self.orderings), required=False)
+        return fields
+
+    def filter_queryset(self, queryset):
+        lookups = {}
+        for name, field in self.fields.items():
+            if name == 'ordering' or field.source not in self.validated_data:
+                continue
+            value = self.validated_data[field.source]
+            method = getattr(self, 'filter_%s' % name, None)
+            if method is not None:
+                queryset = method(queryset, value)
+            else:
+                lookups[field.source] = value
+        return queryset.filter(**lookups)
+
+    def filter_updated_since(self, queryset, value):
+        # inclusive, so rows sharing the timestamp of the client's last sync aren't missed
+        return queryset.filter(updated_at__gte=value)
+
+    def get_ordering(self):
+        return self.orderings[self.validated_data.get('ordering', self.default_ordering)]
+
+
+class DriverFilter(QueryFilter):
+    pass
+
+
+class VehicleFilter(QueryFilter):
+    driver = CommaSeparatedListField(child=serializers.IntegerField(min_value=1), source='driver_id__in', required=False)
+    make = CommaSeparatedListField(child=serializers.CharField(), source='make__in', required=False)
+    model = CommaSeparatedListField(child=serializers.CharField(), source='model__in', required=False)
+    with_drivers = serializers.ChoiceField(('yes', 'no'), required=False)
+    plate_number = serializers.CharField(required=False)
+
+    def filter_with_drivers(self, queryset, value):
+        return queryset.filter(driver__isnull=value == 'no')
+
+    def filter_plate_number(self, queryset, value):
+        """?plate_number=aa 1234 oo for one plate, ?plate_number=AA 12* for every plate starting with AA12."""
+        if not value.endswith('*'):
+            return queryset.filter(plate_number_normalized=normalize_plate_number(value))
+        prefix = normalize_plate_number(value[:-1])
+        if not prefix:
+            return queryset
+        # a range rather than startswith, which SQLite turns into a LIKE that can't use the index
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        return queryset.filter(plate_number_normalized__gte=prefix, plate_number_normalized__lt=upper)
+
+
+def get_query_filter(filter_class, params):
+    """The validated `filter_class` of the query parameters `params`, raises ValidationError."""
+    query_filter = filter_class(data=params)
+    query_filter.is_valid(raise_exception=True)
+    return query_filter
+
+
+class QueryFilterBackend(BaseFilterBackend):
+    """Applies the view's `filter_class` to its queryset and gives the paginator its ordering."""
+
+    def get_query_filter(self, request, view):
+        # validated once per request, the paginator and the ETag queries ask again
+        query_filter = getattr(request, '_query_filter', None)
+        if query_filter is None:
+            query_filter = request._query_filter = get_query_filter(view.filter_class, request.query_params)
+        return query_filter
+
+    def filter_queryset(self, request, queryset, view):
+        return self.get_query_filter(request, view).filter_queryset(queryset)
+
+    def get_ordering(self, request, queryset, view):
+        return self.get_query_filter(request, view).get_ordering()
@@ -0,0 +1,162 @@
+"""
+History of the vehicles' drivers, as VehicleAssignment intervals.
+
+    GET /vehicles/vehicle/<id>/assignments/?at=2021-11-20T10:00:00Z     who drove it then
+    GET /vehicles/vehicle/<id>/assignments/?since=01-11-2021&until=30-11-2021
+    GET /drivers/driver/<id>/assignments/?at=2021-11-20T10:00:00Z       what they drove then
+
+An interval opens when a vehicle gets a driver and closes when it changes or
+loses it, including on_delete=SET_NULL, or when the vehicle is deleted.
+Intervals start at the vehicle's updated_at of the write. They come from
+post_save/post_delete of vehicles, pre_delete of drivers and bulk_changed
+(bulk endpoints, SetDriverView batches, imports).
+
+A vehicle's intervals don't overlap, so the one covering a time is the last
+one starting before it: one seek in (vehicle_id, valid_from), then the
+following ones for a range. A driver has an interval per vehicle at a time,
+but the ones covering a time all end after it: its queries seek in
+(driver_id, valid_to) past the intervals closed before, and to its open ones.
+`manage.py compact_assignments` deletes old intervals, or merges them.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Driver, Vehicle, VehicleAssignment
+from .signals import bulk_changed
+
+# ids per query, below SQLite's limit of bound parameters
+BATCH_SIZE = 900
+# marks a vehicle loaded without driver_id
+DEFERRED = object()
+
+
+def open_intervals(rows):
+    """Open an interval for every (vehicle_id, driver_id, valid_from) with a driver."""
+    VehicleAssignment.objects.bulk_create([
+        VehicleAssignment(vehicle_id=vehicle_id, driver_id=driver_id, valid_from=valid_from)
+        for vehicle_id, driver_id, valid_from in rows if driver_id is not None
+    ], batch_size=BATCH_SIZE)
+
+
+def close_intervals(vehicle_ids, valid_to):
+    for start in range(0, len(vehicle_ids), BATCH_SIZE):
+        VehicleAssignment.objects.filter(
+            vehicle_id__in=vehicle_ids[start:start + BATCH_SIZE], valid_to__isnull=True
+        ).update(valid_to=valid_to)
+
+
+def overlapping(intervals, since=None, until=None):
+    """The `intervals` overlapping [since, until], either bound optional."""
+    if since is not None:
+        intervals = intervals.filter(Q(valid_to__gt=since) | Q(valid_to__isnull=True))
+    if until is not None:
+        intervals = intervals.filter(valid_from__lte=until)
+    return intervals
+
+
+def vehicle_history(vehicle_id, since=None, until=None):
+    """The intervals of a vehicle overlapping [since, until], oldest first."""
+    intervals = VehicleAssignment.objects.filter(vehicle_id=vehicle_id)
+    if since is not None:
+        # only the last interval starting before `since` can cover it
+        covering = intervals.filter(valid_from__lte=since).order_by('-valid_from').values('valid_from')[:1]
+        intervals = intervals.filter(valid_from__gte=Coalesce(Subquery(covering), Value(since)))
+    return overlapping(intervals, since, until).order_by('valid_from')
+
+
+def driver_history(driver_id, since=None, until=None):
+    """The intervals of a driver overlapping [since, until], oldest first."""
+    intervals = VehicleAssignment.objects.filter(driver_id=driver_id)
+    if since is not None:
+        # the intervals still open and those closing after `since`, two seeks in
+        # (driver_id, valid_to) rather than every interval starting before it
+        intervals = intervals.filter(valid_to__gt=since) | intervals.filter(valid_to__isnull=True)
+    return overlapping(intervals, None, until).order_by('valid_from', 'vehicle_id')
+
+
+def compact(before, merge_gap=None):
+    """
+    Delete the intervals closed before `before`, or with `merge_gap` merge
+    each into the previous one of the same vehicle and driver when at most
+    `merge_gap` apart. Return the number of intervals removed.
+
+    Merging is lossy: the two intervals come from different writes, so there
+    is always a gap between them, and the merged one claims the driver had
+    the vehicle during it.
+    """
+    old = VehicleAssignment.objects.filter(valid_to__lt=before)
+    if merge_gap is None:
+        return old.delete()[0]
+
+    # {id: new valid_to} of the intervals absorbing others, ids of the absorbed ones
+    extended, merged = {}, []
+    last = None
+    rows = old.order_by('vehicle_id', 'valid_from').values_list('id', 'vehicle_id', 'driver_id', 'valid_from', 'valid_to')
+    for pk, vehicle_id, driver_id, valid_from, valid_to in rows.iterator():
+        if last and last[1:3] == [vehicle_id, driver_id] and valid_from - last[3] <= merge_gap:
+            last[3] = extended[last[0]] = max(last[3], valid_to)
+            merged.append(pk)
+        else:
+            last = [pk, vehicle_id, driver_id, valid_to]
+    with transaction.atomic():
+        VehicleAssignment.objects.bulk_update(
+            [VehicleAssignment(id=pk, valid_to=valid_to) for pk, valid_to in extended.items()], ['valid_to'],
+            batch_size=BATCH_SIZE,
+        )
+        for start in range(0, len(merged), BATCH_SIZE):
+            VehicleAssignment.objects.filter(id__in=merged[start:start + BATCH_SIZE]).delete()
+    return len(merged)
+
+
+@receiver(post_init, sender=Vehicle)
+def remember_driver(sender, instance, **kwargs):
+    # the driver of the open interval, to find out whether the next save changes it
+    instance._assigned = instance.__dict__.get('driver_id', DEFERRED)
+
+
+@receiver(pre_save, sender=Vehicle)
+def load_driver(sender, instance, raw, **kwargs):
+    if instance._assigned is DEFERRED and not instance._state.adding:
+        instance._assigned = Vehicle.objects.filter(pk=instance.pk).values_list('driver_id', flat=True).first()
+
+
+@receiver(post_save, sender=Vehicle)
+def record_saved_vehicle(sender, instance, created, **kwargs):
+    if not created and instance._assigned != instance.driver_id:
+        close_intervals([instance.pk], instance.updated_at)
+    if created or instance._assigned != instance.driver_id:
+        open_intervals([(instance.pk, instance.driver_id, instance.updated_at)])
+    instance._assigned = instance.driver_id
+
+
+@receiver(post_delete, sender=Vehicle)
+def record_deleted_vehicle(sender, instance, **kwargs):
+    close_intervals([instance.pk], timezone.now())
+
+
+@receiver(pre_delete, sender=Driver)
+def record_unassigned_vehicles(sender, instance, **kwargs):
+    # on_delete=SET_NULL updates the driver's vehicles without post_save
+    VehicleAssignment.objects.filter(driver_id=instance.pk, valid_to__isnull=True).update(valid_to=timezone.now())
+
+
+@receiver(bulk_changed, sender=Vehicle)
+def record_bulk_changes(sender, pks, previous, **kwargs):
+    opened, closed = [], defaultdict(list)
+    for start in range(0, len(pks), BATCH_SIZE):
+        rows = Vehicle.objects.filter(pk__in=pks[start:start + BATCH_SIZE]).values_list('id', 'driver_id', 'updated_at')
+        for pk, driver_id, updated_at in rows:
+            if pk in previous:
+                if previous[pk]['driver_id'] == driver_id:
+                    continue
+                closed[updated_at].append(pk)
+            opened.append((pk, driver_id, updated_at))
+    for valid_to, vehicle_ids in closed.items():
+        close_intervals(vehicle_ids, valid_to)
+    open_intervals(opened)
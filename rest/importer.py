@@ -0,0 +1,197 @@
+"""
+Bulk import of vehicles from the CSV or NDJSON produced by export_fleet.
+
+The input is read as a stream and cut into batches. Each batch is parsed and
+validated, optionally in a process pool since that part needs no database,
+then inserted with one bulk_create in its own transaction. After every
+committed batch the number of input rows consumed is saved to a checkpoint
+file, and a new run with the same checkpoint continues from there. A crash
+between a commit and the checkpoint write replays at most that one batch.
+"""
+import csv
+import json
+import os
+import re
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.db import transaction
+
+from .mixins import bulk_create
+from .models import Driver, Vehicle, normalize_plate_number
+from .serializers import PLATE_NUMBER_REGEX
+from .signals import bulk_changed
+
+FORMATS = ('csv', 'ndjson')
+PLATE_NUMBER = re.compile(PLATE_NUMBER_REGEX)
+# ids or plate numbers per query, below SQLite's limit of bound parameters
+LOOKUP_BATCH_SIZE = 900
+
+
+def read_records(path, input_format, skip=0):
+    """Yield (line number, raw record) from the file, after the first `skip` records."""
+    with open(path, newline='', encoding='utf-8') as source:
+        if input_format == 'csv':
+            reader = csv.DictReader(source)
+            records = ((reader.line_num, record) for record in reader)
+        else:
+            records = ((number, line) for number, line in enumerate(source, 1) if line.strip())
+        yield from islice(records, skip, None)
+
+
+def validate_record(record):
+    """Return ((make, model, plate_number, driver_id), None) or (None, error)."""
+    if isinstance(record, str):
+        try:
+            record = json.loads(record)
+        except ValueError as e:
+            return None, 'invalid JSON: %s' % e
+        if not isinstance(record, dict):
+            return None, 'expected a JSON object'
+
+    errors = []
+    values = []
+    for name in ('make', 'model'):
+        value = record.get(name)
+        if not isinstance(value, str) or not value.strip() or len(value) > 255:
+            errors.append('%s: expected a non-empty string of at most 255 characters' % name)
+        values.append(value)
+
+    plate_number = record.get('plate_number')
+    if not isinstance(plate_number, str) or not PLATE_NUMBER.match(plate_number):
+        errors.append('plate_number: %r does not match the required pattern' % (plate_number,))
+    values.append(plate_number)
+
+    driver = record.get('driver')
+    if driver in (None, ''):
+        driver = None
+    # type() rather than isinstance(), JSON true would be driver 1
+    elif type(driver) is int or (isinstance(driver, str) and driver.isdigit()):
+        driver = int(driver)
+    else:
+        errors.append('driver: %r is not a valid id' % (driver,))
+    values.append(driver)
+
+    if errors:
+        return None, '; '.join(errors)
+    return tuple(values), None
+
+
+def validate_batch(batch):
+    """Validate [(line number, raw record)] into ([(line number, values)], [(line number, error)])."""
+    rows = []
+    errors = []
+    for number, record in batch:
+        values, error = validate_record(record)
+        if error is None:
+            rows.append((number, values))
+        else:
+            errors.append((number, error))
+    return rows, errors
+
+
+def _batches(records, batch_size):
+    iterator = iter(records)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def _validated(batches, workers):
+    """validate_batch over `batches` in input order, keeping at most 2 * workers batches in flight."""
+    if not workers:
+        for batch in batches:
+            yield len(batch), validate_batch(batch)
+        return
+
+    with ProcessPoolExecutor(workers) as executor:
+        pending = deque()
+        for batch in batches:
+            pending.append((len(batch), executor.submit(validate_batch, batch)))
+            if len(pending) >= 2 * workers:
+                size, future = pending.popleft()
+                yield size, future.result()
+        while pending:
+            size, future = pending.popleft()
+            yield size, future.result()
+
+
+class FleetImporter:
+
+    def __init__(self, path, input_format, batch_size=5000, workers=0, checkpoint=None, progress=None):
+        if input_format not in FORMATS:
+            raise ValueError('Unknown format %r, expected one of %s' % (input_format, ', '.join(FORMATS)))
+        self.path = path
+        self.input_format = input_format
+        self.batch_size = batch_size
+        self.workers = workers
+        self.checkpoint = checkpoint
+        # called after every batch with the running totals
+        self.progress = progress
+        self.consumed = self.imported = 0
+        self.errors = []
+
+    def load_checkpoint(self):
+        if not self.checkpoint or not os.path.exists(self.checkpoint):
+            return 0
+        with open(self.checkpoint) as source:
+            state = json.load(source)
+        if state.get('path') != os.path.abspath(self.path):
+            raise ValueError('Checkpoint %s belongs to %s' % (self.checkpoint, state.get('path')))
+        return state['consumed']
+
+    def save_checkpoint(self):
+        if not self.checkpoint:
+            return
+        temporary = self.checkpoint + '.tmp'
+        with open(temporary, 'w') as target:
+            json.dump({'path': os.path.abspath(self.path), 'consumed': self.consumed}, target)
+        os.replace(temporary, self.checkpoint)
+
+    def insert(self, rows):
+        known = set()
+        for batch in _batches({values[3] for _, values in rows} - {None}, LOOKUP_BATCH_SIZE):
+            known.update(Driver.objects.filter(id__in=batch).values_list('id', flat=True))
+        taken = set()
+        for batch in _batches({normalize_plate_number(values[2]) for _, values in rows}, LOOKUP_BATCH_SIZE):
+            taken.update(Vehicle.objects.filter(
+                plate_number_normalized__in=batch
+            ).values_list('plate_number_normalized', flat=True))
+        objs = []
+        for number, (make, model, plate_number, driver_id) in rows:
+            if driver_id is not None and driver_id not in known:
+                self.errors.append((number, 'driver: %s does not exist' % driver_id))
+                continue
+            normalized = normalize_plate_number(plate_number)
+            if normalized in taken:
+                self.errors.append((number, 'plate_number: %s already exists' % plate_number))
+                continue
+            taken.add(normalized)
+            objs.append(Vehicle(make=make, model=model, plate_number=plate_number, driver_id=driver_id))
+
+        with transaction.atomic():
+            bulk_create(Vehicle, objs)
+            bulk_changed.send(sender=Vehicle, pks=[obj.pk for obj in objs], previous={})
+        return len(objs)
+
+    def run(self):
+        self.consumed = self.load_checkpoint()
+        self.started = time.perf_counter()
+        records = read_records(self.path, self.input_format, skip=self.consumed)
+        for size, (rows, errors) in _validated(_batches(records, self.batch_size), self.workers):
+            self.errors.extend(errors)
+            self.imported += self.insert(rows)
+            self.consumed += size
+            self.save_checkpoint()
+            if self.progress:
+                self.progress(self)
+        return self
+
+    @property
+    def rows_per_second(self):
+        elapsed = time.perf_counter() - self.started
+        return self.imported / elapsed if elapsed else 0.0
@@ -0,0 +1,273 @@
+"""
+Background jobs: fleet operations too long for a request, accepted with a
+202 and run off the request path by `manage.py run_workers`. The Job table
+is the queue, no broker is needed.
+
+    POST /jobs/  {"kind": "set_driver", "params": {"assignments": [...]}}      202, the job
+    POST /jobs/  {"kind": "export", "params": {"format": "csv", "query": "with_drivers=yes"}}
+    POST /jobs/  multipart: kind=import, file=<fleet.csv>
+    GET /jobs/<id>/         status, progress of total, result or error
+    GET /jobs/<id>/file/    the file of a succeeded export
+
+Each worker process claims the oldest due job with a conditional UPDATE, so
+workers sharing the table never run a job twice, and runs its task, which
+reports its progress; every report is also the job's heartbeat. A task
+failing with ValidationError or ValueError fails the job. Other errors (a
+locked database, a lost connection...) queue it again after RETRY_DELAY
+seconds, doubled at every attempt, until max_attempts. A running job without
+a heartbeat for TIMEOUT seconds lost its worker and is retried the same way.
+
+Retries of set_driver apply every assignment again, which changes nothing
+for the ones already applied; imports resume from their checkpoint; exports
+start over.
+"""
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from django.http import QueryDict
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from . import export, importer, workers
+from .models import Job
+from .serializers import JOB_PARAMS, SetDriverBulkSerializer
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = 'queued', 'running', 'succeeded', 'failed'
+# errors a retry can't fix
+PERMANENT_ERRORS = (ValidationError, ValueError)
+# due jobs a worker tries to claim before giving up, when others take them first
+CLAIM_CANDIDATES = 10
+# assignments per transaction of set_driver
+SET_DRIVER_BATCH_SIZE = 1000
+# rejected rows kept in the result of an import
+IMPORT_ERRORS = 100
+
+
+class JobLost(Exception):
+    """The job was taken back from this worker, see requeue_lost()."""
+
+
+def job_path(job, suffix):
+    return os.path.join(settings.REST_JOBS['DIRECTORY'], 'job-%d%s' % (job.pk, suffix))
+
+
+def export_path(job):
+    return job_path(job, '.%s' % job.params['format'])
+
+
+def import_path(job):
+    return job_path(job, '-input.%s' % job.params['format'])
+
+
+def enqueue(kind, params, max_attempts=3, file=None):
+    """Queue a job, with the file to import for an import job."""
+    job = Job.objects.create(kind=kind, params=params, max_attempts=max_attempts)
+    if file is not None:
+        os.makedirs(settings.REST_JOBS['DIRECTORY'], exist_ok=True)
+        with open(import_path(job), 'wb') as target:
+            for chunk in file.chunks():
+                target.write(chunk)
+    return job
+
+
+def run_set_driver(job, report):
+    serializer = SetDriverBulkSerializer(data=job.params)
+    serializer.is_valid(raise_exception=True)
+    if 'assignments' not in job.params:
+        return {'updated': serializer.save()}
+
+    assignments = job.params['assignments']
+    updated = 0
+    for start in range(0, len(assignments), SET_DRIVER_BATCH_SIZE):
+        batch = SetDriverBulkSerializer(data={'assignments': assignments[start:start + SET_DRIVER_BATCH_SIZE]})
+        batch.is_valid(raise_exception=True)
+        updated += batch.save()
+        report(min(start + SET_DRIVER_BATCH_SIZE, len(assignments)), len(assignments))
+    return {'updated': updated}
+
+
+def run_export(job, report):
+    query_set = export.fleet_queryset(QueryDict(job.params.get('query', '')))
+    total = query_set.count()
+    report(0, total)
+    path = export_path(job)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    rows = 0
+    with open(path + '.tmp', 'w', newline='', encoding='utf-8') as target:
+        # a CSV header, then one chunk per row
+        for chunk in export.iter_export(job.params['format'], query_set):
+            target.write(chunk)
+            rows += 1
+            if rows % export.CHUNK_SIZE == 0:
+                report(rows, total)
+    os.replace(path + '.tmp', path)
+    return {'rows': rows - (job.params['format'] == 'csv'), 'file': os.path.basename(path)}
+
+
+def run_import(job, report):
+    # totals of the previous attempts, which the checkpoint skips
+    previous = job.result or {'imported': 0, 'rejected': 0, 'errors': []}
+    path = import_path(job)
+
+    def result(run):
+        return {
+            'imported': previous['imported'] + run.imported,
+            'rejected': previous['rejected'] + len(run.errors),
+            'errors': (previous['errors'] + [[number, error] for number, error in run.errors])[:IMPORT_ERRORS],
+        }
+
+    run = importer.FleetImporter(
+        path, job.params['format'], checkpoint=path + '.checkpoint',
+        progress=lambda run: report(run.consumed, result=result(run)),
+    ).run()
+    return result(run)
+
+
+# job kind: task(job, report) -> result
+TASKS = {
+    'set_driver': run_set_driver,
+    'export': run_export,
+    'import': run_import,
+}
+assert set(TASKS) == set(JOB_PARAMS)
+
+
+def claimed(job):
+    """The row of `job` while it is still this attempt's, empty once requeue_lost() took it back."""
+    return Job.objects.filter(pk=job.pk, status=RUNNING, attempts=job.attempts)
+
+
+def claim(worker):
+    """Mark the oldest due job as run by `worker` and return it, None when no job is due."""
+    now = timezone.now()
+    due = Job.objects.filter(status=QUEUED, run_after__lte=now).order_by('run_after', 'id')
+    for pk in due.values_list('pk', flat=True)[:CLAIM_CANDIDATES]:
+        if Job.objects.filter(pk=pk, status=QUEUED).update(
+            status=RUNNING, worker=worker, heartbeat=now, updated_at=now, attempts=F('attempts') + 1,
+        ):
+            return Job.objects.get(pk=pk)
+    return None
+
+
+def report(job, progress, total=None, result=None):
+    """Save the progress of a running job, raises JobLost when it's no longer this worker's."""
+    now = timezone.now()
+    fields = {'progress': progress, 'heartbeat': now, 'updated_at': now}
+    if total is not None:
+        fields['total'] = total
+    if result is not None:
+        fields['result'] = result
+    if not claimed(job).update(**fields):
+        raise JobLost()
+
+
+def fail(job, error):
+    """Queue `job` again after its retry delay, or fail it after a permanent error or its last attempt."""
+    now = timezone.now()
+    if isinstance(error, ValidationError):
+        message = 'ValidationError: %s' % json.dumps(error.detail)
+    else:
+        message = '%s: %s' % (type(error).__name__, error)
+    if isinstance(error, PERMANENT_ERRORS) or job.attempts >= job.max_attempts:
+        fields = {'status': FAILED, 'finished_at': now}
+    else:
+        delay = settings.REST_JOBS['RETRY_DELAY'] * 2 ** (job.attempts - 1)
+        fields = {'status': QUEUED, 'run_after': now + timedelta(seconds=delay)}
+    return claimed(job).update(error=message, updated_at=now, **fields)
+
+
+def execute(job):
+    """Run a claimed job: it ends succeeded, failed, or queued for a retry."""
+    try:
+        result = TASKS[job.kind](job, lambda *args, **kwargs: report(job, *args, **kwargs))
+    except JobLost:
+        logger.warning('Job %d was taken back from %s', job.pk, job.worker)
+        return
+    except Exception as e:
+        logger.exception('Job %d failed, attempt %d of %d', job.pk, job.attempts, job.max_attempts)
+        fail(job, e)
+        return
+    now = timezone.now()
+    claimed(job).update(
+        status=SUCCEEDED, result=result, progress=Coalesce(F('total'), F('progress')), finished_at=now, updated_at=now,
+    )
+
+
+def requeue_lost():
+    """Retry or fail the running jobs without a heartbeat for TIMEOUT seconds, return how many."""
+    timeout = settings.REST_JOBS['TIMEOUT']
+    lost = Job.objects.filter(status=RUNNING, heartbeat__lt=timezone.now() - timedelta(seconds=timeout))
+    return sum(fail(job, JobLost('no heartbeat from %s for %d seconds' % (job.worker, timeout))) for job in lost)
+
+
+def worker_name():
+    return '%s:%d' % (socket.gethostname(), os.getpid())
+
+
+def work(poll=1.0, burst=False, stop=None):
+    """Run due jobs until `stop` is set, or with `burst` until none is due, and return how many ran."""
+    done = 0
+    while stop is None or not stop.is_set():
+        job = claim(worker_name())
+        if job is not None:
+            execute(job)
+            done += 1
+            continue
+        requeue_lost()
+        if burst:
+            break
+        time.sleep(poll)
+    return done
+
+
+def run_workers(processes, poll=1.0, burst=False):
+    """
+    Run `processes` worker processes, 0 to work in this one, until SIGINT or
+    SIGTERM, after which running jobs finish first. A worker process that
+    dies is replaced; with `burst` they stop once no job is due.
+    """
+    stop = workers.Stop()
+    handlers = {signum: signal.signal(signum, stop.request) for signum in (signal.SIGINT, signal.SIGTERM)}
+    try:
+        if processes:
+            _supervise(processes, poll, burst, stop)
+        else:
+            work(poll, burst, stop)
+    finally:
+        for signum, handler in handlers.items():
+            signal.signal(signum, handler)
+
+
+def _supervise(processes, poll, burst, stop):
+    # fresh processes, rather than forks sharing this one's database connections
+    context = multiprocessing.get_context('spawn')
+    event = context.Event()
+
+    def start():
+        process = context.Process(target=workers.work_process, args=(poll, burst, event))
+        process.start()
+        return process
+
+    running = [start() for _ in range(processes)]
+    while running:
+        time.sleep(poll)
+        if stop.is_set():
+            event.set()
+        for process in list(running):
+            if process.is_alive():
+                continue
+            running.remove(process)
+            if process.exitcode != 0 and not stop.is_set():
+                logger.warning('Worker process %d exited with %s, restarting it', process.pid, process.exitcode)
+                running.append(start())
@@ -0,0 +1,28 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from rest import history
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete the intervals of the driver assignment history closed more than --days ago, '
+        'or merge them with --merge-gap, run it periodically.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=float, default=settings.REST_ASSIGNMENT_COMPACT_DAYS)
+        parser.add_argument(
+            '--merge-gap', type=float,
+            help='Merge each old interval into the previous one of the same vehicle and driver when at most this '
+                 'many seconds apart, instead of deleting them. Lossy: the merged interval covers the gap.',
+        )
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(days=options['days'])
+        merge_gap = options['merge_gap']
+        removed = history.compact(before, None if merge_gap is None else timedelta(seconds=merge_gap))
+        self.stdout.write('%s %d intervals.' % ('Deleted' if merge_gap is None else 'Merged', removed))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.exceptions import ValidationError
+
+from rest import export
+
+
+class Command(BaseCommand):
+    help = 'Stream every vehicle joined with its driver as NDJSON or CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(export.FORMATS), default='ndjson')
+        parser.add_argument('--output', '-o', help='File to write, stdout by default.')
+        parser.add_argument('--with-drivers', choices=('yes', 'no'))
+        parser.add_argument('--created-at-gte', metavar='DD-MM-YYYY')
+        parser.add_argument('--created-at-lte', metavar='DD-MM-YYYY')
+        parser.add_argument('--chunk-size', type=int, default=export.CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        params = {
+            name: options[option]
+            for name, option in (
+                ('with_drivers', 'with_drivers'),
+                ('created_at__gte', 'created_at_gte'),
+                ('created_at__lte', 'created_at_lte'),
+            )
+            if options[option]
+        }
+        try:
+            query_set = export.fleet_queryset(params)
+        except ValidationError as e:
+            raise CommandError(e.detail)
+
+        chunks = export.iter_export(options['format'], query_set, options['chunk_size'])
+        if not options['output']:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+        with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+            output.writelines(chunks)
@@ -0,0 +1,44 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from rest import importer
+
+
+class Command(BaseCommand):
+    help = 'Import vehicles from a CSV or NDJSON file in the export_fleet layout.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=importer.FORMATS, help='Guessed from the file extension by default.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--workers', type=int, default=0, help='Processes parsing and validating batches.')
+        parser.add_argument('--checkpoint', help='File recording progress; an existing one resumes the import.')
+        parser.add_argument('--max-errors', type=int, default=20, help='Rejected rows to print.')
+
+    def handle(self, *args, **options):
+        input_format = options['format'] or os.path.splitext(options['path'])[1].lstrip('.').lower()
+        if input_format == 'jsonl':
+            input_format = 'ndjson'
+
+        def progress(run):
+            self.stdout.write('%d rows read, %d imported, %d rejected, %.0f rows/s' % (
+                run.consumed, run.imported, len(run.errors), run.rows_per_second
+            ))
+
+        try:
+            run = importer.FleetImporter(
+                options['path'], input_format,
+                batch_size=options['batch_size'],
+                workers=options['workers'],
+                checkpoint=options['checkpoint'],
+                progress=progress if options['verbosity'] > 1 else None,
+            ).run()
+        except (OSError, ValueError) as e:
+            raise CommandError(e)
+
+        for number, error in run.errors[:options['max_errors']]:
+            self.stderr.write('line %d: %s' % (number, error))
+        self.stdout.write(self.style.SUCCESS('Imported %d vehicles, rejected %d, %.0f rows/s' % (
+            run.imported, len(run.errors), run.rows_per_second
+        )))
@@ -0,0 +1,18 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from rest import changes
+
+
+class Command(BaseCommand):
+    help = 'Delete the /changes/ log entries older than the retention, run it periodically.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=float, default=settings.REST_CHANGE_RETENTION_DAYS)
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(days=options['days'])
+        self.stdout.write('Pruned %d changes.' % changes.prune(before))
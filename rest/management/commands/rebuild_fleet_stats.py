@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from rest import stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute the counters behind /vehicles/stats/ from the vehicles table.'
+
+    def handle(self, *args, **options):
+        self.stdout.write('Counted %d vehicles.' % stats.rebuild())
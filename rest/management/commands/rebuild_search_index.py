@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from rest import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the ?q= search index of drivers and vehicles from their tables.'
+
+    def handle(self, *args, **options):
+        self.stdout.write('Indexed %d objects.' % search.rebuild())
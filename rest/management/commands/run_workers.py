@@ -0,0 +1,17 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from rest import jobs
+
+
+class Command(BaseCommand):
+    help = 'Run the background jobs queued by POST /jobs/ until stopped with SIGINT or SIGTERM.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=os.cpu_count(), help='Worker processes, 0 to run jobs in this one.')
+        parser.add_argument('--poll', type=float, default=1.0, help='Seconds between checks of an empty queue.')
+        parser.add_argument('--burst', action='store_true', help='Stop once no job is due.')
+
+    def handle(self, *args, **options):
+        jobs.run_workers(options['processes'], options['poll'], options['burst'])
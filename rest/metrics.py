@@ -0,0 +1,238 @@
+"""
+Per-request performance instrumentation.
+
+PerformanceMiddleware times every request and, through an execute_wrapper
+installed on every database connection, the number and duration of its
+queries, in whichever thread they run; serializers with TimedDataMixin add
+the time spent building `.data`. The middleware works in both modes, so
+under ASGI it doesn't push the async views onto the sync thread. The
+figures go to
+
++ a Server-Timing header on the response (total, db, serializer)
++ histograms labelled by view and method, served in the Prometheus text
+  format by /metrics. They live in the process, so with several workers
+  each one exposes its own, with the hits and misses of its response cache.
++ the rest.metrics logger, for every query slower than REST_SLOW_QUERY_MS
+
+Views are labelled with their URL name for list and detail GETs
+(driver-list, vehicle-detail) and with the router basename and action
+otherwise (set_driver-partial-update, vehicle-bulk).
+"""
+import asyncio
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse
+
+from .cache import get_response_cache
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+
+class Histogram:
+    """Cumulative histogram with one series per label set, in the Prometheus text exposition format."""
+
+    def __init__(self, name, description, buckets, label_names=('view', 'method')):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        self.label_names = label_names
+        # {labels: [count per bucket..., sum, count]}
+        self.series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [0] * (len(self.buckets) + 2)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def expose(self):
+        lines = ['# HELP %s %s' % (self.name, self.description), '# TYPE %s histogram' % self.name]
+        with self._lock:
+            series = sorted((labels, list(values)) for labels, values in self.series.items())
+        for labels, values in series:
+            label_text = ','.join('%s="%s"' % (name, escape(value)) for name, value in zip(self.label_names, labels))
+            for bound, count in zip(self.buckets + ('+Inf',), values[:-2] + [values[-1]]):
+                lines.append('%s_bucket{%s,le="%s"} %s' % (self.name, label_text, bound, count))
+            lines.append('%s_sum{%s} %s' % (self.name, label_text, values[-2]))
+            lines.append('%s_count{%s} %s' % (self.name, label_text, values[-1]))
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self.series.clear()
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+REQUEST_DURATION = Histogram('rest_request_duration_seconds', 'Wall time of requests.', DURATION_BUCKETS)
+DB_DURATION = Histogram('rest_db_duration_seconds', 'Time spent in database queries per request.', DURATION_BUCKETS)
+DB_QUERIES = Histogram('rest_db_queries', 'Database queries per request.', QUERY_COUNT_BUCKETS)
+SERIALIZER_DURATION = Histogram(
+    'rest_serializer_duration_seconds', 'Time spent building serializer data per request.', DURATION_BUCKETS,
+)
+HISTOGRAMS = (REQUEST_DURATION, DB_DURATION, DB_QUERIES, SERIALIZER_DURATION)
+
+
+class RequestMetrics:
+    """Figures of the request being served. Mutable, so threads running its queries add to the same object."""
+
+    def __init__(self, path):
+        self.path = path
+        self.view = None
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        # the execute_wrapper of every connection used by the request
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            with self._lock:
+                self.queries += 1
+                self.db_time += duration
+            threshold = getattr(settings, 'REST_SLOW_QUERY_MS', None)
+            if threshold is not None and duration * 1000 >= threshold:
+                logger.warning('Slow query (%.1f ms) in %s: %s', duration * 1000, self.view or self.path, sql)
+
+
+_current = ContextVar('rest_request_metrics', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    # the contextvar follows the request into sync_to_async and the async views' database threads
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics(execute, sql, params, many, context)
+
+
+@contextmanager
+def timing_serializer():
+    """Add the time spent in the block to the current request's serializer time, if any."""
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.serializer_time += time.perf_counter() - started
+
+
+class TimedDataMixin:
+    """For serializers: adds the time spent building `.data` to the request's serializer time."""
+
+    @property
+    def data(self):
+        with timing_serializer():
+            return super().data
+
+
+def view_label(request, view_func):
+    url_name = request.resolver_match.url_name if request.resolver_match else None
+    actions = getattr(view_func, 'actions', None)
+    action = actions.get(request.method.lower()) if actions else None
+    if action is None or action in ('list', 'retrieve'):
+        return url_name or view_func.__name__
+    return '%s-%s' % (view_func.initkwargs.get('basename'), action.replace('_', '-'))
+
+
+class PerformanceMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # async mode, as in django.utils.deprecation.MiddlewareMixin
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+            self.process_view = self.process_view_async
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        metrics = RequestMetrics(request.path)
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics, started)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics(request.path)
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics, started)
+
+    def finish(self, request, response, metrics, started):
+        total = time.perf_counter() - started
+
+        labels = (metrics.view or 'unmatched', request.method)
+        REQUEST_DURATION.observe(labels, total)
+        DB_DURATION.observe(labels, metrics.db_time)
+        DB_QUERIES.observe(labels, metrics.queries)
+        SERIALIZER_DURATION.observe(labels, metrics.serializer_time)
+        response['Server-Timing'] = 'total;dur=%.1f, db;dur=%.1f;desc="%d queries", serializer;dur=%.1f' % (
+            total * 1000, metrics.db_time * 1000, metrics.queries, metrics.serializer_time * 1000,
+        )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.view = view_label(request, view_func)
+
+    async def process_view_async(self, request, view_func, view_args, view_kwargs):
+        PerformanceMiddleware.process_view(self, request, view_func, view_args, view_kwargs)
+
+
+def cache_lines():
+    cache = get_response_cache()
+    if cache is None:
+        return []
+    lines = []
+    for name, value in cache.stats().items():
+        metric = 'rest_response_cache_%s_total' % name
+        lines += ['# HELP %s Response cache %s.' % (metric, name), '# TYPE %s counter' % metric, '%s %d' % (metric, value)]
+    return lines
+
+
+def metrics_view(request):
+    lines = [line for histogram in HISTOGRAMS for line in histogram.expose()] + cache_lines()
+    return HttpResponse('\n'.join(lines) + '\n', content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    # connection_created fires again when a closed connection reconnects
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
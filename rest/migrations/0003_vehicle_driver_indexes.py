@@ -0,0 +1,35 @@
+# Generated by Django 3.2.25 on 2026-10-18 02:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest', '0002_alter_vehicle_driver'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='vehicle',
+            name='driver',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='vehicles', to='rest.driver'),
+        ),
+        migrations.AddIndex(
+            model_name='driver',
+            index=models.Index(fields=['created_at', 'id'], name='driver_created_at_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vehicle',
+            index=models.Index(fields=['created_at', 'id'], name='vehicle_created_at_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vehicle',
+            index=models.Index(fields=['driver', 'created_at', 'id'], name='vehicle_driver_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vehicle',
+            index=models.Index(condition=models.Q(('driver__isnull', True)), fields=['created_at', 'id'], name='vehicle_unassigned_idx'),
+        ),
+    ]
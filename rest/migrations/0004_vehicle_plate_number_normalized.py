@@ -0,0 +1,39 @@
+from collections import Counter
+
+from django.db import migrations
+import rest.models
+
+
+def fill_plate_number_normalized(apps, schema_editor):
+    Vehicle = apps.get_model('rest', 'Vehicle')
+    vehicles = list(Vehicle.objects.only('id', 'plate_number'))
+    for vehicle in vehicles:
+        vehicle.plate_number_normalized = rest.models.normalize_plate_number(vehicle.plate_number)
+
+    duplicates = [plate for plate, count in Counter(v.plate_number_normalized for v in vehicles).items() if count > 1]
+    if duplicates:
+        raise RuntimeError(
+            'Plate numbers must be unique before migrating, duplicated: %s' % ', '.join(sorted(duplicates)[:20])
+        )
+    Vehicle.objects.bulk_update(vehicles, ['plate_number_normalized'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest', '0003_vehicle_driver_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vehicle',
+            name='plate_number_normalized',
+            field=rest.models.NormalizedPlateNumberField(editable=False, max_length=10, null=True),
+        ),
+        migrations.RunPython(fill_plate_number_normalized, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='vehicle',
+            name='plate_number_normalized',
+            field=rest.models.NormalizedPlateNumberField(editable=False, max_length=10, unique=True),
+        ),
+    ]
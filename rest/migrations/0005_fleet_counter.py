@@ -0,0 +1,44 @@
+# Generated by Django 3.2.25 on 2026-10-18 03:20
+
+from collections import Counter
+
+from django.db import migrations, models
+
+
+def count_vehicles(apps, schema_editor):
+    # the same counters as rest.stats.rebuild(), on the historical models
+    Vehicle = apps.get_model('rest', 'Vehicle')
+    FleetCounter = apps.get_model('rest', 'FleetCounter')
+    counts = Counter()
+    groups = Vehicle.objects.values_list('driver_id', 'make').annotate(count=models.Count('id')).order_by()
+    for driver_id, make, count in groups:
+        counts['total', ''] += count
+        counts['driver', '' if driver_id is None else str(driver_id)] += count
+        counts['make', make] += count
+    FleetCounter.objects.bulk_create(
+        FleetCounter(dimension=dimension, key=key, count=count) for (dimension, key), count in counts.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest', '0004_vehicle_plate_number_normalized'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FleetCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(max_length=16)),
+                ('key', models.CharField(blank=True, max_length=255)),
+                ('count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='fleetcounter',
+            constraint=models.UniqueConstraint(fields=('dimension', 'key'), name='fleet_counter_dimension_key'),
+        ),
+        migrations.RunPython(count_vehicles, migrations.RunPython.noop),
+    ]
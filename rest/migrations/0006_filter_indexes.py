@@ -0,0 +1,25 @@
+# Generated by Django 3.2.25 on 2026-10-18 03:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest', '0005_fleet_counter'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='driver',
+            index=models.Index(fields=['updated_at', 'id'], name='driver_updated_at_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vehicle',
+            index=models.Index(fields=['updated_at', 'id'], name='vehicle_updated_at_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vehicle',
+            index=models.Index(fields=['make', 'created_at', 'id'], name='vehicle_make_created_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 3.2.25 on 2026-10-18 03:47
+
+from django.db import migrations, models
+
+
+def open_current_assignments(apps, schema_editor):
+    # the history starts now: each assigned vehicle gets an open interval from
+    # its last write, the earliest time its driver is known
+    Vehicle = apps.get_model('rest', 'Vehicle')
+    VehicleAssignment = apps.get_model('rest', 'VehicleAssignment')
+    rows = Vehicle.objects.filter(driver__isnull=False).values_list('id', 'driver_id', 'updated_at')
+    VehicleAssignment.objects.bulk_create(
+        (VehicleAssignment(vehicle_id=pk, driver_id=driver_id, valid_from=updated_at) for pk, driver_id, updated_at in rows),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest', '0009_job_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VehicleAssignment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('vehicle_id', models.BigIntegerField()),
+                ('driver_id', models.BigIntegerField()),
+                ('valid_from', models.DateTimeField()),
+                ('valid_to', models.DateTimeField(null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='vehicleassignment',
+            index=models.Index(fields=['vehicle_id', 'valid_from'], name='assignment_vehicle_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vehicleassignment',
+            index=models.Index(fields=['driver_id', 'valid_from'], name='assignment_driver_idx'),
+        ),
+        migrations.RunPython(open_current_assignments, migrations.RunPython.noop),
+    ]
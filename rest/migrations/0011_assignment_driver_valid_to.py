@@ -0,0 +1,21 @@
+# Generated by Django 3.2.25 on 2026-10-18 04:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest', '0010_assignment_history'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='vehicleassignment',
+            name='assignment_driver_idx',
+        ),
+        migrations.AddIndex(
+            model_name='vehicleassignment',
+            index=models.Index(fields=['driver_id', 'valid_to'], name='assignment_driver_to_idx'),
+        ),
+    ]
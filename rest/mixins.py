@@ -0,0 +1,150 @@
+from django.db import NotSupportedError, connections, router, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.serializers import ListSerializer
+from rest_framework.response import Response
+
+from .signals import bulk_changed, snapshot
+
+
+def bulk_create(model, objs):
+    model.objects.bulk_create(objs)
+    if objs and objs[0].pk is None:
+        # The backend can't return ids from a bulk INSERT (SQLite on Django 3.2).
+        # The caller's transaction holds SQLite's write lock, so the newest ids are ours;
+        # elsewhere concurrent inserts may interleave with them.
+        db = router.db_for_write(model)
+        if connections[db].vendor != 'sqlite':
+            raise NotSupportedError('Bulk creation needs a backend returning ids from bulk inserts, or SQLite.')
+        pks = list(model.objects.using(db).order_by('-pk').values_list('pk', flat=True)[:len(objs)])
+        for obj, pk in zip(objs, reversed(pks)):
+            obj.pk = pk
+    for obj in objs:
+        obj._state.adding = False
+    return objs
+
+
+class BulkModelMixin:
+    """
+    Create, update or delete many objects in one request:
+
+    + POST <list url>/bulk/ - list of new objects
+    + PATCH <list url>/bulk/ - list of partial objects, each with its `id`
+    + DELETE <list url>/bulk/ - list of ids
+
+    Every item is validated in a single pass and written with one statement
+    per batch inside a single transaction. If any item is invalid nothing is
+    written and the 400 response holds one error entry per item.
+    """
+
+    @action(detail=False, methods=['post', 'patch', 'delete'], url_path='bulk')
+    def bulk(self, request, *args, **kwargs):
+        if not isinstance(request.data, list):
+            raise ValidationError({'non_field_errors': ['Expected a list of items.']})
+        handler = getattr(self, 'bulk_%s' % {'post': 'create', 'patch': 'update', 'delete': 'destroy'}[
+            request.method.lower()
+        ])
+        return handler(request, *args, **kwargs)
+
+    def bulk_create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        model = self.get_queryset().model
+        with transaction.atomic():
+            objs = bulk_create(model, [model(**attrs) for attrs in serializer.validated_data])
+            bulk_changed.send(sender=model, pks=[obj.pk for obj in objs], previous={})
+        return Response(self.get_serializer(objs, many=True).data, status=status.HTTP_201_CREATED)
+
+    def bulk_update(self, request, *args, **kwargs):
+        # type() rather than isinstance(), JSON true would be id 1
+        pks = [item['id'] for item in request.data if isinstance(item, dict) and type(item.get('id')) is int]
+        instances = self.get_queryset().in_bulk(pks)
+        serializer = self.get_serializer(instances, data=request.data, many=True, partial=True)
+        serializer.is_valid(raise_exception=True)
+
+        model = self.get_queryset().model
+        # fields computed from others in pre_save, which bulk_update() skips
+        derived = [field for field in model._meta.concrete_fields if getattr(field, 'derived_from', None)]
+        now = timezone.now()
+        objs = []
+        fields = {'updated_at'}
+        for item, attrs in zip(request.data, serializer.validated_data):
+            obj = instances[item['id']]
+            for name, value in attrs.items():
+                setattr(obj, name, value)
+            obj.updated_at = now
+            fields.update(attrs)
+            for field in derived:
+                if field.derived_from in attrs:
+                    field.pre_save(obj, False)
+                    fields.add(field.name)
+            objs.append(obj)
+        with transaction.atomic():
+            # the rows as they are now, locked, rather than as they were validated
+            previous = {
+                pk: snapshot(obj) for pk, obj in model.objects.select_for_update().in_bulk(list(instances)).items()
+            }
+            model.objects.bulk_update(objs, sorted(fields))
+            bulk_changed.send(sender=model, pks=list(previous), previous=previous)
+        return Response(self.get_serializer(objs, many=True).data)
+
+    def bulk_destroy(self, request, *args, **kwargs):
+        pks = [pk for pk in request.data if type(pk) is int]
+        existing = set(self.get_queryset().filter(pk__in=pks).values_list('pk', flat=True))
+        errors = [{} if type(pk) is int and pk in existing else {'id': ['Not found.']} for pk in request.data]
+        if any(errors):
+            raise ValidationError(errors)
+        with transaction.atomic():
+            self.get_queryset().filter(pk__in=existing).delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class ExpandMixin:
+    """
+    Nests the related `expand_field` objects on list and retrieve when the
+    client asks for ?expand=<expand_field>. The view is expected to load them
+    with select_related/prefetch_related when is_expanded() is true, so the
+    number of queries doesn't grow with the page size.
+    """
+    expand_field = None
+    expand_serializer_class = None
+
+    def is_expanded(self):
+        if self.action not in ('list', 'retrieve'):
+            return False
+        return self.expand_field in self.request.query_params.get('expand', '').split(',')
+
+    def get_serializer_class(self):
+        if self.is_expanded():
+            return self.expand_serializer_class
+        return super().get_serializer_class()
+
+
+class SparseFieldsMixin:
+    """
+    ?fields=id,plate_number on list and retrieve: only these fields of the
+    serializer are rendered, in the serializer's order. Unknown names are a 400.
+    """
+
+    def get_sparse_fields(self):
+        if self.action not in ('list', 'retrieve') or 'fields' not in self.request.query_params:
+            return None
+        names = [name for name in self.request.query_params['fields'].split(',') if name]
+        available = self.get_serializer_class()().fields
+        unknown = [name for name in names if name not in available]
+        if not names or unknown:
+            raise ValidationError({'fields': ['Unknown fields: %s.' % ', '.join(unknown) if unknown else
+                                              'At least one field is required.']})
+        return [name for name in available if name in names]
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        names = self.get_sparse_fields()
+        if names is not None:
+            fields = (serializer.child if isinstance(serializer, ListSerializer) else serializer).fields
+            for name in list(fields):
+                if name not in names:
+                    fields.pop(name)
+        return serializer
@@ -1,4 +1,24 @@
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
+
+
+def normalize_plate_number(value):
+    """'aa 1234  oo' -> 'AA1234OO', the form plate numbers are looked up by."""
+    return ''.join(value.split()).upper()
+
+
+class NormalizedPlateNumberField(models.CharField):
+    """
+    Holds normalize_plate_number() of the instance's plate_number. It is
+    computed in pre_save, so it stays in sync on save() and bulk_create();
+    bulk_update() callers have to run pre_save themselves.
+    """
+    derived_from = 'plate_number'
+
+    def pre_save(self, model_instance, add):
+        value = normalize_plate_number(getattr(model_instance, self.derived_from))
+        setattr(model_instance, self.attname, value)
+        return value
 
 
 # + id: int
@@ -12,6 +32,14 @@ class Driver(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # created_at range filters and the (created_at, id) pagination key
+            models.Index(fields=['created_at', 'id'], name='driver_created_at_id_idx'),
+            # ?updated_since= and ?ordering=updated_at
+            models.Index(fields=['updated_at', 'id'], name='driver_updated_at_id_idx'),
+        ]
+
 
 # Vehicle
 # + id: int
@@ -19,12 +47,164 @@ class Driver(models.Model):
 # + make: str
 # + model: str
 # + plate_number: str - format example "AA 1234 OO"
+# + plate_number_normalized: str - "AA1234OO", unique
 # + created_at
 # + updated_at
 class Vehicle(models.Model):
-    driver = models.ForeignKey(Driver, blank=True, null=True, related_name='vehicles', on_delete=models.SET_NULL)
+    # indexed by vehicle_driver_created_idx below, which also serves plain driver_id lookups
+    driver = models.ForeignKey(
+        Driver, blank=True, null=True, related_name='vehicles', on_delete=models.SET_NULL, db_index=False
+    )
     make = models.CharField(max_length=255)
     model = models.CharField(max_length=255)
     plate_number = models.CharField(max_length=10)
+    plate_number_normalized = NormalizedPlateNumberField(max_length=10, unique=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='vehicle_created_at_id_idx'),
+            models.Index(fields=['updated_at', 'id'], name='vehicle_updated_at_id_idx'),
+            # ?make= lists, already in page order
+            models.Index(fields=['make', 'created_at', 'id'], name='vehicle_make_created_idx'),
+            # ?with_drivers=no and per-driver vehicle lists, already in page order
+            models.Index(fields=['driver', 'created_at', 'id'], name='vehicle_driver_created_idx'),
+            # smaller dedicated index for unassigned vehicles, on backends with partial
+            # indexes (SQLite, PostgreSQL); Django skips it on those without (MySQL)
+            models.Index(
+                fields=['created_at', 'id'],
+                name='vehicle_unassigned_idx',
+                condition=models.Q(driver__isnull=True),
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        # the receivers of rest/stats.py lock the row in pre_save until the counters are updated
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
+
+# FleetCounter - running totals served by /vehicles/stats/, see rest/stats.py
+# + dimension: str - "total", "driver" or "make"
+# + key: str - driver id ("" for unassigned vehicles) or make, "" for the total
+# + count: int - number of vehicles
+class FleetCounter(models.Model):
+    dimension = models.CharField(max_length=16)
+    key = models.CharField(max_length=255, blank=True)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['dimension', 'key'], name='fleet_counter_dimension_key'),
+        ]
+
+
+# Change - append-only log of driver and vehicle writes served by /changes/, see rest/changes.py
+# + id: int - the cursor, increasing with every write
+# + model: str - "driver" or "vehicle"
+# + object_id: int
+# + action: str - "created", "updated" or "deleted"
+# + created_at - for the retention, see `manage.py prune_changes`
+class Change(models.Model):
+    model = models.CharField(max_length=16)
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=8)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+
+# Search index behind ?q=, see rest/search.py
+# SearchTerm - every distinct word of the searchable fields
+# + term: str - casefolded
+class SearchTerm(models.Model):
+    term = models.CharField(max_length=255, unique=True)
+
+
+# SearchTrigram - the trigrams of each term, to find the terms close to a misspelled word
+# + trigram: str
+# + term_id: FK to SearchTerm
+class SearchTrigram(models.Model):
+    trigram = models.CharField(max_length=3)
+    term = models.ForeignKey(SearchTerm, on_delete=models.CASCADE, related_name='trigrams', db_index=False)
+
+    class Meta:
+        constraints = [
+            # also the index of the lookups by trigram
+            models.UniqueConstraint(fields=['trigram', 'term'], name='search_trigram_term'),
+        ]
+
+
+# SearchPosting - the objects each term appears in
+# + model: str - "driver" or "vehicle"
+# + object_id: int
+# + term_id: FK to SearchTerm
+class SearchPosting(models.Model):
+    model = models.CharField(max_length=16)
+    object_id = models.BigIntegerField()
+    term = models.ForeignKey(SearchTerm, on_delete=models.CASCADE, related_name='postings', db_index=False)
+
+    class Meta:
+        constraints = [
+            # also the index ranking the objects of the matched terms
+            models.UniqueConstraint(fields=['model', 'term', 'object_id'], name='search_posting_term_object'),
+        ]
+        indexes = [
+            # reindexing or deleting an object
+            models.Index(fields=['model', 'object_id'], name='search_posting_object_idx'),
+        ]
+
+
+# Job - a long-running fleet operation run off the request path by `manage.py run_workers`, see rest/jobs.py
+# + kind: str - "set_driver", "export" or "import"
+# + params: dict - the arguments of the operation
+# + status: str - "queued", "running", "succeeded" or "failed"
+# + progress: int - units done so far: assignments, rows exported or rows read
+# + total: int - units to do, null when unknown up front
+# + result: dict - what the operation returned, once succeeded
+# + error: str - the last failure, kept when a retry succeeds
+# + attempts, max_attempts: int
+# + run_after - when a queued job may start, later than created_at for retries
+# + worker: str - "<host>:<pid>" of the process running it
+# + heartbeat - last sign of life of a running job, see REST_JOBS['TIMEOUT']
+class Job(models.Model):
+    kind = models.CharField(max_length=16)
+    params = models.JSONField(default=dict)
+    status = models.CharField(max_length=16, default='queued')
+    progress = models.BigIntegerField(default=0)
+    total = models.BigIntegerField(null=True)
+    result = models.JSONField(null=True)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    worker = models.CharField(max_length=64, blank=True)
+    heartbeat = models.DateTimeField(null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True)
+
+    class Meta:
+        indexes = [
+            # the workers' next job: the oldest queued one due
+            models.Index(fields=['status', 'run_after', 'id'], name='job_queue_idx'),
+        ]
+
+
+# VehicleAssignment - history of the vehicles' drivers, one row per interval a vehicle had a driver,
+# see rest/history.py
+# + vehicle_id, driver_id: int - plain ids, the history outlives deleted vehicles and drivers
+# + valid_from
+# + valid_to - null while the assignment lasts
+class VehicleAssignment(models.Model):
+    vehicle_id = models.BigIntegerField()
+    driver_id = models.BigIntegerField()
+    valid_from = models.DateTimeField()
+    valid_to = models.DateTimeField(null=True)
+
+    class Meta:
+        indexes = [
+            # a vehicle's intervals don't overlap, so the one covering a time is one seek away
+            models.Index(fields=['vehicle_id', 'valid_from'], name='assignment_vehicle_idx'),
+            # a driver's intervals overlap, but those covering a time all end after it
+            models.Index(fields=['driver_id', 'valid_to'], name='assignment_driver_to_idx'),
+        ]
@@ -0,0 +1,260 @@
+"""
+?q= search over driver names and vehicle makes and models.
+
+The index has three tables: SearchTerm holds every distinct word of the
+searchable fields, SearchTrigram the trigrams of each term, SearchPosting
+the objects each term appears in. A query is split into words; each word
+is matched against the terms sharing its trigrams, scored
+
++ 1 for the same word, 0.5 to 1 for a prefix (ser -> serhii), the longer the better
++ otherwise the trigram similarity (shared / all trigrams), for typos (olgea -> olga)
+
+and terms scoring below MIN_SIMILARITY are dropped. An object scores the sum
+of its matched terms, best first. The term lookups read the small term
+table; the ranking reads the postings through their (model, term, object_id)
+index, at most MAX_POSTINGS (or the page size) per term, so the cost doesn't grow with the
+table. Objects found through one term are then looked up in the postings
+of the others, so the scores of the objects read are exact. What a common
+term alone can miss is the objects past the postings read, which only
+matters when no rarer word of the query finds them.
+
+Writes keep the index in sync: post_save and bulk_changed reindex objects
+whose searchable fields changed, post_delete drops their postings. Terms
+no longer used stay until `manage.py rebuild_search_index`, which also
+indexes rows written around the signals (raw SQL, fixtures loaded before).
+"""
+import re
+
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .models import Driver, SearchPosting, SearchTerm, SearchTrigram, Vehicle
+from .signals import bulk_changed
+
+# model: its searchable fields
+SEARCH_FIELDS = {
+    Driver: ('first_name', 'last_name'),
+    Vehicle: ('make', 'model'),
+}
+MIN_SIMILARITY = 0.3
+# words of a query used, terms considered per word, terms kept per word
+MAX_WORDS = 8
+MAX_CANDIDATES = 200
+MAX_TERMS = 20
+# objects search() ranks by default, postings read per term
+MAX_RESULTS = 500
+MAX_POSTINGS = 1000
+# terms or objects per query, below SQLite's limit of bound parameters
+BATCH_SIZE = 900
+
+
+def words(text):
+    return re.findall(r'\w+', text.casefold())
+
+
+def trigrams(word):
+    padded = '  %s ' % word
+    return {padded[index:index + 3] for index in range(len(padded) - 2)}
+
+
+def similarity(word, term):
+    if term.startswith(word):
+        return 0.5 + 0.5 * len(word) / len(term)
+    word_trigrams, term_trigrams = trigrams(word), trigrams(term)
+    shared = len(word_trigrams & term_trigrams)
+    return shared / (len(word_trigrams) + len(term_trigrams) - shared)
+
+
+def object_terms(values):
+    return {word[:255] for value in values if value for word in words(value)}
+
+
+def _batches(items, size=BATCH_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def get_term_ids(terms, known=None):
+    """{term: id} of `terms`, creating the missing ones with their trigrams. `known` caches ids between calls."""
+    known = {} if known is None else known
+    missing = [term for term in terms if term not in known]
+    for batch in _batches(missing):
+        known.update(SearchTerm.objects.filter(term__in=batch).values_list('term', 'id'))
+    missing = [term for term in missing if term not in known]
+    if missing:
+        SearchTerm.objects.bulk_create([SearchTerm(term=term) for term in missing], ignore_conflicts=True)
+        created = {}
+        for batch in _batches(missing):
+            created.update(SearchTerm.objects.filter(term__in=batch).values_list('term', 'id'))
+        SearchTrigram.objects.bulk_create([
+            SearchTrigram(trigram=trigram, term_id=term_id) for term, term_id in created.items() for trigram in trigrams(term)
+        ], ignore_conflicts=True)
+        known.update(created)
+    return known
+
+
+def index(model, terms_by_pk, replace=True, known=None):
+    """Store {pk: terms} as the postings of these objects of `model`, replacing their previous ones."""
+    name = model._meta.model_name
+    if replace:
+        for batch in _batches(terms_by_pk):
+            SearchPosting.objects.filter(model=name, object_id__in=batch).delete()
+    term_ids = get_term_ids({term for terms in terms_by_pk.values() for term in terms}, known)
+    SearchPosting.objects.bulk_create([
+        SearchPosting(model=name, object_id=pk, term_id=term_ids[term]) for pk, terms in terms_by_pk.items() for term in terms
+    ], ignore_conflicts=True)
+
+
+def rebuild(chunk_size=5000):
+    """Index every driver and vehicle from scratch, return the number of objects indexed."""
+    count = 0
+    with transaction.atomic():
+        SearchPosting.objects.all().delete()
+        SearchTrigram.objects.all().delete()
+        SearchTerm.objects.all().delete()
+        known = {}
+        for model, fields in SEARCH_FIELDS.items():
+            terms_by_pk = {}
+            for pk, *values in model.objects.values_list('pk', *fields).iterator(chunk_size=chunk_size):
+                terms_by_pk[pk] = object_terms(values)
+                if len(terms_by_pk) == chunk_size:
+                    index(model, terms_by_pk, replace=False, known=known)
+                    count += len(terms_by_pk)
+                    terms_by_pk = {}
+            index(model, terms_by_pk, replace=False, known=known)
+            count += len(terms_by_pk)
+    return count
+
+
+def match_terms(word):
+    """{term id: score} of the terms close to `word`."""
+    candidates = SearchTrigram.objects.filter(trigram__in=trigrams(word)).values_list(
+        'term_id', 'term__term'
+    ).annotate(shared=Count('id')).order_by('-shared')[:MAX_CANDIDATES]
+    scores = {term_id: similarity(word, term) for term_id, term, _ in candidates}
+    best = sorted(scores.items(), key=lambda item: -item[1])[:MAX_TERMS]
+    return {term_id: score for term_id, score in best if score >= MIN_SIMILARITY}
+
+
+def search(model, query, limit=MAX_RESULTS, queryset=None):
+    """[(pk, score)] of the objects of `model`, or of `queryset` only, best matching `query`, best first."""
+    scores = {}
+    for word in list(dict.fromkeys(words(query)))[:MAX_WORDS]:
+        for term_id, score in match_terms(word).items():
+            scores[term_id] = scores.get(term_id, 0) + score
+    if not scores:
+        return []
+    postings = SearchPosting.objects.filter(model=model._meta.model_name)
+    if queryset is not None and queryset.query.has_filters():
+        # filtered before the limits, so they can't cut every match of the filters;
+        # a primary key lookup per posting read rather than the whole filtered table
+        postings = postings.filter(Exists(queryset.order_by().filter(pk=OuterRef('object_id'))))
+
+    # {object id: ids of its matched terms}
+    matched = {}
+    truncated = []
+    # enough for a one-word query to fill the page
+    cap = max(MAX_POSTINGS, limit)
+    for term_id in scores:
+        object_ids = list(postings.filter(term_id=term_id).order_by('object_id').values_list(
+            'object_id', flat=True
+        )[:cap + 1])
+        if len(object_ids) > cap:
+            truncated.append(term_id)
+            object_ids = object_ids[:cap]
+        for object_id in object_ids:
+            matched.setdefault(object_id, set()).add(term_id)
+    if truncated and len(scores) > 1:
+        # the objects read may have the common terms past the postings read
+        for batch in _batches(matched, BATCH_SIZE - len(truncated)):
+            for object_id, term_id in SearchPosting.objects.filter(
+                model=model._meta.model_name, term_id__in=truncated, object_id__in=batch,
+            ).values_list('object_id', 'term_id'):
+                matched[object_id].add(term_id)
+
+    ranked = sorted(
+        ((object_id, sum(scores[term_id] for term_id in term_ids)) for object_id, term_ids in matched.items()),
+        key=lambda item: (-item[1], item[0]),
+    )
+    return ranked[:limit]
+
+
+class SearchMixin:
+    """
+    ?q= on list: the page_size best matches of search() among the objects
+    passing the view's other filters, best first, with ?fields= and
+    ?expand= applied. Search results
+    have no cursor, `next` and `previous` are null.
+    """
+
+    def search_query(self):
+        """?q= of the request, None when it's missing or blank, which lists as usual."""
+        return self.request.query_params.get('q', '').strip() or None
+
+    def search_page(self, query):
+        queryset = self.filter_queryset(self.get_queryset())
+        ranked = search(self.queryset.model, query, self.paginator.get_page_size(self.request), queryset)
+        pks = [pk for pk, _ in ranked]
+        objs = queryset.in_bulk(pks)
+        return [objs[pk] for pk in pks]
+
+    def search_response(self, page):
+        # imported here, see CachedResponseMixin.cached_response()
+        from rest_framework.response import Response
+
+        return Response({'next': None, 'previous': None, 'results': self.get_serializer(page, many=True).data})
+
+    def list(self, request, *args, **kwargs):
+        query = self.search_query()
+        if query is None:
+            return super().list(request, *args, **kwargs)
+        return self.search_response(self.search_page(query))
+
+
+def _values(instance, fields):
+    values = instance.__dict__
+    if all(name in values for name in fields):
+        return tuple(values[name] for name in fields)
+    return None
+
+
+@receiver(post_init, sender=Driver)
+@receiver(post_init, sender=Vehicle)
+def remember_searchable(sender, instance, **kwargs):
+    # what the index holds for this object, to skip reindexing unchanged ones
+    instance._searched = _values(instance, SEARCH_FIELDS[sender])
+
+
+@receiver(post_save, sender=Driver)
+@receiver(post_save, sender=Vehicle)
+def index_saved(sender, instance, created, **kwargs):
+    values = _values(instance, SEARCH_FIELDS[sender])
+    if created or values != instance._searched:
+        index(sender, {instance.pk: object_terms(values)}, replace=not created)
+    instance._searched = values
+
+
+@receiver(post_delete, sender=Driver)
+@receiver(post_delete, sender=Vehicle)
+def unindex_deleted(sender, instance, **kwargs):
+    SearchPosting.objects.filter(model=sender._meta.model_name, object_id=instance.pk).delete()
+
+
+@receiver(bulk_changed, sender=Driver)
+@receiver(bulk_changed, sender=Vehicle)
+def index_bulk_changes(sender, pks, previous, **kwargs):
+    fields = SEARCH_FIELDS[sender]
+    created, changed = {}, {}
+    for batch in _batches(pks):
+        for pk, *values in sender.objects.filter(pk__in=batch).values_list('pk', *fields):
+            if pk not in previous:
+                created[pk] = object_terms(values)
+            elif tuple(values) != tuple(previous[pk][name] for name in fields):
+                changed[pk] = object_terms(values)
+    if created:
+        index(sender, created, replace=False)
+    if changed:
+        index(sender, changed)
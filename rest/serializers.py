@@ -1,30 +1,353 @@
+import json
+import os
+from collections import Counter
+
 from rest_framework import serializers
 
-from rest.models import Driver, Vehicle
+from rest.export import FORMATS as EXPORT_FORMATS, fleet_queryset
+from rest.filters import date_param
+from rest.metrics import TimedDataMixin
+from rest.models import Driver, Job, Vehicle, VehicleAssignment, normalize_plate_number
+from rest.signals import bulk_changed
 
 from django.conf import settings
+from django.db import transaction
+from django.http import QueryDict
+from django.utils import timezone
+
+PLATE_NUMBER_REGEX = r'^[A-Z]{2} \d{4} [A-Z]{2}$'
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    # {str(pk): object}, filled by BulkListSerializer before the items are validated
+    prefetched = None
+
+    def to_internal_value(self, data):
+        if self.prefetched is None or not isinstance(data, (int, str)) or not str(data).isdigit():
+            return super().to_internal_value(data)
+        try:
+            return self.prefetched[str(data)]
+        except KeyError:
+            self.fail('does_not_exist', pk_value=data)
+
+
+class BulkListSerializer(TimedDataMixin, serializers.ListSerializer):
+    """
+    Validates a list of items for the bulk endpoints.
+
+    Related objects are fetched with one query for the whole list instead of
+    one per item. When `instance` is a {pk: object} mapping, every item is
+    validated against the object matching its `id`.
+    """
 
+    def to_internal_value(self, data):
+        if not isinstance(data, list):
+            return super().to_internal_value(data)
 
-class DriverSerializer(serializers.ModelSerializer):
+        self.prefetch_related_objects(data)
+        ret = []
+        errors = []
+        for item in data:
+            try:
+                if self.instance is not None:
+                    self.child.instance = self.get_item_instance(item)
+                validated = self.child.run_validation(item)
+            except serializers.ValidationError as exc:
+                errors.append(exc.detail)
+            else:
+                ret.append(validated)
+                errors.append({})
+        self.child.instance = None
+
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return ret
+
+    def get_item_instance(self, item):
+        pk = item.get('id') if isinstance(item, dict) else None
+        if pk is None:
+            raise serializers.ValidationError({'id': ['This field is required.']})
+        if type(pk) is not int or pk not in self.instance:
+            raise serializers.ValidationError({'id': ['Not found.']})
+        return self.instance[pk]
+
+    def prefetch_related_objects(self, data):
+        for name, field in self.child.fields.items():
+            if not isinstance(field, BulkPrimaryKeyRelatedField) or field.read_only:
+                continue
+            pks = {
+                str(item[name]) for item in data
+                if isinstance(item, dict) and isinstance(item.get(name), (int, str)) and str(item[name]).isdigit()
+            }
+            field.prefetched = {str(pk): obj for pk, obj in field.get_queryset().in_bulk(pks).items()}
+        if hasattr(self.child, 'prefetch_for_list'):
+            self.child.prefetch_for_list(data)
+
+
+class DriverSerializer(TimedDataMixin, serializers.ModelSerializer):
     created_at = serializers.DateTimeField(format=settings.DATETIME_INPUT_FORMATS, required=False)
     updated_at = serializers.DateTimeField(format=settings.DATETIME_INPUT_FORMATS, required=False)
 
     class Meta:
         model = Driver
         fields = '__all__'
+        list_serializer_class = BulkListSerializer
 
 
-class VehicleSerializer(serializers.ModelSerializer):
+class VehicleSerializer(TimedDataMixin, serializers.ModelSerializer):
     created_at = serializers.DateTimeField(format=settings.DATETIME_INPUT_FORMATS, required=False)
     updated_at = serializers.DateTimeField(format=settings.DATETIME_INPUT_FORMATS, required=False)
-    plate_number = serializers.RegexField(r'^[A-Z]{2} \d{4} [A-Z]{2}$', max_length=10)
+    plate_number = serializers.RegexField(PLATE_NUMBER_REGEX, max_length=10)
+    serializer_related_field = BulkPrimaryKeyRelatedField
+    # {normalized plate: (vehicle id or None, occurrences in the list)}, see prefetch_for_list()
+    plate_numbers = None
 
     class Meta:
         model = Vehicle
-        fields = '__all__'
+        exclude = ('plate_number_normalized',)
+        list_serializer_class = BulkListSerializer
+
+    def prefetch_for_list(self, data):
+        counts = Counter(
+            normalize_plate_number(item['plate_number']) for item in data
+            if isinstance(item, dict) and isinstance(item.get('plate_number'), str)
+        )
+        taken = dict(Vehicle.objects.filter(plate_number_normalized__in=counts).values_list('plate_number_normalized', 'id'))
+        self.plate_numbers = {plate: (taken.get(plate), count) for plate, count in counts.items()}
 
+    def validate_plate_number(self, value):
+        normalized = normalize_plate_number(value)
+        if self.plate_numbers is not None:
+            taken_by, count = self.plate_numbers.get(normalized, (None, 1))
+            if count > 1:
+                raise serializers.ValidationError('Plate number is repeated in this list.', code='unique')
+        else:
+            taken_by = Vehicle.objects.filter(plate_number_normalized=normalized).values_list('id', flat=True).first()
+        if taken_by is not None and (self.instance is None or self.instance.pk != taken_by):
+            raise serializers.ValidationError('Vehicle with this plate number already exists.', code='unique')
+        return value
 
-class SetDriverSerializer(serializers.ModelSerializer):
+
+class DriverWithVehiclesSerializer(DriverSerializer):
+    vehicles = VehicleSerializer(many=True, read_only=True)
+
+
+class VehicleWithDriverSerializer(VehicleSerializer):
+    driver = DriverSerializer(read_only=True)
+
+
+class SetDriverSerializer(TimedDataMixin, serializers.ModelSerializer):
     class Meta:
         model = Vehicle
         fields = ('driver',)
+
+
+class AssignmentSerializer(serializers.Serializer):
+    vehicle_id = serializers.IntegerField()
+    driver_id = serializers.IntegerField(allow_null=True)
+
+
+class VehicleFilterSerializer(serializers.Serializer):
+    vehicle_ids = serializers.ListField(child=serializers.IntegerField(), required=False)
+    driver_id = serializers.IntegerField(required=False, allow_null=True)
+    make = serializers.CharField(required=False)
+    model = serializers.CharField(required=False)
+    with_drivers = serializers.ChoiceField(('yes', 'no'), required=False)
+
+    def validate(self, attrs):
+        if not attrs:
+            raise serializers.ValidationError('At least one filter is required.')
+        return attrs
+
+
+class SetDriverBulkSerializer(serializers.Serializer):
+    """
+    Either a list of {vehicle_id, driver_id} pairs, or one driver_id (null to
+    unassign) for every vehicle matching `filter`.
+    """
+    assignments = AssignmentSerializer(many=True, required=False, allow_empty=False)
+    driver_id = serializers.IntegerField(required=False, allow_null=True)
+    filter = VehicleFilterSerializer(required=False)
+
+    does_not_exist = 'Invalid pk "{}" - object does not exist.'
+    # ids per query ... WHERE id IN (...), below SQLite's bound parameter limit
+    batch_size = 900
+
+    def validate(self, attrs):
+        if 'assignments' in attrs:
+            if 'filter' in attrs or 'driver_id' in attrs:
+                raise serializers.ValidationError('Pass either `assignments` or `driver_id` with `filter`.')
+            return self.validate_assignments_exist(attrs)
+
+        if 'filter' not in attrs or 'driver_id' not in attrs:
+            raise serializers.ValidationError('Pass either `assignments` or `driver_id` with `filter`.')
+        driver_id = attrs['driver_id']
+        if driver_id is not None and not Driver.objects.filter(id=driver_id).exists():
+            raise serializers.ValidationError({'driver_id': [self.does_not_exist.format(driver_id)]})
+        return attrs
+
+    def existing(self, model, ids):
+        ids = list(ids)
+        found = set()
+        for start in range(0, len(ids), self.batch_size):
+            found.update(model.objects.filter(id__in=ids[start:start + self.batch_size]).values_list('id', flat=True))
+        return found
+
+    def validate_assignments_exist(self, attrs):
+        assignments = attrs['assignments']
+        counts = Counter(item['vehicle_id'] for item in assignments)
+        vehicles = self.existing(Vehicle, counts)
+        drivers = self.existing(Driver, {item['driver_id'] for item in assignments} - {None})
+
+        errors = []
+        for item in assignments:
+            error = {}
+            if counts[item['vehicle_id']] > 1:
+                error['vehicle_id'] = ['Vehicle is repeated in this list.']
+            elif item['vehicle_id'] not in vehicles:
+                error['vehicle_id'] = [self.does_not_exist.format(item['vehicle_id'])]
+            if item['driver_id'] is not None and item['driver_id'] not in drivers:
+                error['driver_id'] = [self.does_not_exist.format(item['driver_id'])]
+            errors.append(error)
+        if any(errors):
+            raise serializers.ValidationError({'assignments': errors})
+        return attrs
+
+    def filter_vehicles(self, filters):
+        filters = dict(filters)
+        queryset = Vehicle.objects.all()
+        if 'vehicle_ids' in filters:
+            queryset = queryset.filter(id__in=filters.pop('vehicle_ids'))
+        if 'with_drivers' in filters:
+            queryset = queryset.filter(driver__isnull=filters.pop('with_drivers') == 'no')
+        return queryset.filter(**filters)
+
+    def save(self):
+        """Apply the assignments and return the number of vehicles updated."""
+        now = timezone.now()
+        with transaction.atomic():
+            if 'assignments' in self.validated_data:
+                by_driver = {}
+                for item in self.validated_data['assignments']:
+                    by_driver.setdefault(item['driver_id'], []).append(item['vehicle_id'])
+                batches = [
+                    (driver_id, Vehicle.objects.filter(id__in=vehicle_ids[start:start + self.batch_size]))
+                    for driver_id, vehicle_ids in by_driver.items()
+                    for start in range(0, len(vehicle_ids), self.batch_size)
+                ]
+            else:
+                batches = [(self.validated_data['driver_id'], self.filter_vehicles(self.validated_data['filter']))]
+
+            previous = {}
+            updated = 0
+            for driver_id, vehicles in batches:
+                # locked, so the receivers' deltas start from the rows being replaced
+                previous.update((row['id'], row) for row in vehicles.select_for_update().values())
+                updated += vehicles.update(driver_id=driver_id, updated_at=now)
+            bulk_changed.send(sender=Vehicle, pks=list(previous), previous=previous)
+        return updated
+
+
+class ChangeFeedSerializer(serializers.Serializer):
+    """Query parameters of /changes/, without a cursor the response only holds the current one."""
+    cursor = serializers.IntegerField(min_value=0, required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=1000, default=500)
+
+
+class AssignmentHistoryQuerySerializer(serializers.Serializer):
+    """Query parameters of the assignment history: ?at= for one time, ?since=&until= for a period, either bound optional."""
+    at = date_param()
+    since = date_param()
+    until = date_param()
+
+    def validate(self, attrs):
+        if 'at' in attrs:
+            if 'since' in attrs or 'until' in attrs:
+                raise serializers.ValidationError('Pass either `at` or `since` and `until`.')
+            return {'since': attrs['at'], 'until': attrs['at']}
+        if 'since' in attrs and 'until' in attrs and attrs['since'] > attrs['until']:
+            raise serializers.ValidationError({'until': ['Must not be before `since`.']})
+        return attrs
+
+
+class VehicleAssignmentSerializer(serializers.ModelSerializer):
+    vehicle = serializers.IntegerField(source='vehicle_id')
+    driver = serializers.IntegerField(source='driver_id')
+    valid_from = serializers.DateTimeField(format=settings.DATETIME_INPUT_FORMATS)
+    valid_to = serializers.DateTimeField(format=settings.DATETIME_INPUT_FORMATS)
+
+    class Meta:
+        model = VehicleAssignment
+        fields = ('vehicle', 'driver', 'valid_from', 'valid_to')
+
+
+class ExportJobSerializer(serializers.Serializer):
+    """Params of an export job: the format and query string of /vehicles/export/<format>/."""
+    format = serializers.ChoiceField(sorted(EXPORT_FORMATS))
+    query = serializers.CharField(allow_blank=True, default='')
+
+    def validate_query(self, value):
+        fleet_queryset(QueryDict(value))
+        return value
+
+
+class ImportJobSerializer(serializers.Serializer):
+    """Params of an import job, whose file is uploaded with it in the export_fleet layout."""
+    format = serializers.ChoiceField(sorted(EXPORT_FORMATS))
+
+
+# job kind: serializer of its params
+JOB_PARAMS = {
+    'set_driver': SetDriverBulkSerializer,
+    'export': ExportJobSerializer,
+    'import': ImportJobSerializer,
+}
+
+
+class JobSerializer(serializers.ModelSerializer):
+    """
+    A job of rest.jobs. On create, `params` are validated by the serializer
+    of the job's kind, and an import takes its `file` as a multipart upload,
+    with `params` as a JSON string and the format guessed from the file name.
+    """
+    kind = serializers.ChoiceField(list(JOB_PARAMS))
+    params = serializers.JSONField(default=dict)
+    file = serializers.FileField(write_only=True, required=False)
+    max_attempts = serializers.IntegerField(min_value=1, max_value=10, default=3)
+    run_after = serializers.DateTimeField(format=settings.DATETIME_INPUT_FORMATS, read_only=True)
+    created_at = serializers.DateTimeField(format=settings.DATETIME_INPUT_FORMATS, read_only=True)
+    updated_at = serializers.DateTimeField(format=settings.DATETIME_INPUT_FORMATS, read_only=True)
+    finished_at = serializers.DateTimeField(format=settings.DATETIME_INPUT_FORMATS, read_only=True)
+
+    class Meta:
+        model = Job
+        exclude = ('worker', 'heartbeat')
+        read_only_fields = ('status', 'progress', 'total', 'result', 'error', 'attempts')
+
+    def validate_params(self, value):
+        if isinstance(value, str):
+            try:
+                value = json.loads(value)
+            except ValueError:
+                raise serializers.ValidationError('Expected a JSON object.')
+        if not isinstance(value, dict):
+            raise serializers.ValidationError('Expected a JSON object.')
+        return value
+
+    def validate(self, attrs):
+        params = dict(attrs['params'])
+        upload = attrs.get('file')
+        if attrs['kind'] == 'import':
+            if upload is None:
+                raise serializers.ValidationError({'file': ['An import job needs the file to import.']})
+            extension = os.path.splitext(upload.name)[1].lstrip('.').lower()
+            params.setdefault('format', 'ndjson' if extension == 'jsonl' else extension)
+        elif upload is not None:
+            raise serializers.ValidationError({'file': ['Only import jobs take a file.']})
+
+        params_serializer = JOB_PARAMS[attrs['kind']](data=params)
+        if not params_serializer.is_valid():
+            raise serializers.ValidationError({'params': params_serializer.errors})
+        # stored as given, the task validates them again when it runs
+        attrs['params'] = params
+        return attrs
@@ -0,0 +1,24 @@
+from django.db.models.signals import pre_delete
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+
+from .models import Driver
+
+# Sent after writes that bypass post_save: bulk_create, bulk_update and
+# QuerySet.update in the bulk endpoints and SetDriverView batch mode.
+#   sender: the model class
+#   pks: primary keys of the created or updated rows
+#   previous: {pk: {attname: value}} of the rows before an update, {} on create
+bulk_changed = Signal()
+
+
+def snapshot(obj):
+    """{attname: value} of a model instance, the same shape as a QuerySet.values() row."""
+    return {field.attname: getattr(obj, field.attname) for field in obj._meta.concrete_fields}
+
+
+@receiver(pre_delete, sender=Driver)
+def touch_unassigned_vehicles(sender, instance, **kwargs):
+    # on_delete=SET_NULL rewrites driver_id with a plain UPDATE, bump
+    # updated_at as well so the vehicles' ETags change with it
+    instance.vehicles.update(updated_at=timezone.now())
@@ -0,0 +1,46 @@
+"""
+Opt-in PRAGMAs for every new SQLite connection, see REST_SQLITE_PRAGMAS.
+
+With the default rollback journal a writer locks the whole file and readers
+wait for it to commit; in WAL mode readers keep reading the last committed
+state while one writer appends to the log. The other PRAGMAs trade some
+durability on power loss (synchronous=NORMAL: a commit is durable once the
+WAL is checkpointed) and memory for fewer system calls and fsyncs.
+"""
+import re
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+TUNED_PRAGMAS = {
+    # first, so that switching the journal mode waits for other connections' locks
+    'busy_timeout': 5000,
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'mmap_size': 256 * 1024 * 1024,
+    # negative: in KiB rather than pages
+    'cache_size': -64 * 1024,
+}
+PRAGMA_VALUE = re.compile(r'^-?\w+$')
+
+
+def get_pragmas():
+    """The PRAGMAs configured by settings.REST_SQLITE_PRAGMAS, in the order to run them."""
+    config = getattr(settings, 'REST_SQLITE_PRAGMAS', None)
+    if not config:
+        return {}
+    if config is True:
+        return dict(TUNED_PRAGMAS)
+    return dict(TUNED_PRAGMAS, **config)
+
+
+@receiver(connection_created)
+def apply_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    for name, value in get_pragmas().items():
+        if not PRAGMA_VALUE.match(name) or not PRAGMA_VALUE.match(str(value)):
+            raise ValueError('Invalid SQLite PRAGMA %s = %r' % (name, value))
+        # on the raw connection, outside execute_wrappers and the debug query log
+        connection.connection.execute('PRAGMA %s = %s' % (name, value))
@@ -0,0 +1,159 @@
+"""
+Fleet statistics kept as running counters in FleetCounter.
+
+Every write to vehicles turns into +1/-1 deltas on the counters it affects
+(the total, the vehicle's driver or "" when unassigned, and its make), which
+are applied with UPDATE ... SET count = count + delta. Reading the stats is
+then a scan of the small counter table instead of COUNT(*) over vehicles.
+
+The deltas come from post_save/post_delete of single vehicles, bulk_changed
+for the bulk endpoints, SetDriverView batches and imports, and pre_delete of
+a driver, whose vehicles become unassigned. `manage.py rebuild_fleet_stats`
+recomputes every counter from the vehicles table.
+
+The counts a write takes away are read from the rows it changes, in its
+transaction and with select_for_update(), not from the instances as they
+were loaded, so two concurrent updates of a vehicle can't both move it out
+of the same counters. SQLite has no row locks, but it has one writer at a
+time, and a transaction that read a row before another one changed it
+fails on its write instead of applying stale deltas.
+"""
+from collections import Counter
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Q, Value, When
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .models import Driver, FleetCounter, Vehicle
+from .signals import bulk_changed
+
+TOTAL, DRIVER, MAKE = 'total', 'driver', 'make'
+# ids per query, below SQLite's limit of bound parameters
+BATCH_SIZE = 900
+# counters per UPDATE, each takes 4 parameters
+UPDATE_BATCH_SIZE = 200
+
+
+def vehicle_keys(driver_id, make):
+    return [(TOTAL, ''), (DRIVER, '' if driver_id is None else str(driver_id)), (MAKE, make)]
+
+
+def count_vehicle(deltas, counted, sign):
+    """Add `sign` to every counter a vehicle with `counted` = (driver_id, make) belongs to."""
+    for key in vehicle_keys(*counted):
+        deltas[key] += sign
+
+
+def apply_deltas(deltas):
+    deltas = sorted((key, delta) for key, delta in deltas.items() if delta)
+    # create the missing counters, then add every delta with one UPDATE per batch
+    FleetCounter.objects.bulk_create(
+        [FleetCounter(dimension=dimension, key=key) for (dimension, key), _ in deltas], ignore_conflicts=True
+    )
+    for start in range(0, len(deltas), UPDATE_BATCH_SIZE):
+        conditions = [
+            (Q(dimension=dimension, key=key), delta) for (dimension, key), delta in deltas[start:start + UPDATE_BATCH_SIZE]
+        ]
+        FleetCounter.objects.filter(reduce(or_, (condition for condition, _ in conditions))).update(count=F('count') + Case(
+            *(When(condition, then=Value(delta)) for condition, delta in conditions), output_field=IntegerField(),
+        ))
+
+
+def rebuild():
+    """Recompute every counter from the vehicles table, return the number of vehicles."""
+    deltas = Counter()
+    groups = Vehicle.objects.values_list('driver_id', 'make').annotate(count=Count('id')).order_by()
+    for driver_id, make, count in groups:
+        for key in vehicle_keys(driver_id, make):
+            deltas[key] += count
+    with transaction.atomic():
+        FleetCounter.objects.all().delete()
+        FleetCounter.objects.bulk_create(
+            FleetCounter(dimension=dimension, key=key, count=count) for (dimension, key), count in deltas.items()
+        )
+    return deltas[TOTAL, '']
+
+
+def get_stats():
+    counts = {TOTAL: {}, DRIVER: {}, MAKE: {}}
+    for dimension, key, count in FleetCounter.objects.filter(count__gt=0).values_list('dimension', 'key', 'count'):
+        counts[dimension][key] = count
+    total = counts[TOTAL].get('', 0)
+    unassigned = counts[DRIVER].pop('', 0)
+    return {
+        'vehicles': total,
+        'assigned': total - unassigned,
+        'unassigned': unassigned,
+        'per_driver': [
+            {'driver': driver_id, 'vehicles': count}
+            for driver_id, count in sorted((int(key), count) for key, count in counts[DRIVER].items())
+        ],
+        'per_make': [{'make': key, 'vehicles': count} for key, count in sorted(counts[MAKE].items())],
+    }
+
+
+def _counted(instance):
+    values = instance.__dict__
+    if 'driver_id' in values and 'make' in values:
+        return values['driver_id'], values['make']
+    return None
+
+
+@receiver(post_init, sender=Vehicle)
+def remember_counted(sender, instance, **kwargs):
+    # what the counters hold for this vehicle, to find the deltas of the next save
+    instance._counted = _counted(instance)
+
+
+@receiver(pre_save, sender=Vehicle)
+def load_counted(sender, instance, raw, using, **kwargs):
+    if not instance._state.adding:
+        # the row as it is now, locked until Vehicle.save() commits
+        instance._counted = Vehicle.objects.using(using).select_for_update().filter(
+            pk=instance.pk
+        ).values_list('driver_id', 'make').first()
+
+
+@receiver(post_save, sender=Vehicle)
+def count_saved_vehicle(sender, instance, created, **kwargs):
+    deltas = Counter()
+    counted = (instance.driver_id, instance.make)
+    if not created and instance._counted is not None:
+        count_vehicle(deltas, instance._counted, -1)
+    count_vehicle(deltas, counted, 1)
+    apply_deltas(deltas)
+    instance._counted = counted
+
+
+@receiver(post_delete, sender=Vehicle)
+def count_deleted_vehicle(sender, instance, **kwargs):
+    deltas = Counter()
+    count_vehicle(deltas, instance._counted or (instance.driver_id, instance.make), -1)
+    apply_deltas(deltas)
+
+
+@receiver(pre_delete, sender=Driver)
+def count_unassigned_vehicles(sender, instance, **kwargs):
+    # on_delete=SET_NULL moves all of the driver's vehicles to "unassigned"
+    key = str(instance.pk)
+    # locked, so a vehicle saved meanwhile can't add to the count being moved
+    count = FleetCounter.objects.select_for_update().filter(
+        dimension=DRIVER, key=key
+    ).values_list('count', flat=True).first()
+    if count:
+        apply_deltas(Counter({(DRIVER, key): -count, (DRIVER, ''): count}))
+
+
+@receiver(bulk_changed, sender=Vehicle)
+def count_bulk_changes(sender, pks, previous, **kwargs):
+    deltas = Counter()
+    for start in range(0, len(pks), BATCH_SIZE):
+        rows = Vehicle.objects.filter(pk__in=pks[start:start + BATCH_SIZE]).values_list('id', 'driver_id', 'make')
+        for pk, driver_id, make in rows:
+            count_vehicle(deltas, (driver_id, make), 1)
+            if pk in previous:
+                count_vehicle(deltas, (previous[pk]['driver_id'], previous[pk]['make']), -1)
+    apply_deltas(deltas)
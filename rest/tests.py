@@ -1,22 +1,105 @@
+import asyncio
+import difflib
 import json
-from datetime import datetime
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+from datetime import datetime, timezone as dt_timezone
+from io import StringIO
+from unittest import mock
 
-from django.test import TestCase
+import pytz
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.conf import settings
+from django.db import IntegrityError, NotSupportedError, connection, connections, router, transaction
+from django.http import HttpResponse
+from django.test import AsyncClient, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 
-from .models import Driver, Vehicle
-from .serializers import VehicleSerializer
+from .cache import get_response_cache
+from .db_router import PIN_COOKIE, ReplicaRoutingMiddleware
+from .fast import FastJSONRenderer, compile_datetime_format, get_row_serializer
+from .importer import validate_batch
+from .history import driver_history, vehicle_history
+from .jobs import execute, requeue_lost, work
+from .metrics import HISTOGRAMS, PerformanceMiddleware
+from .mixins import bulk_create
+from .models import Change, Driver, Job, SearchPosting, Vehicle, VehicleAssignment
+from .serializers import DriverSerializer, DriverWithVehiclesSerializer, VehicleSerializer
 
 
 class RestFixtures(TestCase):
     fixtures = ['rest_fixtures.json']
 
+    def setUp(self):
+        # cached responses outlive the rollback of the previous test
+        if get_response_cache() is not None:
+            get_response_cache().clear()
+
     def test_fixtures_exists(self):
         self.assertTrue(Driver.objects.exists())
         self.assertTrue(Vehicle.objects.exists())
 
 
+class PerformanceBudgetMixin:
+    """
+    assertBudget(url, budgets) requests url once per page size and fails when the
+    number of queries differs from the pinned one or the peak of Python allocations
+    during the request (tracemalloc) is above the pinned KiB. budgets is
+    {page_size: (queries, peak_kib)}. The failure message lists the queries of that
+    page size as a diff against the smallest one, with literals replaced by ?, so an
+    N+1 shows up as the same line repeated.
+    """
+
+    @staticmethod
+    def normalize_sql(sql):
+        return re.sub(r"'(?:[^']|'')*'|\b\d+\b", '?', sql)
+
+    def measure(self, url):
+        # through the handler's middleware chain, without the test client, whose
+        # request_started.connect() adds a weakref finalizer on every request
+        request = RequestFactory().get(url)
+        with CaptureQueriesContext(connection) as queries:
+            tracemalloc.start()
+            try:
+                response = self.client.handler.get_response(request)
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [self.normalize_sql(query['sql']) for query in queries.captured_queries], peak / 1024
+
+    @override_settings(REST_RESPONSE_CACHE=None)
+    def assertBudget(self, url, budgets):
+        separator = '&' if '?' in url else '?'
+        # imports and lazily built caches would count in the first request
+        self.client.get(url)
+        smallest = None
+        for page_size, (expected_queries, peak_kib) in sorted(budgets.items(), key=lambda item: item[0] or 0):
+            page_url = url if page_size is None else '%s%spage_size=%d' % (url, separator, page_size)
+            queries, peak = self.measure(page_url)
+            if smallest is None:
+                smallest = page_size, queries
+            if len(queries) != expected_queries:
+                diff = difflib.unified_diff(
+                    smallest[1], queries, 'page_size=%s' % smallest[0], 'page_size=%s' % page_size, lineterm='', n=1,
+                )
+                self.fail('%s ran %d queries instead of %d:\n%s' % (
+                    page_url, len(queries), expected_queries, '\n'.join(diff) or '\n'.join(queries),
+                ))
+            self.assertLessEqual(peak, peak_kib, '%s allocated %.0f KiB at peak' % (page_url, peak))
+
+
 class RestDriverTest(RestFixtures):
 
     def test_driver_list(self):
@@ -26,7 +109,7 @@ class RestDriverTest(RestFixtures):
         response = self.client.get(reverse('driver-list'))
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         drivers = Driver.objects.all()
-        self.assertListEqual([x['id'] for x in response.data], list(drivers.order_by('id').values_list('id', flat=True)))
+        self.assertListEqual([x['id'] for x in response.data['results']], list(drivers.order_by('id').values_list('id', flat=True)))
 
     def test_driver_list_created_at(self):
         """
@@ -36,12 +119,12 @@ class RestDriverTest(RestFixtures):
         response = self.client.get(f"{reverse('driver-list')}?created_at__gte=10-11-2021")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         drivers_created_at = Driver.objects.filter(created_at__gte=datetime.strptime('10-11-2021', '%d-%m-%Y'))
-        self.assertListEqual([x['id'] for x in response.data], list(drivers_created_at.order_by('id').values_list('id', flat=True)))
+        self.assertListEqual([x['id'] for x in response.data['results']], list(drivers_created_at.order_by('id').values_list('id', flat=True)))
 
         response = self.client.get(f"{reverse('driver-list')}?created_at__lte=16-11-2021")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         drivers_created_at = Driver.objects.filter(created_at__lte=datetime.strptime('16-11-2021', '%d-%m-%Y'))
-        self.assertListEqual([x['id'] for x in response.data], list(drivers_created_at.order_by('id').values_list('id', flat=True)))
+        self.assertListEqual([x['id'] for x in response.data['results']], list(drivers_created_at.order_by('id').values_list('id', flat=True)))
 
     def test_get_driver_data(self):
         """
@@ -111,7 +194,7 @@ class VehicleRestTest(RestFixtures):
         response = self.client.get(reverse('vehicle-list'))
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         vehicles = Vehicle.objects.all()
-        self.assertListEqual([x['id'] for x in response.data], list(vehicles.order_by('id').values_list('id', flat=True)))
+        self.assertListEqual([x['id'] for x in response.data['results']], list(vehicles.order_by('id').values_list('id', flat=True)))
 
     def test_vehicle_list_with_drivers_and_no_drivers(self):
         """
@@ -121,12 +204,12 @@ class VehicleRestTest(RestFixtures):
         response = self.client.get(f"{reverse('vehicle-list')}?with_drivers=yes")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         vehicle_with_drivers = Vehicle.objects.filter(driver__isnull=False)
-        self.assertListEqual([x['id'] for x in response.data], list(vehicle_with_drivers.order_by('id').values_list('id', flat=True)))
+        self.assertListEqual([x['id'] for x in response.data['results']], list(vehicle_with_drivers.order_by('id').values_list('id', flat=True)))
 
         response = self.client.get(f"{reverse('vehicle-list')}?with_drivers=no")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         vehicle_with_no_drivers = Vehicle.objects.filter(driver__isnull=True)
-        self.assertListEqual([x['id'] for x in response.data], list(vehicle_with_no_drivers.order_by('id').values_list('id', flat=True)))
+        self.assertListEqual([x['id'] for x in response.data['results']], list(vehicle_with_no_drivers.order_by('id').values_list('id', flat=True)))
 
     def test_get_vehicle_data(self):
         """
@@ -222,3 +305,1549 @@ class VehicleRestTest(RestFixtures):
         )
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertIsNone(Vehicle.objects.get(id=6).driver)
+
+    def test_vehicle_list_by_plate_number(self):
+        """
+        + GET /vehicles/vehicle/?plate_number=aa 9821  ff - пошук машини за номером без урахування регістру і пробілів
+        + GET /vehicles/vehicle/?plate_number=AA 982* - пошук машин за початком номера
+        """
+        response = self.client.get(reverse('vehicle-list'), {'plate_number': 'aa 9821  ff'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertListEqual([x['plate_number'] for x in response.data['results']], ['AA 9821 FF'])
+        self.assertNotIn('plate_number_normalized', response.data['results'][0])
+
+        response = self.client.get(reverse('vehicle-list'), {'plate_number': 'AA 982*'})
+        self.assertListEqual(
+            [x['id'] for x in response.data['results']],
+            list(Vehicle.objects.filter(plate_number__startswith='AA 982').order_by('id').values_list('id', flat=True))
+        )
+
+        response = self.client.get(reverse('vehicle-list'), {'plate_number': 'AA 99*'})
+        self.assertListEqual(response.data['results'], [])
+
+    def test_plate_number_unique(self):
+        """
+        + POST /vehicles/vehicle/ - номер, який вже є в базі (в тому числі в іншому регістрі чи з іншими пробілами), не приймається
+        """
+        data = {'driver': 1, 'make': 'D1', 'model': 'D1d', 'plate_number': 'AA 9821 FF'}
+        response = self.client.post(reverse('vehicle-list'), data=json.dumps(data), content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['plate_number'][0].code, 'unique')
+
+        # the vehicle keeps its own plate number
+        response = self.client.patch(
+            reverse('vehicle-detail', kwargs={'pk': 1}),
+            data=json.dumps({'plate_number': 'AA 9821 FF'}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.patch(
+            reverse('vehicle-detail', kwargs={'pk': 2}),
+            data=json.dumps({'plate_number': 'AA 9821 FF'}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        # the API only takes upper case and single spaces, the unique normalized number catches other writes
+        data['plate_number'] = 'aa 9821 ff'
+        response = self.client.post(reverse('vehicle-list'), data=json.dumps(data), content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Vehicle.objects.create(make='D1', model='D1d', plate_number='aa  9821 ff')
+
+
+class PaginationTest(RestFixtures):
+
+    def collect_pages(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids.extend(x['id'] for x in response.data['results'])
+            url = response.data['next']
+        return ids
+
+    def test_driver_pages(self):
+        """
+        + GET /drivers/driver/?page_size=4 - посторінковий вивід водіїв по курсору
+        """
+        ids = self.collect_pages(f"{reverse('driver-list')}?page_size=4")
+        self.assertListEqual(ids, list(Driver.objects.order_by('created_at', 'id').values_list('id', flat=True)))
+
+    def test_vehicle_pages_with_filter(self):
+        """
+        + GET /vehicles/vehicle/?with_drivers=yes&page_size=2 - курсор зберігає фільтри
+        """
+        ids = self.collect_pages(f"{reverse('vehicle-list')}?with_drivers=yes&page_size=2")
+        vehicles = Vehicle.objects.filter(driver__isnull=False).order_by('created_at', 'id')
+        self.assertListEqual(ids, list(vehicles.values_list('id', flat=True)))
+
+    def test_previous_page(self):
+        response = self.client.get(f"{reverse('driver-list')}?page_size=2")
+        first_page = [x['id'] for x in response.data['results']]
+        self.assertIsNone(response.data['previous'])
+
+        response = self.client.get(response.data['next'])
+        response = self.client.get(response.data['previous'])
+        self.assertListEqual([x['id'] for x in response.data['results']], first_page)
+
+    def test_insert_between_pages(self):
+        response = self.client.get(f"{reverse('driver-list')}?page_size=3")
+        first_page = [x['id'] for x in response.data['results']]
+        Driver.objects.create(first_name='new', last_name='driver')
+
+        ids = first_page + self.collect_pages(response.data['next'])
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertEqual(len(ids), Driver.objects.count())
+
+    def test_invalid_cursor(self):
+        response = self.client.get(f"{reverse('driver-list')}?cursor=broken")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class BulkTest(RestFixtures):
+
+    def test_bulk_create_vehicles(self):
+        """
+        + POST /vehicles/vehicle/bulk/ - створення списку машин однією транзакцією
+        """
+        data = [
+            {'driver': 1, 'make': 'B1', 'model': 'B1b', 'plate_number': 'BB 0001 BB'},
+            {'driver': None, 'make': 'B2', 'model': 'B2b', 'plate_number': 'BB 0002 BB'},
+            {'driver': 3, 'make': 'B3', 'model': 'B3b', 'plate_number': 'BB 0003 BB'},
+        ]
+        # drivers lookup, plate numbers lookup, savepoint, insert, ids, 3 for the fleet stats counters,
+        # change log, 6 for the search index (rows, terms lookup, terms insert, ids, trigrams, postings),
+        # 2 for the assignment history (rows, insert), release
+        with self.assertNumQueries(18):
+            response = self.client.post(reverse('vehicle-bulk'), data=json.dumps(data), content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertListEqual(
+            [x['id'] for x in response.data],
+            list(Vehicle.objects.filter(make__in=('B1', 'B2', 'B3')).order_by('id').values_list('id', flat=True))
+        )
+        self.assertEqual(Vehicle.objects.get(id=response.data[2]['id']).driver_id, 3)
+
+    def test_bulk_plate_numbers(self):
+        """
+        + POST /vehicles/vehicle/bulk/ - повтори номерів у списку і в базі
+        + PATCH /vehicles/vehicle/bulk/ - нормалізований номер оновлюється разом з номером
+        """
+        data = [
+            {'driver': 1, 'make': 'B1', 'model': 'B1b', 'plate_number': 'BB 0001 BB'},
+            {'driver': 1, 'make': 'B2', 'model': 'B2b', 'plate_number': 'BB 0001 BB'},
+            {'driver': 1, 'make': 'B3', 'model': 'B3b', 'plate_number': 'AA 9822 FF'},
+        ]
+        response = self.client.post(reverse('vehicle-bulk'), data=json.dumps(data), content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([item['plate_number'][0].code for item in response.data], ['unique'] * 3)
+
+        data = [{'id': 1, 'plate_number': 'BB 0001 BB'}, {'id': 2, 'make': 'B2'}]
+        response = self.client.patch(reverse('vehicle-bulk'), data=json.dumps(data), content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertListEqual(
+            list(Vehicle.objects.filter(id__in=(1, 2)).order_by('id').values_list('plate_number_normalized', flat=True)),
+            ['BB0001BB', 'AA9822FF']
+        )
+
+    def test_bulk_create_ids_need_sqlite(self):
+        # the newest ids are only this transaction's under SQLite's write lock
+        with mock.patch.object(connection, 'vendor', 'mysql'), self.assertRaises(NotSupportedError):
+            with transaction.atomic():
+                bulk_create(Driver, [Driver(first_name='Bulk', last_name='Driver')])
+        self.assertFalse(Driver.objects.filter(first_name='Bulk').exists())
+
+    def test_bulk_create_errors_per_item(self):
+        data = [
+            {'driver': 1, 'make': 'B1', 'model': 'B1b', 'plate_number': 'BB 0001 BB'},
+            {'driver': 948473, 'make': 'B2', 'model': 'B2b', 'plate_number': 'BB 0002 BB'},
+            {'driver': 1, 'make': 'B3', 'model': 'B3b', 'plate_number': 'wrong'},
+        ]
+        response = self.client.post(reverse('vehicle-bulk'), data=json.dumps(data), content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data[0], {})
+        self.assertEqual(response.data[1]['driver'][0].code, 'does_not_exist')
+        self.assertEqual(response.data[2]['plate_number'][0].code, 'invalid')
+        self.assertFalse(Vehicle.objects.filter(make__in=('B1', 'B2', 'B3')).exists())
+
+    def test_bulk_update_drivers(self):
+        """
+        + PATCH /drivers/driver/bulk/ - редагування списку водіїв
+        """
+        data = [{'id': 1, 'last_name': 'bulk1'}, {'id': 2, 'first_name': 'bulk2'}]
+        response = self.client.patch(reverse('driver-bulk'), data=json.dumps(data), content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Driver.objects.get(id=1).last_name, 'bulk1')
+        self.assertEqual(Driver.objects.get(id=2).first_name, 'bulk2')
+
+        response = self.client.patch(
+            reverse('driver-bulk'),
+            data=json.dumps([{'id': 1, 'last_name': 'x'}, {'id': 948473, 'last_name': 'y'}, {'last_name': 'z'}]),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data[0], {})
+        self.assertIn('id', response.data[1])
+        self.assertIn('id', response.data[2])
+        self.assertEqual(Driver.objects.get(id=1).last_name, 'bulk1')
+
+        # JSON true is not id 1
+        response = self.client.patch(
+            reverse('vehicle-bulk'), data=json.dumps([{'id': True, 'make': 'X'}]), content_type='application/json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('id', response.data[0])
+        self.assertNotEqual(Vehicle.objects.get(id=1).make, 'X')
+
+    def test_bulk_delete_vehicles(self):
+        """
+        + DELETE /vehicles/vehicle/bulk/ - видалення списку машин
+        """
+        response = self.client.delete(reverse('vehicle-bulk'), data=json.dumps([1, 948473]), content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertTrue(Vehicle.objects.filter(id=1).exists())
+
+        response = self.client.delete(reverse('vehicle-bulk'), data=json.dumps([True]), content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertTrue(Vehicle.objects.filter(id=1).exists())
+
+        response = self.client.delete(reverse('vehicle-bulk'), data=json.dumps([1, 2]), content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Vehicle.objects.filter(id__in=(1, 2)).exists())
+
+    def test_bulk_expects_list(self):
+        response = self.client.post(reverse('driver-bulk'), data=json.dumps({}), content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_set_driver_pairs(self):
+        """
+        + PATCH /vehicles/set_driver/bulk/ - садимо водіїв в список машин
+        """
+        data = {'assignments': [
+            {'vehicle_id': 6, 'driver_id': 3},
+            {'vehicle_id': 5, 'driver_id': 3},
+            {'vehicle_id': 1, 'driver_id': None},
+        ]}
+        # drivers, vehicles, savepoint, previous rows and one UPDATE per driver,
+        # 3 for the fleet stats counters, change log, search index rows (unchanged, not reindexed),
+        # 3 for the assignment history (rows, close, open), release
+        with self.assertNumQueries(16):
+            response = self.client.patch(reverse('set_driver-bulk'), data=json.dumps(data), content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['updated'], 3)
+        self.assertListEqual(list(Vehicle.objects.filter(driver=3).order_by('id').values_list('id', flat=True)), [5, 6])
+        self.assertIsNone(Vehicle.objects.get(id=1).driver)
+
+        data = {'assignments': [{'vehicle_id': 948473, 'driver_id': 1}, {'vehicle_id': 2, 'driver_id': 948473}]}
+        response = self.client.patch(reverse('set_driver-bulk'), data=json.dumps(data), content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('vehicle_id', response.data['assignments'][0])
+        self.assertIn('driver_id', response.data['assignments'][1])
+
+        data = {'assignments': [{'vehicle_id': 2, 'driver_id': 1}, {'vehicle_id': 3, 'driver_id': 1}, {'vehicle_id': 2, 'driver_id': 3}]}
+        response = self.client.patch(reverse('set_driver-bulk'), data=json.dumps(data), content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertListEqual([bool(x) for x in response.data['assignments']], [True, False, True])
+
+        # existence checks in batches below the bound parameter limit
+        data = {'assignments': [{'vehicle_id': 1, 'driver_id': 1}] + [
+            {'vehicle_id': 10 ** 6 + i, 'driver_id': None} for i in range(2000)
+        ]}
+        with self.assertNumQueries(4):
+            response = self.client.patch(reverse('set_driver-bulk'), data=json.dumps(data), content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['assignments'][0], {})
+
+    def test_bulk_set_driver_filter(self):
+        """
+        + PATCH /vehicles/set_driver/bulk/ - садимо водія в усі машини за фільтром
+        """
+        data = {'driver_id': 4, 'filter': {'driver_id': 1}}
+        response = self.client.patch(reverse('set_driver-bulk'), data=json.dumps(data), content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['updated'], 4)
+        self.assertFalse(Vehicle.objects.filter(driver=1).exists())
+
+        data = {'driver_id': None, 'filter': {'with_drivers': 'yes'}}
+        response = self.client.patch(reverse('set_driver-bulk'), data=json.dumps(data), content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(Vehicle.objects.filter(driver__isnull=False).exists())
+
+        for data in ({'driver_id': 948473, 'filter': {'make': 'M1'}}, {'driver_id': 1, 'filter': {}}, {'driver_id': 1}):
+            response = self.client.patch(reverse('set_driver-bulk'), data=json.dumps(data), content_type='application/json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class QueryFilterTest(RestFixtures):
+
+    def ids(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        return [x['id'] for x in response.data['results']]
+
+    def test_vehicle_filters(self):
+        """
+        + GET /vehicles/vehicle/?driver=1,2&make=...&model=... - фільтри по списках водіїв, марок і моделей
+        """
+        url = reverse('vehicle-list')
+        self.assertListEqual(
+            self.ids(url, driver='1,2'),
+            list(Vehicle.objects.filter(driver__in=[1, 2]).order_by('created_at', 'id').values_list('id', flat=True))
+        )
+        vehicle = Vehicle.objects.get(pk=1)
+        with self.assertNumQueries(1):
+            ids = self.ids(url, make=vehicle.make, model=f'{vehicle.model},other', driver=vehicle.driver_id)
+        self.assertListEqual(ids, list(Vehicle.objects.filter(
+            make=vehicle.make, model=vehicle.model, driver=vehicle.driver_id
+        ).order_by('created_at', 'id').values_list('id', flat=True)))
+
+    def test_date_ranges_and_updated_since(self):
+        """
+        + GET /drivers/driver/?updated_since=<ISO 8601>&ordering=updated_at - інкрементальна синхронізація
+        """
+        Driver.objects.filter(pk=2).update(updated_at=datetime(2030, 1, 1, tzinfo=dt_timezone.utc))
+        Driver.objects.filter(pk=3).update(updated_at=datetime(2030, 1, 2, tzinfo=dt_timezone.utc))
+        url = reverse('driver-list')
+        self.assertListEqual(self.ids(url, updated_since='2030-01-01T00:00:00Z', ordering='updated_at'), [2, 3])
+        self.assertListEqual(self.ids(url, updated_since='2030-01-01T00:00:00Z', ordering='-updated_at'), [3, 2])
+        self.assertListEqual(self.ids(url, updated_at__gte='02-01-2030'), [3])
+        self.assertListEqual(self.ids(url, updated_at__gte='01-01-2030', updated_at__lte='2030-01-01T12:00:00Z'), [2])
+
+        query_set = Driver.objects.filter(updated_at__gte=datetime(2030, 1, 1, tzinfo=dt_timezone.utc))
+        self.assertIn('driver_updated_at_id_idx', query_set.order_by('updated_at', 'id').explain())
+
+    def test_ordering_pages(self):
+        """
+        + GET /vehicles/vehicle/?ordering=-created_at&page_size=2 - сортування зберігається в курсорі
+        """
+        ids, url = [], f"{reverse('vehicle-list')}?ordering=-created_at&page_size=2"
+        while url:
+            response = self.client.get(url)
+            ids.extend(x['id'] for x in response.data['results'])
+            url = response.data['next']
+        self.assertListEqual(ids, list(Vehicle.objects.order_by('-created_at', '-id').values_list('id', flat=True)))
+
+    def test_invalid_params(self):
+        """
+        + GET /drivers/driver/?created_at__gte=31-02-2021 - неправильна дата повертає 400
+        """
+        for url, name in (
+            (f"{reverse('driver-list')}?created_at__gte=31-02-2021", 'created_at__gte'),
+            (f"{reverse('driver-list')}?ordering=first_name", 'ordering'),
+            (f"{reverse('vehicle-list')}?driver=1,x", 'driver'),
+            (f"{reverse('vehicle-list')}?fields=id,owner", 'fields'),
+            (f"{reverse('fleet-export', kwargs={'export_format': 'csv'})}?created_at__lte=tomorrow", 'created_at__lte'),
+        ):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, url)
+            self.assertIn(name, response.json())
+
+    def test_sparse_fields(self):
+        """
+        + GET /vehicles/vehicle/?fields=id,plate_number - лише вибрані поля і колонки
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('vehicle-list'), {'fields': 'plate_number,id', 'page_size': 2})
+        self.assertListEqual([list(x) for x in response.data['results']], [['id', 'plate_number']] * 2)
+        self.assertNotIn('"make"', queries.captured_queries[0]['sql'])
+        response = self.client.get(response.data['next'])
+        self.assertListEqual(list(response.data['results'][0]), ['id', 'plate_number'])
+
+        response = self.client.get(reverse('driver-detail', kwargs={'pk': 1}), {'fields': 'first_name'})
+        self.assertDictEqual(response.data, {'first_name': Driver.objects.get(pk=1).first_name})
+        response = self.client.get(reverse('driver-list'), {'fields': 'id,vehicles', 'expand': 'vehicles'})
+        self.assertListEqual(list(response.data['results'][0]), ['id', 'vehicles'])
+
+
+class ExpandTest(RestFixtures):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for index in range(20):
+            driver = Driver.objects.create(first_name='Expand', last_name=str(index))
+            Vehicle.objects.create(driver=driver, make='E', model='E1', plate_number='EE %04d EE' % index)
+
+    def test_driver_list_expand_vehicles(self):
+        """
+        + GET /drivers/driver/?expand=vehicles - вивід водіїв разом з їх машинами
+        """
+        for page_size in (2, 10, 26):
+            # drivers page, vehicles of the page
+            with self.assertNumQueries(2):
+                response = self.client.get(f"{reverse('driver-list')}?expand=vehicles&page_size={page_size}")
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(len(response.data['results']), page_size)
+
+        driver = response.data['results'][0]
+        self.assertListEqual(
+            [x['id'] for x in driver['vehicles']],
+            list(Vehicle.objects.filter(driver=driver['id']).order_by('id').values_list('id', flat=True))
+        )
+
+    def test_vehicle_list_expand_driver(self):
+        """
+        + GET /vehicles/vehicle/?expand=driver - вивід машин разом з водієм
+        """
+        for page_size in (2, 10, 26):
+            with self.assertNumQueries(1):
+                response = self.client.get(f"{reverse('vehicle-list')}?expand=driver&page_size={page_size}")
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(len(response.data['results']), page_size)
+
+        vehicle = Vehicle.objects.get(id=response.data['results'][0]['id'])
+        self.assertEqual(response.data['results'][0]['driver']['id'], vehicle.driver_id)
+        unassigned = [x for x in response.data['results'] if x['id'] == 6][0]
+        self.assertIsNone(unassigned['driver'])
+
+    def test_retrieve_expanded(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(f"{reverse('driver-detail', kwargs={'pk': 1})}?expand=vehicles")
+        self.assertEqual(len(response.data['vehicles']), Vehicle.objects.filter(driver=1).count())
+
+        response = self.client.get(reverse('driver-detail', kwargs={'pk': 1}))
+        self.assertNotIn('vehicles', response.data)
+
+
+class ResponseCacheTest(RestFixtures):
+
+    def test_list_cached_until_write(self):
+        """
+        + GET /vehicles/vehicle/ - повторний запит віддається з кешу, запис скидає кеш
+        """
+        url = reverse('vehicle-list')
+        self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(get_response_cache().stats(), {'hits': 1, 'misses': 1})
+
+        # the query string is normalized
+        self.client.get(f'{url}?with_drivers=no&page_size=5')
+        self.assertEqual(self.client.get(f'{url}?page_size=5&with_drivers=no')['X-Cache'], 'HIT')
+
+        # tokens are replaced once the write commits
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(
+                reverse('vehicle-detail', kwargs={'pk': 2}),
+                data=json.dumps({'plate_number': 'PP 2321 BB'}),
+                content_type='application/json'
+            )
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual([x for x in response.data['results'] if x['id'] == 2][0]['plate_number'], 'PP 2321 BB')
+
+    def test_set_driver_invalidates(self):
+        """
+        + PATCH /vehicles/set_driver/<vehicle_id>/ - скидає кеш машини і розгорнутих водіїв
+        """
+        vehicle_url = reverse('vehicle-detail', kwargs={'pk': 6})
+        expanded_url = f"{reverse('driver-list')}?expand=vehicles"
+        plain_url = reverse('driver-list')
+        for url in (vehicle_url, expanded_url, plain_url):
+            self.client.get(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(
+                reverse('set_driver-detail', kwargs={'pk': 6}),
+                data=json.dumps({'driver': 2}),
+                content_type='application/json'
+            )
+        response = self.client.get(vehicle_url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['driver'], 2)
+        self.assertEqual(self.client.get(expanded_url)['X-Cache'], 'MISS')
+        # drivers themselves didn't change
+        self.assertEqual(self.client.get(plain_url)['X-Cache'], 'HIT')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(
+                reverse('set_driver-bulk'),
+                data=json.dumps({'assignments': [{'vehicle_id': 6, 'driver_id': 3}]}),
+                content_type='application/json'
+            )
+        self.assertEqual(self.client.get(vehicle_url).data['driver'], 3)
+
+    def test_detail_only_invalidated_by_its_object(self):
+        self.client.get(reverse('vehicle-detail', kwargs={'pk': 1}))
+        self.client.patch(
+            reverse('vehicle-detail', kwargs={'pk': 2}),
+            data=json.dumps({'make': 'other'}),
+            content_type='application/json'
+        )
+        self.assertEqual(self.client.get(reverse('vehicle-detail', kwargs={'pk': 1}))['X-Cache'], 'HIT')
+
+    def test_detail_url_variants_share_invalidation(self):
+        """
+        + GET /vehicles/vehicle/01/ - кеш скидається записом у /vehicles/vehicle/1/
+        """
+        self.assertEqual(self.client.get('/vehicles/vehicle/01/')['X-Cache'], 'MISS')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(
+                reverse('vehicle-detail', kwargs={'pk': 1}),
+                data=json.dumps({'make': 'Changed'}),
+                content_type='application/json'
+            )
+        self.assertEqual(self.client.get('/vehicles/vehicle/01/').data['make'], 'Changed')
+        self.assertEqual(self.client.get('/vehicles/vehicle/abc/').status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_driver_delete_invalidates_vehicles(self):
+        url = reverse('vehicle-detail', kwargs={'pk': 3})
+        self.assertEqual(self.client.get(url).data['driver'], 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(reverse('driver-detail', kwargs={'pk': 2}))
+        self.assertIsNone(self.client.get(url).data['driver'])
+
+    def test_invalidated_on_commit(self):
+        """
+        + POST /vehicles/vehicle/bulk/ - кеш скидається після коміту, а не всередині транзакції
+        """
+        url = reverse('vehicle-list')
+        self.client.get(url)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.client.post(reverse('vehicle-bulk'), data=json.dumps(
+                [{'make': 'Skoda', 'model': 'Octavia', 'plate_number': 'AA 0001 AA'}]
+            ), content_type='application/json')
+            # still uncommitted: a request now must not cache the old rows under new tokens
+            self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+        self.assertEqual(len(callbacks), 1)
+        callbacks[0]()
+        self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+
+    @override_settings(REST_RESPONSE_CACHE=None)
+    def test_disabled(self):
+        self.assertNotIn('X-Cache', self.client.get(reverse('vehicle-list')))
+
+
+@override_settings(REST_RESPONSE_CACHE=None)
+class ConditionalRequestTest(RestFixtures):
+
+    def test_detail_not_modified(self):
+        """
+        + GET /vehicles/vehicle/<vehicle_id>/ з If-None-Match - 304 без серіалізації
+        """
+        url = reverse('vehicle-detail', kwargs={'pk': 1})
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        Vehicle.objects.get(id=1).save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_list_not_modified(self):
+        """
+        + GET /drivers/driver/?expand=vehicles з If-None-Match - 304, поки не змінились водії чи їх машини
+        """
+        url = f"{reverse('driver-list')}?expand=vehicles&page_size=3"
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # another representation of the same rows
+        response = self.client.get(f"{reverse('driver-list')}?page_size=3", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        Vehicle.objects.filter(driver=2).update(driver=None)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+        etag = self.client.get(url)['ETag']
+        Driver.objects.create(first_name='new', last_name='driver')
+        # a new row outside of the page doesn't touch it
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_vehicle_etag_after_driver_delete(self):
+        url = reverse('vehicle-detail', kwargs={'pk': 3})
+        etag = self.client.get(url)['ETag']
+        Driver.objects.get(id=2).delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(response.data['driver'])
+
+    def test_if_match(self):
+        """
+        + PATCH /vehicles/set_driver/<vehicle_id>/ з If-Match - 412, якщо машину вже змінили
+        """
+        etag = self.client.get(reverse('vehicle-detail', kwargs={'pk': 6}))['ETag']
+        response = self.client.patch(
+            reverse('set_driver-detail', kwargs={'pk': 6}),
+            data=json.dumps({'driver': 2}),
+            content_type='application/json',
+            HTTP_IF_MATCH=etag
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        new_etag = response['ETag']
+        self.assertEqual(self.client.get(reverse('vehicle-detail', kwargs={'pk': 6}))['ETag'], new_etag)
+
+        # a second client still holding the old ETag
+        response = self.client.patch(
+            reverse('set_driver-detail', kwargs={'pk': 6}),
+            data=json.dumps({'driver': 3}),
+            content_type='application/json',
+            HTTP_IF_MATCH=etag
+        )
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.assertEqual(Vehicle.objects.get(id=6).driver_id, 2)
+
+        response = self.client.patch(
+            reverse('vehicle-detail', kwargs={'pk': 6}),
+            data=json.dumps({'make': 'M9'}),
+            content_type='application/json',
+            HTTP_IF_MATCH=new_etag
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # only the ETag of the plain URL
+        other_etag = self.client.get(reverse('vehicle-detail', kwargs={'pk': 6}), {'format': 'json'})['ETag']
+        response = self.client.patch(
+            reverse('vehicle-detail', kwargs={'pk': 6}),
+            data=json.dumps({'make': 'M10'}),
+            content_type='application/json',
+            HTTP_IF_MATCH=other_etag
+        )
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+
+    @override_settings(REST_RESPONSE_CACHE={'BACKEND': 'rest.cache.LocMemLRUCache'})
+    def test_cached_not_modified(self):
+        url = reverse('vehicle-list')
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(self.client.get(url)['ETag'], etag)
+
+
+class ExportTest(RestFixtures):
+
+    def test_export_ndjson(self):
+        """
+        + GET /vehicles/export/ndjson/?with_drivers=yes - вивантаження машин з водіями потоком
+        """
+        response = self.client.get(f"{reverse('fleet-export', kwargs={'export_format': 'ndjson'})}?with_drivers=yes")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertListEqual(
+            [x['id'] for x in rows],
+            list(Vehicle.objects.filter(driver__isnull=False).order_by('id').values_list('id', flat=True))
+        )
+        vehicle = Vehicle.objects.select_related('driver').get(id=rows[0]['id'])
+        self.assertEqual(rows[0]['driver_last_name'], vehicle.driver.last_name)
+        self.assertEqual(rows[0]['created_at'], VehicleSerializer(vehicle).data['created_at'])
+
+    def test_export_csv(self):
+        """
+        + GET /vehicles/export/csv/ - вивантаження машин в CSV
+        """
+        response = self.client.get(reverse('fleet-export', kwargs={'export_format': 'csv'}))
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertTrue(lines[0].startswith('id,driver,make'))
+        self.assertEqual(len(lines) - 1, Vehicle.objects.count())
+
+    def test_export_command(self):
+        out = StringIO()
+        call_command('export_fleet', '--with-drivers', 'no', stdout=out)
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertListEqual([x['id'] for x in rows], [6])
+
+
+class ImportTest(RestFixtures):
+
+    def write(self, name, content):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, name)
+        with open(path, 'w') as target:
+            target.write(content)
+        return path
+
+    def test_import_ndjson(self):
+        """
+        + manage.py import_fleet fleet.ndjson - імпорт машин з перевіркою номерів
+        """
+        path = self.write('fleet.ndjson', '\n'.join([
+            json.dumps({'driver': 1, 'make': 'I1', 'model': 'I1i', 'plate_number': 'II 0001 II'}),
+            json.dumps({'driver': None, 'make': 'I2', 'model': 'I2i', 'plate_number': 'II 0002 II'}),
+            json.dumps({'driver': 948473, 'make': 'I3', 'model': 'I3i', 'plate_number': 'II 0003 II'}),
+            json.dumps({'driver': 1, 'make': 'I4', 'model': 'I4i', 'plate_number': 'ii0004'}),
+            'not json',
+        ]))
+        out, err = StringIO(), StringIO()
+        # the plate numbers of a batch are looked up in chunks
+        with mock.patch('rest.importer.LOOKUP_BATCH_SIZE', 1), CaptureQueriesContext(connection) as queries:
+            call_command('import_fleet', path, '--batch-size', '2', stdout=out, stderr=err)
+        lookups = [query['sql'] for query in queries.captured_queries if '"plate_number_normalized" IN (' in query['sql']]
+        self.assertEqual(len(lookups), 3)
+        self.assertListEqual(
+            list(Vehicle.objects.filter(make__startswith='I').order_by('id').values_list('make', 'driver')),
+            [('I1', 1), ('I2', None)]
+        )
+        self.assertIn('Imported 2 vehicles, rejected 3', out.getvalue())
+        self.assertIn('line 4: plate_number', err.getvalue())
+
+    def test_import_exported_csv_with_checkpoint(self):
+        """
+        + manage.py import_fleet fleet.csv --checkpoint - імпорт продовжується з останньої збереженої партії
+        """
+        out = StringIO()
+        call_command('export_fleet', '--format', 'csv', stdout=out)
+        rows = out.getvalue().splitlines()
+        path = self.write('fleet.csv', '\n'.join(rows) + '\n')
+        checkpoint = path + '.checkpoint'
+        with open(checkpoint, 'w') as target:
+            json.dump({'path': os.path.abspath(path), 'consumed': 4}, target)
+
+        Vehicle.objects.all().delete()
+        call_command('import_fleet', path, '--checkpoint', checkpoint, stdout=StringIO())
+        self.assertEqual(Vehicle.objects.count(), len(rows) - 1 - 4)
+        with open(checkpoint) as source:
+            self.assertEqual(json.load(source)['consumed'], len(rows) - 1)
+
+    def test_validate_batch(self):
+        rows, errors = validate_batch([
+            (1, {'make': 'A', 'model': 'B', 'plate_number': 'AA 1234 OO', 'driver': '2'}),
+            (2, {'make': '', 'model': 'B', 'plate_number': 'AA 1234 OO', 'driver': 'x'}),
+            (3, {'make': 'A', 'model': 'B', 'plate_number': 'AA 1234 OO', 'driver': True}),
+        ])
+        self.assertListEqual(rows, [(1, ('A', 'B', 'AA 1234 OO', 2))])
+        self.assertEqual(errors[0][0], 2)
+        self.assertIn('make', errors[0][1])
+        self.assertIn('driver', errors[0][1])
+        self.assertEqual(errors[1], (3, 'driver: True is not a valid id'))
+
+
+# the async views query from a thread pool, which can't see the data of a TestCase transaction
+@override_settings(REST_RESPONSE_CACHE=None)
+class AsyncViewTest(TransactionTestCase):
+    fixtures = ['rest_fixtures.json']
+
+    def assertSameResponse(self, name, query=None, **kwargs):
+        response = self.client.get(reverse(name, kwargs=kwargs), query)
+        async_response = self.client.get(reverse('async-%s' % name, kwargs=kwargs), query)
+        self.assertEqual(async_response.status_code, response.status_code)
+        self.assertEqual(async_response.get('ETag'), response.get('ETag'))
+        if name.endswith('-list') and response.status_code == status.HTTP_200_OK:
+            for data in (response.data, async_response.data):
+                for link in ('next', 'previous'):
+                    data[link] = data[link] and data[link].replace('/async/', '/')
+        self.assertEqual(async_response.data, response.data)
+
+    def test_async_reads_match_sync_views(self):
+        """
+        + GET /async/drivers/driver/ - ті самі відповіді, що й у синхронних view
+        + GET /async/vehicles/vehicle/<vehicle_id>/
+        """
+        self.assertSameResponse('driver-list', {'expand': 'vehicles', 'page_size': 1})
+        self.assertSameResponse('driver-list', {'created_at__gte': '01-02-2021'})
+        self.assertSameResponse('vehicle-list', {'with_drivers': 'yes', 'expand': 'driver'})
+        self.assertSameResponse('driver-detail', {'expand': 'vehicles'}, pk=1)
+        self.assertSameResponse('vehicle-detail', pk=6)
+        self.assertSameResponse('vehicle-detail', pk=948473)
+        self.assertSameResponse('vehicle-list', {'cursor': 'wrong'})
+        self.assertSameResponse('vehicle-list', {'q': 'toyota', 'with_drivers': 'yes'})
+        self.assertSameResponse('driver-list', {'q': 'booba1', 'expand': 'vehicles'})
+        self.assertSameResponse('driver-list', {'q': ''})
+
+    async def test_async_client(self):
+        """
+        + GET /async/vehicles/vehicle/ під ASGI, з If-None-Match
+        """
+        client = AsyncClient()
+        url = '%s?plate_number=AA+9826+FF' % reverse('async-vehicle-list')
+        response = await client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([x['id'] for x in json.loads(response.content)['results']], [6])
+
+        # AsyncClient of Django 3.2 takes header names as they are sent
+        response = await client.get(url, **{'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        response = await client.post(reverse('async-vehicle-list'))
+        self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    async def test_async_middleware(self):
+        """
+        + GET /async/vehicles/vehicle/<vehicle_id>/ - middleware в async-режимі рахують запити з потоків бази
+        """
+        response = await AsyncClient().get(reverse('async-vehicle-detail', kwargs={'pk': 6}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('desc="1 queries"', response['Server-Timing'])
+
+        async def get_response(request):
+            return HttpResponse()
+        for middleware in (PerformanceMiddleware, ReplicaRoutingMiddleware):
+            self.assertTrue(asyncio.iscoroutinefunction(middleware(get_response)))
+
+
+@override_settings(DATABASE_ROUTERS=['rest.db_router.PrimaryReplicaRouter'], REST_DB_REPLICAS=['replica1'])
+class DatabaseRouterTest(TestCase):
+    # querysets are only routed here, the replica alias is never connected to
+
+    def route(self, request, write=False):
+        """Databases a view reading vehicles before and after an optional write would use."""
+        databases = []
+
+        def view(request):
+            databases.append(Vehicle.objects.all().db)
+            if write:
+                router.db_for_write(Vehicle)
+                databases.append(Vehicle.objects.all().db)
+            return HttpResponse()
+
+        response = ReplicaRoutingMiddleware(view)(request)
+        return databases, response
+
+    def test_reads_of_safe_requests_go_to_replicas(self):
+        """
+        + GET - читання з репліки, після запису в тому ж запиті - з основної бази
+        """
+        databases, response = self.route(RequestFactory().get('/vehicles/vehicle/'))
+        self.assertEqual(databases, ['replica1'])
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+        databases, response = self.route(RequestFactory().get('/vehicles/vehicle/'), write=True)
+        self.assertEqual(databases[0], 'replica1')
+        self.assertEqual(databases[-1], 'default')
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+        # outside of a request
+        self.assertEqual(Vehicle.objects.all().db, 'default')
+
+    def test_writes_pin_the_client_to_the_primary(self):
+        """
+        + PATCH /vehicles/set_driver/<vehicle_id>/ - запити на запис і наступні читання клієнта йдуть в основну базу
+        """
+        databases, response = self.route(RequestFactory().patch('/vehicles/set_driver/1/'))
+        self.assertEqual(databases, ['default'])
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+        request = RequestFactory().get('/vehicles/vehicle/')
+        request.COOKIES[PIN_COOKIE] = response.cookies[PIN_COOKIE].value
+        databases, response = self.route(request)
+        self.assertEqual(databases, ['default'])
+
+
+class SQLitePragmasTest(TestCase):
+
+    def pragmas(self, *names):
+        connection = connections.create_connection('default')
+        self.addCleanup(lambda: connection.connection and connection.connection.close())
+        connection.ensure_connection()
+        return [connection.connection.execute('PRAGMA %s' % name).fetchone()[0] for name in names]
+
+    def test_pragmas_on_new_connections(self):
+        self.assertEqual(self.pragmas('cache_size'), [-2000])
+        with override_settings(REST_SQLITE_PRAGMAS=True):
+            self.assertEqual(self.pragmas('busy_timeout', 'synchronous', 'cache_size'), [5000, 1, -64 * 1024])
+        with override_settings(REST_SQLITE_PRAGMAS={'cache_size': -1024}):
+            self.assertEqual(self.pragmas('busy_timeout', 'cache_size'), [5000, -1024])
+        with override_settings(REST_SQLITE_PRAGMAS={'cache_size': '1; DROP TABLE rest_vehicle'}):
+            with self.assertRaises(ValueError):
+                self.pragmas('cache_size')
+
+
+class FleetStatsTest(RestFixtures):
+
+    def assertStats(self):
+        """The counters match a recount of the vehicles table."""
+        stats = self.client.get(reverse('fleet-stats')).data
+        call_command('rebuild_fleet_stats', stdout=StringIO())
+        self.assertEqual(stats, self.client.get(reverse('fleet-stats')).data)
+        return stats
+
+    def test_stats(self):
+        """
+        + GET /vehicles/stats/ - кількість машин з водіями і без, по водіях і по марках
+        """
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('fleet-stats'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {
+            'vehicles': 6, 'assigned': 5, 'unassigned': 1,
+            'per_driver': [{'driver': 1, 'vehicles': 4}, {'driver': 2, 'vehicles': 1}],
+            'per_make': [{'make': 'M1', 'vehicles': 6}],
+        })
+        self.assertEqual(self.assertStats(), response.data)
+
+    def test_stats_follow_writes(self):
+        """
+        + GET /vehicles/stats/ - лічильники оновлюються при створенні, зміні і видаленні машин і водіїв
+        """
+        self.client.patch(
+            reverse('set_driver-detail', kwargs={'pk': 6}), data=json.dumps({'driver': 3}), content_type='application/json'
+        )
+        self.client.patch(
+            reverse('vehicle-detail', kwargs={'pk': 5}), data=json.dumps({'make': 'M2'}), content_type='application/json'
+        )
+        self.client.post(reverse('vehicle-list'), data=json.dumps(
+            {'driver': None, 'make': 'M3', 'model': 'X', 'plate_number': 'SS 0001 SS'}
+        ), content_type='application/json')
+        self.client.delete(reverse('vehicle-detail', kwargs={'pk': 4}))
+        self.client.delete(reverse('driver-detail', kwargs={'pk': 1}))
+        self.client.patch(reverse('set_driver-bulk'), data=json.dumps(
+            {'driver_id': 2, 'filter': {'make': 'M1'}}
+        ), content_type='application/json')
+        self.client.post(reverse('vehicle-bulk'), data=json.dumps(
+            [{'driver': 3, 'make': 'M3', 'model': 'X', 'plate_number': 'SS 0002 SS'}]
+        ), content_type='application/json')
+        self.client.delete(reverse('vehicle-bulk'), data=json.dumps([1]), content_type='application/json')
+
+        stats = self.assertStats()
+        self.assertEqual(stats['vehicles'], Vehicle.objects.count())
+        self.assertEqual(stats['unassigned'], Vehicle.objects.filter(driver__isnull=True).count())
+        self.assertEqual({item['make'] for item in stats['per_make']}, {'M1', 'M2', 'M3'})
+
+    def test_stale_instances(self):
+        # two writers that loaded the same vehicle before either saved
+        first, second = Vehicle.objects.get(pk=6), Vehicle.objects.get(pk=6)
+        first.driver_id = 2
+        first.save()
+        second.make = 'M2'
+        second.save()
+        stats = self.assertStats()
+        self.assertEqual(stats['per_make'], [{'make': 'M1', 'vehicles': 5}, {'make': 'M2', 'vehicles': 1}])
+        # the second save wrote back the driver it had loaded, the counters follow the row
+        self.assertEqual(stats['per_driver'], [{'driver': 1, 'vehicles': 4}, {'driver': 2, 'vehicles': 1}])
+
+
+class MetricsTest(RestFixtures):
+
+    def setUp(self):
+        super().setUp()
+        for histogram in HISTOGRAMS:
+            histogram.clear()
+
+    def test_server_timing(self):
+        """
+        + GET /drivers/driver/ - заголовок Server-Timing з часом запиту, бази і серіалізації
+        """
+        response = self.client.get(reverse('driver-list'), {'expand': 'vehicles'})
+        timing = dict(part.strip().split(';', 1) for part in response['Server-Timing'].split(','))
+        self.assertSetEqual(set(timing), {'total', 'db', 'serializer'})
+        self.assertIn('desc="2 queries"', timing['db'])
+
+    def test_metrics_by_view(self):
+        """
+        + GET /metrics - гістограми по view у форматі Prometheus
+        """
+        self.client.get(reverse('driver-list'))
+        self.client.get(reverse('vehicle-detail', kwargs={'pk': 1}))
+        self.client.get(reverse('vehicle-detail', kwargs={'pk': 2}))
+        self.client.patch(
+            reverse('set_driver-detail', kwargs={'pk': 6}), data=json.dumps({'driver': 2}), content_type='application/json'
+        )
+
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        lines = response.content.decode().splitlines()
+        self.assertIn('# TYPE rest_request_duration_seconds histogram', lines)
+        self.assertIn('rest_request_duration_seconds_count{view="driver-list",method="GET"} 1', lines)
+        self.assertIn('rest_request_duration_seconds_count{view="vehicle-detail",method="GET"} 2', lines)
+        self.assertIn('rest_db_queries_count{view="set_driver-partial-update",method="PATCH"} 1', lines)
+        self.assertIn('rest_db_queries_bucket{view="vehicle-detail",method="GET",le="1"} 2', lines)
+        self.assertIn('rest_serializer_duration_seconds_count{view="driver-list",method="GET"} 1', lines)
+
+    def test_response_cache_counters(self):
+        """
+        + GET /metrics - влучання і промахи кешу відповідей
+        """
+        url = reverse('vehicle-list')
+        self.client.get(url)
+        self.client.get(url)
+        lines = self.client.get(reverse('metrics')).content.decode().splitlines()
+        self.assertIn('# TYPE rest_response_cache_hits_total counter', lines)
+        self.assertIn('rest_response_cache_hits_total 1', lines)
+        self.assertIn('rest_response_cache_misses_total 1', lines)
+
+    @override_settings(REST_SLOW_QUERY_MS=0)
+    def test_slow_queries_logged(self):
+        with self.assertLogs('rest.metrics', 'WARNING') as logs:
+            self.client.get(reverse('vehicle-detail', kwargs={'pk': 1}))
+        self.assertIn('in vehicle-detail: SELECT', logs.output[0])
+
+
+class PerformanceBudgetTest(PerformanceBudgetMixin, RestFixtures):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # far more rows than the largest page, so materializing the table breaks the budget
+        Driver.objects.bulk_create(Driver(first_name='Budget', last_name=str(index)) for index in range(500))
+        drivers = Driver.objects.filter(first_name='Budget')
+        Vehicle.objects.bulk_create(
+            Vehicle(driver=driver, make='B', model='B1', plate_number='BB %04d BB' % index,
+                    plate_number_normalized='BB%04dBB' % index)
+            for index, driver in enumerate(drivers)
+        )
+
+    def test_driver_list_budget(self):
+        """
+        + GET /drivers/driver/ - кількість запитів і пам'ять не залежать від кількості водіїв
+        """
+        self.assertBudget(reverse('driver-list'), {10: (1, 80), 50: (1, 200), 200: (1, 650)})
+        self.assertBudget(f"{reverse('driver-list')}?created_at__gte=10-11-2021", {10: (1, 80), 200: (1, 650)})
+        self.assertBudget(f"{reverse('driver-list')}?expand=vehicles", {10: (2, 220), 50: (2, 720), 200: (2, 2700)})
+
+    def test_vehicle_list_budget(self):
+        """
+        + GET /vehicles/vehicle/ - кількість запитів і пам'ять не залежать від кількості машин
+        """
+        self.assertBudget(reverse('vehicle-list'), {10: (1, 100), 50: (1, 250), 200: (1, 900)})
+        self.assertBudget(f"{reverse('vehicle-list')}?with_drivers=yes", {10: (1, 100), 200: (1, 900)})
+        self.assertBudget(f"{reverse('vehicle-list')}?expand=driver", {10: (1, 130), 50: (1, 400), 200: (1, 1500)})
+
+    def test_detail_budget(self):
+        """
+        + GET /drivers/driver/1/, /vehicles/vehicle/1/ - кількість запитів і пам'ять
+        """
+        self.assertBudget(reverse('driver-detail', kwargs={'pk': 1}), {None: (1, 60)})
+        self.assertBudget(f"{reverse('driver-detail', kwargs={'pk': 1})}?expand=vehicles", {None: (2, 90)})
+        self.assertBudget(reverse('vehicle-detail', kwargs={'pk': 1}), {None: (1, 60)})
+
+    def test_budget_failure_shows_queries(self):
+        with self.assertRaises(AssertionError) as failure:
+            self.assertBudget(f"{reverse('driver-list')}?expand=vehicles", {10: (2, 1000), 50: (1, 1000)})
+        self.assertIn('ran 2 queries instead of 1', str(failure.exception))
+        self.assertIn('WHERE "rest_vehicle"."driver_id" IN (?, ?', str(failure.exception))
+
+
+@override_settings(REST_RESPONSE_CACHE=None)
+class FastListTest(RestFixtures):
+
+    def assertSameAsSerializers(self, url):
+        fast = self.client.get(url)
+        with mock.patch('rest.fast.get_row_serializer', return_value=None), \
+                mock.patch('rest.fast.FastJSONRenderer', JSONRenderer):
+            regular = self.client.get(url)
+        self.assertEqual(fast.status_code, status.HTTP_200_OK)
+        self.assertEqual(fast.content, regular.content)
+        self.assertEqual(fast['ETag'], regular['ETag'])
+        return fast
+
+    def test_same_output_as_serializers(self):
+        """
+        + GET /drivers/driver/, /vehicles/vehicle/ - швидкий шлях віддає ті самі байти, що й серіалізатори
+        """
+        self.assertIsNotNone(get_row_serializer(DriverSerializer))
+        self.assertIsNotNone(get_row_serializer(VehicleSerializer))
+        self.assertIsNone(get_row_serializer(DriverWithVehiclesSerializer))
+        Driver.objects.create(first_name='Ів\u2028ан "Ж" \\', last_name='\u2029\t</script>')
+        response = self.assertSameAsSerializers(f"{reverse('driver-list')}?page_size=3")
+        self.assertSameAsSerializers(response.data['next'])
+        self.assertSameAsSerializers(f"{reverse('driver-list')}?created_at__gte=10-11-2021")
+        self.assertSameAsSerializers(reverse('vehicle-list'))
+        self.assertSameAsSerializers(f"{reverse('vehicle-list')}?with_drivers=no")
+        self.assertSameAsSerializers(f"{reverse('vehicle-list')}?plate_number=aa*")
+
+    def test_datetime_format(self):
+        kyiv = pytz.timezone('Europe/Kyiv')
+        values = [
+            datetime(2021, 11, 10, 7, 5, 3, 120, tzinfo=dt_timezone.utc),
+            datetime(1999, 3, 28, 23, 59, 59, tzinfo=dt_timezone.utc),
+        ]
+        for output_format in ('%d/%m/%Y %H:%M:%S', '%Y-%m-%dT%H:%M:%S.%f', '100%% %d', 'static', '%a %d %b'):
+            format_datetime = compile_datetime_format(output_format)
+            for value in values:
+                for tz in (dt_timezone.utc, kyiv):
+                    self.assertEqual(format_datetime(value, tz), value.astimezone(tz).strftime(output_format))
+            naive = values[0].replace(tzinfo=None)
+            self.assertEqual(format_datetime(naive, None), naive.strftime(output_format))
+
+    def test_renderer_same_bytes(self):
+        for data in (
+            {'results': [{'name': 'Ів\u2028ан\u2029 "\\ \x00\x1f\x7f \ud7ff', 'id': 2 ** 62, 'driver': None}]},
+            [True, False, [], {}],
+            {'key': datetime(2021, 11, 10, tzinfo=dt_timezone.utc), 1: 'non-str key'},
+        ):
+            self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(
+            FastJSONRenderer().render({'a': [1]}, 'application/json; indent=2'),
+            JSONRenderer().render({'a': [1]}, 'application/json; indent=2'),
+        )
+
+
+class ChangeFeedTest(RestFixtures):
+
+    def changes(self, cursor, **params):
+        response = self.client.get(reverse('changes'), {'cursor': cursor, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        return response.data
+
+    def test_changes_since_cursor(self):
+        """
+        + GET /changes/?cursor=N - створені, змінені і видалені водії та машини після курсора
+        """
+        cursor = self.client.get(reverse('changes')).data['cursor']
+        self.assertEqual(self.changes(cursor)['results'], [])
+
+        driver = Driver.objects.create(first_name='Feed', last_name='Driver')
+        self.client.patch(reverse('driver-detail', kwargs={'pk': driver.pk}), data=json.dumps(
+            {'last_name': 'Renamed'}
+        ), content_type='application/json')
+        self.client.patch(reverse('set_driver-detail', kwargs={'pk': 6}), data=json.dumps(
+            {'driver': driver.pk}
+        ), content_type='application/json')
+        self.client.delete(reverse('vehicle-detail', kwargs={'pk': 2}))
+
+        # changes, then the data of the drivers and of the vehicles
+        with self.assertNumQueries(3):
+            feed = self.changes(cursor)
+        self.assertFalse(feed['has_more'])
+        self.assertListEqual(
+            [(x['model'], x['id'], x['action']) for x in feed['results']],
+            [('driver', driver.pk, 'created'), ('vehicle', 6, 'updated'), ('vehicle', 2, 'deleted')]
+        )
+        self.assertEqual(feed['results'][0]['data']['last_name'], 'Renamed')
+        self.assertEqual(feed['results'][1]['data'], self.client.get(reverse('vehicle-detail', kwargs={'pk': 6})).data)
+        self.assertIsNone(feed['results'][2]['data'])
+        self.assertEqual(self.changes(feed['cursor'])['results'], [])
+
+    def test_bulk_changes_and_driver_delete(self):
+        """
+        + GET /changes/?cursor=N - масові зміни і машини, що втратили водія
+        """
+        cursor = self.client.get(reverse('changes')).data['cursor']
+        self.client.patch(reverse('set_driver-bulk'), data=json.dumps(
+            {'assignments': [{'vehicle_id': 1, 'driver_id': 3}, {'vehicle_id': 5, 'driver_id': 3}]}
+        ), content_type='application/json')
+        unassigned = set(Vehicle.objects.filter(driver=3).values_list('id', flat=True))
+        Driver.objects.get(pk=3).delete()
+
+        feed = self.changes(cursor, limit=2)
+        self.assertTrue(feed['has_more'])
+        results = feed['results'] + self.changes(feed['cursor'])['results']
+        updated = {x['id'] for x in results if x['model'] == 'vehicle' and x['action'] == 'updated'}
+        self.assertTrue(unassigned <= updated)
+        self.assertIn({'model': 'driver', 'id': 3, 'action': 'deleted', 'data': None}, results)
+
+    def test_pruned_cursor(self):
+        """
+        + GET /changes/?cursor=N - курсор старший за збережені зміни повертає 410
+        """
+        Driver.objects.create(first_name='Old', last_name='Change')
+        cursor = self.client.get(reverse('changes')).data['cursor']
+        Driver.objects.create(first_name='New', last_name='Change')
+        Driver.objects.create(first_name='Newer', last_name='Change')
+        self.assertTrue(self.changes(0)['results'])
+
+        total = Change.objects.count()
+        out = StringIO()
+        call_command('prune_changes', '--days', '-1', stdout=out)
+        self.assertEqual(out.getvalue().strip(), 'Pruned %d changes.' % (total - 1))
+        self.assertEqual(Change.objects.count(), 1)
+        for stale in (cursor, 0):
+            response = self.client.get(reverse('changes'), {'cursor': stale})
+            self.assertEqual(response.status_code, status.HTTP_410_GONE)
+        # the latest change is kept, clients at the current cursor stay in sync
+        latest = self.client.get(reverse('changes')).data['cursor']
+        self.assertEqual(self.changes(latest)['results'], [])
+
+        response = self.client.get(reverse('changes'), {'cursor': 'x'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+    def test_uncommitted_window(self):
+        """
+        + GET /changes/?cursor=N - на базах, що комітять id не по порядку, останні зміни притримуються
+        """
+        cursor = self.client.get(reverse('changes')).data['cursor']
+        horizon = timezone.now()
+        driver = Driver.objects.create(first_name='Late', last_name='Commit')
+        with mock.patch('rest.changes.commit_horizon', return_value=horizon):
+            self.assertEqual(self.client.get(reverse('changes')).data['cursor'], cursor)
+            self.assertEqual(self.changes(cursor)['results'], [])
+        self.assertEqual([x['id'] for x in self.changes(cursor)['results']], [driver.pk])
+
+
+class SearchTest(RestFixtures):
+
+    def setUp(self):
+        super().setUp()
+        Driver.objects.create(first_name='Olga', last_name='Shevchenko')
+        Driver.objects.create(first_name='Serhii', last_name='Olgin')
+        Driver.objects.create(first_name='Oleh', last_name='Kovalenko')
+        Vehicle.objects.create(make='Toyota', model='Corolla', plate_number='AA 1000 AA')
+        Vehicle.objects.create(make='Toyota', model='Camry', plate_number='AA 1001 AA', driver_id=2)
+
+    def search(self, name, q, **params):
+        response = self.client.get(reverse(name), {'q': q, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        return response.data['results']
+
+    def names(self, q, **params):
+        return [(x['first_name'], x['last_name']) for x in self.search('driver-list', q, **params)]
+
+    def test_search_drivers(self):
+        """
+        + GET /drivers/?q= - пошук за частиною імені, з помилками, найкращі збіги першими
+        """
+        # every matched word adds up, olgin is close enough to olga to come second
+        self.assertListEqual(self.names('shevchenko olga'), [('Olga', 'Shevchenko'), ('Serhii', 'Olgin')])
+        # prefix: the exact name first, then the longer one
+        self.assertListEqual(self.names('olg')[:2], [('Olga', 'Shevchenko'), ('Serhii', 'Olgin')])
+        # typos
+        self.assertEqual(self.names('shevcenko')[0], ('Olga', 'Shevchenko'))
+        self.assertEqual(self.names('kovalneko')[0], ('Oleh', 'Kovalenko'))
+        self.assertEqual(self.names('booba1')[0], ('Johny', 'Booba1'))
+        self.assertListEqual(self.names('zzzz'), [])
+        # a blank ?q= lists as usual
+        listed = self.client.get(reverse('driver-list'), {'page_size': 2}).data['results']
+        self.assertEqual(self.search('driver-list', ' ', page_size=2), listed)
+        self.assertEqual(len(self.names('johny', page_size=2)), 2)
+
+    def test_search_vehicles_with_filters(self):
+        """
+        + GET /vehicles/?q=&with_drivers=yes&fields= - пошук за маркою і моделлю разом з фільтрами
+        """
+        results = self.search('vehicle-list', 'toyta corola')
+        self.assertListEqual([x['model'] for x in results], ['Corolla', 'Camry'])
+        results = self.search('vehicle-list', 'toyota', with_drivers='yes', fields='id,model')
+        self.assertListEqual(results, [{'id': Vehicle.objects.get(model='Camry').pk, 'model': 'Camry'}])
+        # the limit applies to the matches passing the filters, not before them
+        results = self.search('vehicle-list', 'toyota corolla', with_drivers='yes', page_size=1)
+        self.assertListEqual([x['model'] for x in results], ['Camry'])
+        results = self.search('vehicle-list', 'camry', expand='driver')
+        self.assertEqual(results[0]['driver']['id'], 2)
+
+        response = self.client.get(reverse('vehicle-list'), {'q': 'toyota', 'with_drivers': 'maybe'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_postings_read_per_term(self):
+        """
+        + GET /vehicles/?q= - постинги читаються з LIMIT по кожному терміну, без підзапиту, коли немає фільтрів
+        """
+        Vehicle.objects.filter(model='Camry').delete()
+        for index in range(3):
+            Vehicle.objects.create(make='Toyota', model='Prius', plate_number='AA 20%02d AA' % index)
+        camry = Vehicle.objects.create(make='Toyota', model='Camry', plate_number='AA 1001 AA')
+        with mock.patch('rest.search.MAX_POSTINGS', 2), CaptureQueriesContext(connection) as queries:
+            results = self.search('vehicle-list', 'toyota camry', page_size=1)
+        postings = [query['sql'] for query in queries.captured_queries if 'rest_searchposting' in query['sql']]
+        self.assertTrue(all('rest_vehicle' not in sql for sql in postings))
+        self.assertTrue(all('LIMIT 3' in sql for sql in postings[:-1]))
+        # the Camry past the first two Toyotas still scores both words
+        self.assertEqual(results[0]['id'], camry.pk)
+
+        # at least the page size, so one word fills the page
+        with mock.patch('rest.search.MAX_POSTINGS', 2):
+            results = self.search('vehicle-list', 'prius', with_drivers='no', page_size=3)
+        self.assertListEqual([x['model'] for x in results], ['Prius'] * 3)
+
+    def test_index_follows_writes(self):
+        """
+        + GET /drivers/?q= - індекс оновлюється при зміні і видаленні, manage.py rebuild_search_index
+        """
+        driver = Driver.objects.get(last_name='Shevchenko')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(reverse('driver-detail', kwargs={'pk': driver.pk}), data=json.dumps(
+                {'last_name': 'Melnyk'}
+            ), content_type='application/json')
+        self.assertListEqual(self.names('shevchenko'), [])
+        self.assertListEqual(self.names('melnyk'), [('Olga', 'Melnyk')])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('driver-bulk'), data=json.dumps(
+                [{'first_name': 'Taras', 'last_name': 'Bondar'}]
+            ), content_type='application/json')
+        self.assertListEqual(self.names('bondar'), [('Taras', 'Bondar')])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            driver.delete()
+        self.assertListEqual(self.names('melnyk'), [])
+        self.assertFalse(SearchPosting.objects.filter(model='driver', object_id=driver.pk).exists())
+
+        before = sorted(SearchPosting.objects.values_list('model', 'object_id', 'term__term'))
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertEqual(out.getvalue().strip(), 'Indexed %d objects.' % (Driver.objects.count() + Vehicle.objects.count()))
+        self.assertListEqual(sorted(SearchPosting.objects.values_list('model', 'object_id', 'term__term')), before)
+
+
+class JobTest(RestFixtures):
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings = override_settings(REST_JOBS={'DIRECTORY': directory, 'TIMEOUT': 600, 'RETRY_DELAY': 0})
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def post_job(self, **data):
+        response = self.client.post(reverse('job-list'), data=json.dumps(data), content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED, response.content)
+        self.assertEqual(response['Location'], reverse('job-detail', kwargs={'pk': response.data['id']}))
+        self.assertEqual(response.data['status'], 'queued')
+        return response.data['id']
+
+    def get_job(self, pk):
+        return self.client.get(reverse('job-detail', kwargs={'pk': pk})).data
+
+    def test_set_driver_job(self):
+        """
+        + POST /jobs/ - масове призначення водіїв приймається з 202 і виконується воркером
+        + GET /jobs/<id>/ - статус, прогрес і результат
+        """
+        pk = self.post_job(kind='set_driver', params={'assignments': [
+            {'vehicle_id': 1, 'driver_id': 3}, {'vehicle_id': 6, 'driver_id': 3},
+        ]})
+        self.assertEqual(Vehicle.objects.filter(driver=3).count(), 0)
+
+        call_command('run_workers', '--processes', '0', '--burst')
+        job = self.get_job(pk)
+        self.assertEqual(job['status'], 'succeeded')
+        self.assertEqual((job['progress'], job['total'], job['attempts']), (2, 2, 1))
+        self.assertEqual(job['result'], {'updated': 2})
+        self.assertListEqual(list(Vehicle.objects.filter(driver=3).order_by('id').values_list('id', flat=True)), [1, 6])
+
+    def test_export_job(self):
+        """
+        + POST /jobs/ - експорт у файл, GET /jobs/<id>/file/ - завантаження файлу
+        """
+        pk = self.post_job(kind='export', params={'format': 'ndjson', 'query': 'with_drivers=no'})
+        response = self.client.get(reverse('job-file', kwargs={'pk': pk}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        self.assertEqual(work(burst=True), 1)
+        self.assertEqual(self.get_job(pk)['result'], {'rows': 1, 'file': 'job-%d.ndjson' % pk})
+        response = self.client.get(reverse('job-file', kwargs={'pk': pk}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertListEqual([x['id'] for x in rows], [6])
+
+    def test_import_job(self):
+        """
+        + POST /jobs/ multipart - імпорт завантаженого файлу
+        """
+        content = '\n'.join([
+            json.dumps({'driver': 1, 'make': 'J1', 'model': 'J1j', 'plate_number': 'JJ 0001 JJ'}),
+            json.dumps({'driver': 1, 'make': 'J2', 'model': 'J2j', 'plate_number': 'bad'}),
+        ])
+        response = self.client.post(reverse('job-list'), {
+            'kind': 'import', 'file': SimpleUploadedFile('fleet.jsonl', content.encode()),
+        })
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED, response.content)
+        self.assertEqual(response.data['params'], {'format': 'ndjson'})
+
+        work(burst=True)
+        job = self.get_job(response.data['id'])
+        self.assertEqual(job['status'], 'succeeded')
+        self.assertEqual((job['result']['imported'], job['result']['rejected']), (1, 1))
+        self.assertEqual(job['result']['errors'][0][0], 2)
+        self.assertTrue(Vehicle.objects.filter(make='J1').exists())
+
+    def test_invalid_jobs(self):
+        """
+        + POST /jobs/ - помилки параметрів повертають 400, а не задачу, що впаде
+        """
+        for data in (
+            {'kind': 'reboot'},
+            {'kind': 'set_driver', 'params': {'assignments': [{'vehicle_id': 948473, 'driver_id': 1}]}},
+            {'kind': 'set_driver', 'params': 'assignments'},
+            {'kind': 'export', 'params': {'format': 'xml'}},
+            {'kind': 'export', 'params': {'format': 'csv', 'query': 'with_drivers=maybe'}},
+            {'kind': 'import', 'params': {'format': 'csv'}},
+        ):
+            response = self.client.post(reverse('job-list'), data=json.dumps(data), content_type='application/json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, data)
+        self.assertFalse(Job.objects.exists())
+
+    def test_retries(self):
+        """
+        + GET /jobs/<id>/ - тимчасові помилки повторюються до max_attempts, помилки даних - ні
+        """
+        pk = self.post_job(kind='export', params={'format': 'csv'}, max_attempts=2)
+        with mock.patch('rest.jobs.export.iter_export', side_effect=OSError('disk full')), self.assertLogs('rest.jobs'):
+            self.assertEqual(work(burst=True), 2)
+        job = self.get_job(pk)
+        self.assertEqual((job['status'], job['attempts']), ('failed', 2))
+        self.assertEqual(job['error'], 'OSError: disk full')
+
+        pk = self.post_job(kind='export', params={'format': 'csv'})
+        with mock.patch('rest.jobs.export.iter_export', side_effect=[OSError('disk full'), iter(['id\n'])]):
+            self.assertEqual(work(burst=True), 2)
+        job = self.get_job(pk)
+        self.assertEqual((job['status'], job['attempts'], job['result']['rows']), ('succeeded', 2, 0))
+
+        # the vehicle is deleted between the POST and the worker
+        pk = self.post_job(kind='set_driver', params={'assignments': [{'vehicle_id': 1, 'driver_id': 3}]})
+        Vehicle.objects.filter(pk=1).delete()
+        with self.assertLogs('rest.jobs'):
+            work(burst=True)
+        job = self.get_job(pk)
+        self.assertEqual((job['status'], job['attempts']), ('failed', 1))
+        self.assertIn('does not exist', job['error'])
+
+    def test_lost_worker(self):
+        """
+        + GET /jobs/<id>/ - задача воркера, що зник, повертається в чергу
+        """
+        pk = self.post_job(kind='set_driver', params={'assignments': [{'vehicle_id': 1, 'driver_id': 3}]})
+        Job.objects.filter(pk=pk).update(
+            status='running', worker='gone:1', attempts=1, heartbeat=datetime(2021, 1, 1, tzinfo=dt_timezone.utc),
+        )
+        lost = Job.objects.get(pk=pk)
+        self.assertEqual(requeue_lost(), 1)
+        job = self.get_job(pk)
+        self.assertEqual(job['status'], 'queued')
+        self.assertIn('no heartbeat from gone:1', job['error'])
+
+        # the lost worker coming back can't touch the job any more
+        with self.assertLogs('rest.jobs', 'WARNING'):
+            execute(lost)
+        self.assertEqual(self.get_job(pk)['status'], 'queued')
+        work(burst=True)
+        self.assertEqual((self.get_job(pk)['status'], self.get_job(pk)['attempts']), ('succeeded', 2))
+
+
+class AssignmentHistoryTest(RestFixtures):
+
+    def at(self, day):
+        return datetime(2030, 1, day, tzinfo=dt_timezone.utc)
+
+    def set_driver(self, day, vehicle, driver):
+        with mock.patch('django.utils.timezone.now', return_value=self.at(day)):
+            self.client.patch(reverse('set_driver-detail', kwargs={'pk': vehicle}), data=json.dumps(
+                {'driver': driver}
+            ), content_type='application/json')
+
+    def history(self, name, pk, **params):
+        response = self.client.get(reverse(name, kwargs={'pk': pk}), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        return [(x['vehicle'], x['driver'], x['valid_from'], x['valid_to']) for x in response.data['results']]
+
+    def test_vehicle_history(self):
+        """
+        + GET /vehicles/vehicle/<id>/assignments/?at= - хто був водієм машини в момент часу
+        + GET /vehicles/vehicle/<id>/assignments/?since=&until= - водії машини за період
+        """
+        self.set_driver(1, 6, 1)
+        self.set_driver(2, 6, 2)
+        self.set_driver(3, 6, None)
+        self.set_driver(4, 6, 2)
+
+        url = 'vehicle-assignments'
+        self.assertListEqual(self.history(url, 6, at='2030-01-01T12:00:00Z'), [(6, 1, '01/01/2030 00:00:00', '02/01/2030 00:00:00')])
+        # intervals are half-open, the change of driver belongs to the new one
+        self.assertListEqual([x[1] for x in self.history(url, 6, at='02-01-2030')], [2])
+        self.assertListEqual(self.history(url, 6, at='2030-01-03T12:00:00Z'), [])
+        self.assertListEqual([x[1] for x in self.history(url, 6, at='2030-01-05T00:00:00Z')], [2])
+        self.assertListEqual([x[1] for x in self.history(url, 6, since='2030-01-01T12:00:00Z', until='03-01-2030')], [1, 2])
+        self.assertListEqual([x[1] for x in self.history(url, 6, since='2030-01-03T12:00:00Z')], [2])
+        self.assertListEqual([x[1] for x in self.history(url, 6)], [1, 2, 2])
+        self.assertIsNone(self.history(url, 6)[-1][3])
+
+        # one seek in the vehicle's index
+        with self.assertNumQueries(1):
+            self.history(url, 6, at='02-01-2030')
+        self.assertIn('assignment_vehicle_idx', vehicle_history(6, self.at(2), self.at(2)).explain())
+
+    def test_driver_history_and_deletes(self):
+        """
+        + GET /drivers/driver/<id>/assignments/?at= - машини водія в момент часу, також після видалення водія
+        """
+        self.set_driver(1, 6, 2)
+        with mock.patch('django.utils.timezone.now', return_value=self.at(2)):
+            self.client.patch(reverse('set_driver-bulk'), data=json.dumps(
+                {'assignments': [{'vehicle_id': 1, 'driver_id': 2}]}
+            ), content_type='application/json')
+        url = 'driver-assignments'
+        self.assertListEqual([x[0] for x in self.history(url, 2, at='02-01-2030')], [3, 6, 1])
+        self.assertListEqual([x[0] for x in self.history(url, 2, at='01-01-2030')], [3, 6])
+
+        # seeks past the intervals closed before `at`, not a scan of the driver's history
+        with self.assertNumQueries(1):
+            self.history(url, 2, at='02-01-2030')
+        plan = driver_history(2, self.at(2), self.at(2)).explain()
+        self.assertIn('assignment_driver_to_idx (driver_id=? AND valid_to>?)', plan)
+        self.assertIn('assignment_driver_to_idx (driver_id=? AND valid_to=?)', plan)
+
+        with mock.patch('django.utils.timezone.now', return_value=self.at(3)):
+            Driver.objects.get(pk=2).delete()
+            Vehicle.objects.get(pk=6).delete()
+        self.assertListEqual(self.history(url, 2, at='2030-01-03T12:00:00Z'), [])
+        self.assertListEqual([x[0] for x in self.history(url, 2, at='02-01-2030')], [3, 6, 1])
+        self.assertListEqual(self.history('vehicle-assignments', 6), [(6, 2, '01/01/2030 00:00:00', '03/01/2030 00:00:00')])
+        self.assertFalse(VehicleAssignment.objects.filter(valid_to__isnull=True, vehicle_id__in=[1, 3, 6]).exists())
+
+    def test_invalid_params(self):
+        for params in (
+            {'at': '01-01-2030', 'since': '01-01-2030'},
+            {'since': '02-01-2030', 'until': '01-01-2030'},
+            {'at': '2030/01/01'},
+        ):
+            response = self.client.get(reverse('vehicle-assignments', kwargs={'pk': 1}), params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+    def test_compact(self):
+        """
+        + manage.py compact_assignments - старі закриті інтервали видаляються, з --merge-gap зливаються
+        """
+        VehicleAssignment.objects.all().delete()
+        VehicleAssignment.objects.bulk_create([
+            VehicleAssignment(vehicle_id=1, driver_id=1, valid_from=self.at(1), valid_to=self.at(2)),
+            VehicleAssignment(vehicle_id=1, driver_id=1, valid_from=self.at(2), valid_to=self.at(3)),
+            VehicleAssignment(vehicle_id=1, driver_id=1, valid_from=self.at(4), valid_to=self.at(5)),
+            VehicleAssignment(vehicle_id=1, driver_id=2, valid_from=self.at(5), valid_to=self.at(6)),
+            VehicleAssignment(vehicle_id=2, driver_id=1, valid_from=self.at(1), valid_to=self.at(2)),
+            VehicleAssignment(vehicle_id=2, driver_id=1, valid_from=self.at(2), valid_to=None),
+        ])
+        out = StringIO()
+        with mock.patch('django.utils.timezone.now', return_value=self.at(30)):
+            call_command('compact_assignments', '--days', '1', '--merge-gap', '0', stdout=out)
+        self.assertEqual(out.getvalue().strip(), 'Merged 1 intervals.')
+        self.assertListEqual([x[1:] for x in self.history('vehicle-assignments', 1)], [
+            (1, '01/01/2030 00:00:00', '03/01/2030 00:00:00'),
+            (1, '04/01/2030 00:00:00', '05/01/2030 00:00:00'),
+            (2, '05/01/2030 00:00:00', '06/01/2030 00:00:00'),
+        ])
+        with mock.patch('django.utils.timezone.now', return_value=self.at(30)):
+            call_command('compact_assignments', '--days', '1', '--merge-gap', str(24 * 3600), stdout=out)
+        self.assertEqual(len(self.history('vehicle-assignments', 1)), 2)
+
+        # by default the old closed intervals are deleted, the open one stays
+        out = StringIO()
+        with mock.patch('django.utils.timezone.now', return_value=self.at(30)):
+            call_command('compact_assignments', '--days', '1', stdout=out)
+        self.assertEqual(out.getvalue().strip(), 'Deleted 3 intervals.')
+        self.assertListEqual(list(VehicleAssignment.objects.values_list('vehicle_id', flat=True)), [2])
+
+
+class StartupTest(TestCase):
+    # a fresh interpreter, the settings of this one are already loaded
+    script = """
+import sys
+from django.core.management import call_command
+from benchmarks import wsgi_request
+from test_task.wsgi import application
+
+print([name for name in ('rest.serializers', 'rest.views', 'django.contrib.admin') if name in sys.modules])
+call_command('migrate', verbosity=0)
+print(wsgi_request(application, 'POST', '/drivers/driver/', body=b'{"first_name": "Ivan", "last_name": "Franko"}'))
+print(wsgi_request(application, 'GET', '/drivers/driver/'), wsgi_request(application, 'GET', '/admin/'))
+"""
+
+    def test_api_settings(self):
+        """
+        + test_task.settings_api - API без адмінки і сесій, серіалізатори та в'юхи імпортуються з першим запитом
+        """
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        env = dict(
+            os.environ, DJANGO_SETTINGS_MODULE='test_task.settings_api', DJANGO_SECRET_KEY='test',
+            DJANGO_ALLOWED_HOSTS='testserver', DB_NAME=os.path.join(directory, 'db.sqlite3'),
+        )
+        output = subprocess.run(
+            [sys.executable, '-c', self.script], cwd=settings.BASE_DIR, env=env, check=True, stdout=subprocess.PIPE, text=True,
+        ).stdout
+        self.assertEqual(output.splitlines(), ['[]', '201', '200 404'])
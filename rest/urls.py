@@ -1,9 +1,24 @@
+from django.urls import path, re_path
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import async_views, metrics, views
 
 router = DefaultRouter()
 router.register(r'drivers/driver', views.DriverView, basename='driver')
 router.register(r'vehicles/vehicle', views.VehicleView, basename='vehicle')
 router.register(r'vehicles/set_driver', views.SetDriverView, basename='set_driver')
+router.register(r'jobs', views.JobView, basename='job')
 
-urlpatterns = router.urls
+urlpatterns = router.urls + [
+    re_path(r'^vehicles/export/(?P<export_format>ndjson|csv)/$', views.fleet_export, name='fleet-export'),
+    path('vehicles/stats/', views.fleet_stats, name='fleet-stats'),
+    path('changes/', views.change_feed, name='changes'),
+    # the history outlives the vehicles and drivers, these don't 404 on deleted ones
+    path('vehicles/vehicle/<int:pk>/assignments/', views.vehicle_assignments, name='vehicle-assignments'),
+    path('drivers/driver/<int:pk>/assignments/', views.driver_assignments, name='driver-assignments'),
+    path('metrics', metrics.metrics_view, name='metrics'),
+    # coroutine versions of the read endpoints, for ASGI servers
+    path('async/drivers/driver/', async_views.driver_list, name='async-driver-list'),
+    path('async/drivers/driver/<int:pk>/', async_views.driver_detail, name='async-driver-detail'),
+    path('async/vehicles/vehicle/', async_views.vehicle_list, name='async-vehicle-list'),
+    path('async/vehicles/vehicle/<int:pk>/', async_views.vehicle_detail, name='async-vehicle-detail'),
+]
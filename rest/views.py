@@ -1,38 +1,140 @@
-from datetime import datetime
+import os
 
-from rest_framework import viewsets
-from rest_framework.mixins import UpdateModelMixin
+from rest_framework import status, viewsets
+from rest_framework.decorators import action, api_view
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.mixins import CreateModelMixin, RetrieveModelMixin, UpdateModelMixin
+from rest_framework.response import Response
 
-from .serializers import DriverSerializer, VehicleSerializer, SetDriverSerializer
+from django.db.models import Prefetch
+from django.http import FileResponse, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.views.decorators.http import require_GET
 
-from .models import Driver, Vehicle
+from .cache import CachedResponseMixin
+from . import changes, export, history, jobs, stats
+from .conditional import ConditionalGetMixin, ConditionalUpdateMixin
+from .fast import FastListMixin
+from .filters import DriverFilter, QueryFilterBackend, VehicleFilter
+from .mixins import BulkModelMixin, ExpandMixin, SparseFieldsMixin
+from .search import SearchMixin
+from .serializers import (
+    DriverSerializer, VehicleSerializer, SetDriverSerializer, SetDriverBulkSerializer,
+    DriverWithVehiclesSerializer, VehicleWithDriverSerializer, ChangeFeedSerializer, JobSerializer,
+    AssignmentHistoryQuerySerializer, VehicleAssignmentSerializer,
+)
 
+from .models import Driver, Job, Vehicle
 
-class DriverView(viewsets.ModelViewSet):
+
+class DriverView(CachedResponseMixin, SearchMixin, ConditionalGetMixin, FastListMixin, SparseFieldsMixin,
+                 ConditionalUpdateMixin, ExpandMixin, BulkModelMixin, viewsets.ModelViewSet):
     queryset = Driver.objects.all()
     serializer_class = DriverSerializer
+    filter_backends = [QueryFilterBackend]
+    filter_class = DriverFilter
+    expand_field = 'vehicles'
+    expand_serializer_class = DriverWithVehiclesSerializer
 
     def get_queryset(self):
         query_set = super().get_queryset()
-        for filter_name, value in self.request.GET.items():
-            if filter_name in ('created_at__gte', 'created_at__lte'):
-                query_set = query_set.filter(**{filter_name: datetime.strptime(value, '%d-%m-%Y')})
+        if self.is_expanded():
+            query_set = query_set.prefetch_related(
+                Prefetch('vehicles', queryset=Vehicle.objects.order_by('created_at', 'id'))
+            )
         return query_set
 
 
-class VehicleView(viewsets.ModelViewSet):
+class VehicleView(CachedResponseMixin, SearchMixin, ConditionalGetMixin, FastListMixin, SparseFieldsMixin,
+                  ConditionalUpdateMixin, ExpandMixin, BulkModelMixin, viewsets.ModelViewSet):
     queryset = Vehicle.objects.all()
     serializer_class = VehicleSerializer
+    filter_backends = [QueryFilterBackend]
+    filter_class = VehicleFilter
+    expand_field = 'driver'
+    expand_serializer_class = VehicleWithDriverSerializer
 
     def get_queryset(self):
-        req_get = self.request.GET
-        with_drivers = req_get.get('with_drivers')
-        if with_drivers in ('yes', 'no'):
-            return self.queryset.filter(driver__isnull=with_drivers == 'no')
-        return super().get_queryset()
+        query_set = super().get_queryset()
+        if self.is_expanded():
+            query_set = query_set.select_related('driver')
+        return query_set
 
 
-class SetDriverView(UpdateModelMixin, viewsets.GenericViewSet):
+class SetDriverView(ConditionalUpdateMixin, UpdateModelMixin, viewsets.GenericViewSet):
     queryset = Vehicle.objects.all()
     serializer_class = SetDriverSerializer
 
+    @action(detail=False, methods=['patch'], url_path='bulk', serializer_class=SetDriverBulkSerializer)
+    def bulk(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response({'updated': serializer.save()})
+
+
+class JobView(CreateModelMixin, RetrieveModelMixin, viewsets.GenericViewSet):
+    queryset = Job.objects.all()
+    serializer_class = JobSerializer
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        job = jobs.enqueue(**serializer.validated_data)
+        return Response(
+            self.get_serializer(job).data, status=status.HTTP_202_ACCEPTED,
+            headers={'Location': reverse('job-detail', kwargs={'pk': job.pk})},
+        )
+
+    @action(detail=True)
+    def file(self, request, *args, **kwargs):
+        job = self.get_object()
+        if job.kind != 'export' or job.status != jobs.SUCCEEDED or not os.path.exists(jobs.export_path(job)):
+            raise NotFound('This job has no file.')
+        return FileResponse(
+            open(jobs.export_path(job), 'rb'), as_attachment=True, filename='fleet.%s' % job.params['format'],
+            content_type=export.FORMATS[job.params['format']],
+        )
+
+
+@require_GET
+def fleet_export(request, export_format):
+    try:
+        query_set = export.fleet_queryset(request.GET)
+    except ValidationError as e:
+        return JsonResponse(e.detail, status=400)
+    response = StreamingHttpResponse(
+        export.iter_export(export_format, query_set), content_type=export.FORMATS[export_format],
+    )
+    response['Content-Disposition'] = 'attachment; filename="fleet.%s"' % export_format
+    return response
+
+
+@api_view(['GET'])
+def fleet_stats(request):
+    return Response(stats.get_stats())
+
+
+@api_view(['GET'])
+def change_feed(request):
+    params = ChangeFeedSerializer(data=request.query_params)
+    params.is_valid(raise_exception=True)
+    if 'cursor' not in params.validated_data:
+        return Response({'cursor': changes.latest_cursor(), 'has_more': False, 'results': []})
+    return Response(changes.get_changes(params.validated_data['cursor'], params.validated_data['limit']))
+
+
+def assignment_history(request, get_history, pk):
+    params = AssignmentHistoryQuerySerializer(data=request.query_params)
+    params.is_valid(raise_exception=True)
+    intervals = get_history(pk, **params.validated_data)
+    return Response({'results': VehicleAssignmentSerializer(intervals, many=True).data})
+
+
+@api_view(['GET'])
+def vehicle_assignments(request, pk):
+    return assignment_history(request, history.vehicle_history, pk)
+
+
+@api_view(['GET'])
+def driver_assignments(request, pk):
+    return assignment_history(request, history.driver_history, pk)
@@ -0,0 +1,35 @@
+"""
+Worker processes of rest.jobs.run_workers. They are spawned, not forked, so
+this module imports nothing of Django's before setting it up.
+"""
+import signal
+
+
+class Stop:
+    """
+    The stop request of a worker, set by a signal handler in its own process
+    or by the supervisor through `event`. The handlers only flip a flag:
+    setting the multiprocessing.Event there could deadlock on its lock.
+    """
+
+    def __init__(self, event=None):
+        self.event = event
+        self.requested = False
+
+    def request(self, signum=None, frame=None):
+        self.requested = True
+
+    def is_set(self):
+        return self.requested or (self.event is not None and self.event.is_set())
+
+
+def work_process(poll, burst, event):
+    stop = Stop(event)
+    # Ctrl+C reaches the whole process group, the supervisor handles it
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, stop.request)
+
+    import django
+    django.setup()
+    from rest.jobs import work
+    work(poll, burst, stop)
@@ -42,6 +42,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'rest.metrics.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -131,3 +132,54 @@ DATE_INPUT_FORMATS = '%d/%m/%Y'
 DATETIME_INPUT_FORMATS = '%d/%m/%Y %H:%M:%S'
 
 FIXTURE_DIRS = ('/rest/fixtures/',)
+
+REST_FRAMEWORK = {
+    'DEFAULT_PAGINATION_CLASS': 'rest.pagination.KeysetCursorPagination',
+    'PAGE_SIZE': 100,
+}
+
+# Cache of list and detail responses, invalidated on writes (see rest/cache.py).
+# BACKEND is any rest.cache.BaseCache, e.g. rest.cache.DjangoCache to use CACHES.
+# Set to None to disable.
+# LocMemLRUCache keeps the entries and their invalidation tokens per process:
+# writes made by another web worker, by run_workers jobs or by import_fleet
+# don't reach it, and its entries can be stale for up to TIMEOUT seconds.
+# With several processes, use DjangoCache over a shared cache (Redis,
+# memcached, the database) so that every process sees the same tokens.
+REST_RESPONSE_CACHE = {
+    'BACKEND': 'rest.cache.LocMemLRUCache',
+    'OPTIONS': {'max_entries': 1024},
+    'TIMEOUT': 300,
+}
+
+# PRAGMAs run on every new SQLite connection (see rest/sqlite.py): True for
+# rest.sqlite.TUNED_PRAGMAS (WAL, mmap, synchronous=NORMAL, cache and busy
+# timeout), a dict to change some of them. Off by default.
+REST_SQLITE_PRAGMAS = False
+
+# Queries at least this slow are logged by rest.metrics, None to disable.
+REST_SLOW_QUERY_MS = 200
+
+# Days of driver and vehicle changes kept for /changes/ by `manage.py prune_changes`.
+REST_CHANGE_RETENTION_DAYS = 7
+
+# Seconds of changes /changes/ holds back on backends that may commit ids out
+# of order (not SQLite), longer than any write transaction (see rest/changes.py).
+REST_CHANGE_COMMIT_WINDOW = 10
+
+# Threads running the queries of the async views (rest/async_views.py), each
+# with its own database connection.
+REST_ASYNC_DATABASE_THREADS = 32
+
+# Background jobs (rest/jobs.py): where export and import jobs keep their
+# files, seconds without progress after which a running job counts as lost,
+# seconds before the first retry of a failed job, doubled at each attempt.
+REST_JOBS = {
+    'DIRECTORY': BASE_DIR / 'jobs',
+    'TIMEOUT': 600,
+    'RETRY_DELAY': 10,
+}
+
+# `manage.py compact_assignments` deletes the driver assignment history
+# (rest/history.py) closed more than this many days ago.
+REST_ASSIGNMENT_COMPACT_DAYS = 365
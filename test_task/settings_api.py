@@ -0,0 +1,44 @@
+"""
+API-only production settings: test_task.settings_production without what
+only the admin and HTML pages need, for servers that run the JSON API alone.
+
+    DJANGO_SETTINGS_MODULE=test_task.settings_api
+
++ no admin, auth, contenttypes, sessions, messages or staticfiles apps
++ no session, CSRF, authentication, messages or X-Frame-Options middleware;
+  the API has no sessions or logins, its views are CSRF exempt
++ no template engine, DRF renders JSON only, without the browsable API
++ no translations, error messages are in English
+
+Each worker starts faster and imports fewer modules. The database and the
+rest of the environment are configured as in settings_production, and the
+schema is the same: run migrate with either settings.
+`python -m benchmarks.startup` compares both profiles.
+"""
+from .settings_production import *  # noqa: F401,F403
+from .settings_production import MIDDLEWARE, REST_FRAMEWORK
+
+INSTALLED_APPS = [
+    'rest',
+    'rest_framework',
+]
+
+# dropped: sessions, CSRF, authentication, messages, X-Frame-Options
+MIDDLEWARE = [name for name in MIDDLEWARE if name in (
+    'rest.db_router.ReplicaRoutingMiddleware',
+    'rest.metrics.PerformanceMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    'django.middleware.common.CommonMiddleware',
+)]
+
+TEMPLATES = []
+
+USE_I18N = False
+
+REST_FRAMEWORK = dict(
+    REST_FRAMEWORK,
+    DEFAULT_RENDERER_CLASSES=['rest_framework.renderers.JSONRenderer'],
+    # the defaults, SessionAuthentication and AnonymousUser, need django.contrib.auth
+    DEFAULT_AUTHENTICATION_CLASSES=[],
+    UNAUTHENTICATED_USER=None,
+)
@@ -0,0 +1,73 @@
+"""
+Production settings, configured from the environment:
+
+    DJANGO_SETTINGS_MODULE=test_task.settings_production
+
++ DJANGO_SECRET_KEY - required
++ DJANGO_ALLOWED_HOSTS - comma separated
++ DB_ENGINE - e.g. django.db.backends.postgresql, sqlite3 by default
++ DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT - the primary
++ DB_REPLICAS - comma separated host[:port] of read replicas of the primary,
+  or SQLite file names when DB_ENGINE is sqlite3
++ DB_CONN_MAX_AGE - seconds a connection is reused across requests, 60 by default
++ DB_PIN_SECONDS - how long a client that wrote keeps reading from the primary, 5 by default
++ DB_SQLITE_TUNED - 1 to apply rest.sqlite.TUNED_PRAGMAS (WAL, ...) to SQLite connections
+
+Two SQLite files make a local stand-in for a primary and a replica; the
+replica has to be a copy of the primary, nothing replicates between them:
+
+    DJANGO_SECRET_KEY=dev DB_NAME=primary.sqlite3 python manage.py migrate --settings=test_task.settings_production
+    cp primary.sqlite3 replica.sqlite3
+    DJANGO_SECRET_KEY=dev DB_NAME=primary.sqlite3 DB_REPLICAS=replica.sqlite3 \\
+        python manage.py runserver --settings=test_task.settings_production
+"""
+import os
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR, MIDDLEWARE
+
+
+def env_list(name):
+    return [item.strip() for item in os.environ.get(name, '').split(',') if item.strip()]
+
+
+SECRET_KEY = os.environ['DJANGO_SECRET_KEY']
+
+DEBUG = False
+
+ALLOWED_HOSTS = env_list('DJANGO_ALLOWED_HOSTS')
+
+DB_ENGINE = os.environ.get('DB_ENGINE', 'django.db.backends.sqlite3')
+
+PRIMARY = {
+    'ENGINE': DB_ENGINE,
+    'NAME': os.environ.get('DB_NAME', str(BASE_DIR / 'db.sqlite3')),
+    'USER': os.environ.get('DB_USER', ''),
+    'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+    'HOST': os.environ.get('DB_HOST', ''),
+    'PORT': os.environ.get('DB_PORT', ''),
+    # persistent connections: a worker reuses its connection instead of opening one per request
+    'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+}
+
+
+def replica(address):
+    settings = dict(PRIMARY, TEST={'MIRROR': 'default'})
+    if DB_ENGINE.endswith('sqlite3'):
+        settings['NAME'] = address
+    else:
+        settings['HOST'], _, port = address.partition(':')
+        settings['PORT'] = port or PRIMARY['PORT']
+    return settings
+
+
+DATABASES = {'default': PRIMARY}
+DATABASES.update(('replica%d' % index, replica(address)) for index, address in enumerate(env_list('DB_REPLICAS'), 1))
+
+DATABASE_ROUTERS = ['rest.db_router.PrimaryReplicaRouter']
+REST_DB_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+REST_DB_PIN_SECONDS = int(os.environ.get('DB_PIN_SECONDS', 5))
+
+REST_SQLITE_PRAGMAS = os.environ.get('DB_SQLITE_TUNED') == '1'
+
+MIDDLEWARE = ['rest.db_router.ReplicaRoutingMiddleware'] + MIDDLEWARE
@@ -5,8 +5,19 @@ It exposes the WSGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.2/howto/deployment/wsgi/
+
+Forking servers can load the application once, before forking the workers:
+
+    DJANGO_PRELOAD=1 gunicorn --preload --workers 8 test_task.wsgi
+
+DJANGO_PRELOAD=1 also imports the URLconf, with the views and serializers
+that would otherwise load on each worker's first request, and freezes the
+objects loaded so far out of the garbage collector. The workers then share
+these pages with the master instead of copying them as soon as a collection
+touches their reference counts.
 """
 
+import gc
 import os
 
 from django.core.wsgi import get_wsgi_application
@@ -14,3 +25,18 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'test_task.settings')
 
 application = get_wsgi_application()
+
+
+def preload():
+    from django.db import connections
+    from django.urls import get_resolver
+
+    get_resolver().url_patterns  # imports rest.urls, the views and the serializers
+    # a connection opened here would be shared by every worker
+    connections.close_all()
+    gc.collect()
+    gc.freeze()
+
+
+if os.environ.get('DJANGO_PRELOAD') == '1':
+    preload()